@@ -1,21 +1,12 @@
--- Auto-generated schema from staging CSVs
+-- Auto-generated schema from staging tables
 -- Includes dimension, fact, and bridge tables
 -- Review keys and constraints before production use
 
--- BRIDGE TABLE
-CREATE TABLE bridge_product_ingredient (
-    product_key INT,
-    ingredient_key INT,
-    quantity DECIMAL(10,2),
-    quantity_unit VARCHAR(255),
-    PRIMARY KEY (product_key, ingredient_key)
-);
-
 -- DIMENSION TABLE
 CREATE TABLE dim_date (
     date_key INT,
-    date_only VARCHAR(255),
-    day_of_week VARCHAR(255),
+    date_only DATE,
+    day_of_week VARCHAR(32),
     month INT,
     year INT,
     PRIMARY KEY (date_key)
@@ -23,35 +14,105 @@ CREATE TABLE dim_date (
 
 -- DIMENSION TABLE
 CREATE TABLE dim_ingredient (
-    ingredient VARCHAR(255),
-    unit VARCHAR(255),
-    grams_per_unit DECIMAL(10,2),
-    supplier VARCHAR(255),
-    container_description VARCHAR(255),
+    ingredient VARCHAR(64),
+    unit VARCHAR(16),
+    grams_per_unit DECIMAL(14,6),
+    supplier VARCHAR(32),
+    container_description VARCHAR(64),
     container_grams INT,
-    cost_per_unit DECIMAL(10,2),
-    cost_per_gram DECIMAL(10,2),
+    cost_per_unit DECIMAL(12,2),
+    cost_per_gram DECIMAL(16,10),
     ingredient_key INT,
-    PRIMARY KEY (ingredient_key)
+    valid_from DATE,
+    valid_to DATE,
+    PRIMARY KEY (ingredient_key),
+    UNIQUE KEY ux_dim_ingredient (ingredient, valid_from)
 );
 
 -- DIMENSION TABLE
 CREATE TABLE dim_product (
-    product_sku VARCHAR(255),
-    product_name VARCHAR(255),
-    category VARCHAR(255),
-    price DECIMAL(10,2),
+    product_sku VARCHAR(32),
+    product_name VARCHAR(128),
+    category VARCHAR(32),
+    price DECIMAL(12,2),
     product_key INT,
-    PRIMARY KEY (product_key)
+    valid_from DATE,
+    valid_to DATE,
+    PRIMARY KEY (product_key),
+    UNIQUE KEY ux_dim_product (product_sku, valid_from)
+);
+
+-- BRIDGE TABLE
+CREATE TABLE bridge_product_ingredient (
+    product_key INT,
+    ingredient_key INT,
+    quantity DECIMAL(14,6),
+    quantity_unit VARCHAR(16),
+    PRIMARY KEY (product_key, ingredient_key),
+    CONSTRAINT fk_bridge_product_ingredient_product_key FOREIGN KEY (product_key) REFERENCES dim_product (product_key),
+    CONSTRAINT fk_bridge_product_ingredient_ingredient_key FOREIGN KEY (ingredient_key) REFERENCES dim_ingredient (ingredient_key)
 );
 
 -- FACT TABLE
+-- product_key references dim_product(product_key) (not enforced: partitioned table)
+-- add_on_key references dim_product(product_key) (not enforced: partitioned table)
+-- date_key references dim_date(date_key) (not enforced: partitioned table)
 CREATE TABLE fact_orders (
     order_id INT,
     product_key INT,
+    add_on_key INT,
     date_key INT,
     quantity INT,
-    total_price DECIMAL(10,2),
-    ingredient_cost DECIMAL(10,2),
-    gross_margin DECIMAL(10,2)
+    total_price DECIMAL(12,2),
+    ingredient_cost DECIMAL(14,6),
+    gross_margin DECIMAL(14,6),
+    PRIMARY KEY (order_id, date_key),
+    KEY ix_fact_orders_date_key (date_key),
+    KEY ix_fact_orders_product_key (product_key)
+)
+PARTITION BY RANGE (date_key) (
+    PARTITION p2024 VALUES LESS THAN (20250000),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- ROLLUP TABLE
+CREATE TABLE kpi_daily_product (
+    period_start_key INT,
+    product_key INT,
+    orders INT,
+    dozens INT,
+    revenue DECIMAL(12,2),
+    ingredient_cost DECIMAL(14,6),
+    gross_margin DECIMAL(14,6),
+    margin_pct DECIMAL(14,6),
+    PRIMARY KEY (period_start_key, product_key),
+    CONSTRAINT fk_kpi_daily_product_product_key FOREIGN KEY (product_key) REFERENCES dim_product (product_key)
+);
+
+-- ROLLUP TABLE
+CREATE TABLE kpi_monthly_product (
+    period_start_key INT,
+    product_key INT,
+    orders INT,
+    dozens INT,
+    revenue DECIMAL(12,2),
+    ingredient_cost DECIMAL(14,6),
+    gross_margin DECIMAL(14,6),
+    margin_pct DECIMAL(14,6),
+    PRIMARY KEY (period_start_key, product_key),
+    CONSTRAINT fk_kpi_monthly_product_product_key FOREIGN KEY (product_key) REFERENCES dim_product (product_key)
+);
+
+-- ROLLUP TABLE
+CREATE TABLE kpi_weekly_product (
+    period_start_key INT,
+    product_key INT,
+    orders INT,
+    dozens INT,
+    revenue DECIMAL(12,2),
+    ingredient_cost DECIMAL(14,6),
+    gross_margin DECIMAL(14,6),
+    margin_pct DECIMAL(14,6),
+    PRIMARY KEY (period_start_key, product_key),
+    CONSTRAINT fk_kpi_weekly_product_product_key FOREIGN KEY (product_key) REFERENCES dim_product (product_key)
 );
\ No newline at end of file
@@ -2,78 +2,62 @@
 -- Cookie Bakery Data Warehouse Full Validation
 -- File: warehouse_validation.sql
 -- Purpose: Post-load validation of all tables and fact_orders metrics
+--
+-- The ETL runs these checks itself after every load
+-- (scripts/warehouse_validation.py, which builds the same queries) and
+-- fails the run on any violation. Every rule and metric is evaluated in a
+-- single pass over fact_orders; each violation column should be 0.
 -- ============================================
 
--- 1. Confirm tables exist and row counts
-SELECT table_name, table_rows
-FROM information_schema.tables
-WHERE table_schema = 'cookie_bakery_dw'
-  AND table_name IN ('dim_product', 'dim_date', 'dim_ingredient', 'bridge_product_ingredient', 'fact_orders');
-
--- 2. Foreign Key Integrity: fact_orders -> dimensions
-SELECT COUNT(*) AS orphan_product_keys
-FROM fact_orders f
-LEFT JOIN dim_product p ON f.product_key = p.product_key
-WHERE p.product_key IS NULL;
-
-SELECT COUNT(*) AS orphan_date_keys
-FROM fact_orders f
-LEFT JOIN dim_date d ON f.date_key = d.date_key
-WHERE d.date_key IS NULL;
-
--- 3. Null & Completeness Checks
-SELECT COUNT(*) AS null_order_id
-FROM fact_orders
-WHERE order_id IS NULL;
-
-SELECT COUNT(*) AS null_product_key
-FROM fact_orders
-WHERE product_key IS NULL;
-
-SELECT COUNT(*) AS null_date_key
-FROM fact_orders
-WHERE date_key IS NULL;
-
--- 4. Negative or impossible values
-SELECT COUNT(*) AS invalid_rows
-FROM fact_orders
-WHERE total_price < 0
-   OR ingredient_cost < 0
-   OR quantity <= 0;
-
--- 5. Derived metric validation (gross margin)
-SELECT COUNT(*) AS margin_mismatch_rows
-FROM fact_orders
-WHERE ABS(gross_margin - (total_price - ingredient_cost)) > 0.01;
-
--- 6. Ingredient cost should not exceed revenue
-SELECT COUNT(*) AS cost_exceeds_revenue
-FROM fact_orders
-WHERE ingredient_cost > total_price;
-
--- 7. Profitability / margin sanity checks
+-- 1. Row counts
 SELECT
-    MIN(gross_margin) AS min_gross_margin,
-    MAX(gross_margin) AS max_gross_margin,
-    AVG(gross_margin) AS avg_gross_margin,
-    AVG(gross_margin / NULLIF(total_price,0)) AS avg_margin_pct
-FROM fact_orders;
-
--- 8. Quantity vs price sanity
+    (SELECT COUNT(*) FROM dim_product) AS dim_product,
+    (SELECT COUNT(*) FROM dim_date) AS dim_date,
+    (SELECT COUNT(*) FROM dim_ingredient) AS dim_ingredient,
+    (SELECT COUNT(*) FROM bridge_product_ingredient) AS bridge_product_ingredient,
+    (SELECT COUNT(*) FROM fact_orders) AS fact_orders;
+
+-- 2. Foreign keys, nulls, negative values, margin and cost rules,
+--    margin / price-per-unit sanity and KPI totals: one scan of fact_orders.
+--    Dimension lookups are EXISTS subqueries, so duplicated dimension rows
+--    can't fan out the facts
+SELECT
+    SUM(CASE WHEN f.product_key IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dim_product WHERE dim_product.product_key = f.product_key) THEN 1 ELSE 0 END) AS orphan_product_keys,
+    SUM(CASE WHEN f.add_on_key IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dim_product WHERE dim_product.product_key = f.add_on_key) THEN 1 ELSE 0 END) AS orphan_add_on_keys,
+    SUM(CASE WHEN f.date_key IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dim_date WHERE dim_date.date_key = f.date_key) THEN 1 ELSE 0 END) AS orphan_date_keys,
+    SUM(CASE WHEN f.order_id IS NULL THEN 1 ELSE 0 END) AS null_order_id,
+    SUM(CASE WHEN f.product_key IS NULL THEN 1 ELSE 0 END) AS null_product_key,
+    SUM(CASE WHEN f.date_key IS NULL THEN 1 ELSE 0 END) AS null_date_key,
+    SUM(CASE WHEN f.total_price < 0 OR f.ingredient_cost < 0 OR f.quantity <= 0 THEN 1 ELSE 0 END) AS invalid_rows,
+    SUM(CASE WHEN ABS(f.gross_margin - (f.total_price - f.ingredient_cost)) > 0.01 THEN 1 ELSE 0 END) AS margin_mismatch_rows,
+    SUM(CASE WHEN f.ingredient_cost > f.total_price THEN 1 ELSE 0 END) AS cost_exceeds_revenue,
+    COUNT(*) AS total_orders,
+    SUM(f.total_price) AS total_revenue,
+    SUM(f.ingredient_cost) AS total_ingredient_cost,
+    SUM(f.gross_margin) AS total_gross_margin,
+    MIN(f.gross_margin) AS min_gross_margin,
+    MAX(f.gross_margin) AS max_gross_margin,
+    AVG(f.gross_margin) AS avg_gross_margin,
+    AVG(100.0 * f.gross_margin / NULLIF(f.total_price, 0)) AS avg_margin_pct,
+    MIN(f.total_price / NULLIF(f.quantity, 0)) AS min_price_per_unit,
+    MAX(f.total_price / NULLIF(f.quantity, 0)) AS max_price_per_unit
+FROM fact_orders f;
+
+-- 3. Bridge table references
 SELECT
-    MIN(total_price / NULLIF(quantity,0)) AS min_price_per_unit,
-    MAX(total_price / NULLIF(quantity,0)) AS max_price_per_unit
-FROM fact_orders;
+    SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM dim_product WHERE dim_product.product_key = b.product_key) THEN 1 ELSE 0 END) AS orphan_bridge_product_keys,
+    SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM dim_ingredient WHERE dim_ingredient.ingredient_key = b.ingredient_key) THEN 1 ELSE 0 END) AS orphan_bridge_ingredient_keys
+FROM bridge_product_ingredient b;
 
--- 9. High-level KPI summary
+-- 4. Repeated dimension business keys (surplus rows per key)
 SELECT
-    COUNT(*) AS total_orders,
-    SUM(total_price) AS total_revenue,
-    SUM(ingredient_cost) AS total_ingredient_cost,
-    SUM(gross_margin) AS total_gross_margin,
-    AVG(gross_margin / NULLIF(total_price,0)) AS avg_margin_pct
-FROM fact_orders;
+    (SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM dim_product GROUP BY product_sku, valid_from HAVING COUNT(*) > 1) dup) AS duplicate_dim_product_keys,
+    (SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM dim_ingredient GROUP BY ingredient, valid_from HAVING COUNT(*) > 1) dup) AS duplicate_dim_ingredient_keys,
+    (SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM dim_date GROUP BY date_key HAVING COUNT(*) > 1) dup) AS duplicate_dim_date_keys;
+
+-- 5. KPI rollups add up to fact_orders
+SELECT SUM(orders) AS orders, SUM(revenue) AS revenue, SUM(gross_margin) AS gross_margin FROM kpi_monthly_product;
 
 -- ============================================
 -- End of Full Validation Checks
--- ============================================
\ No newline at end of file
+-- ============================================
@@ -0,0 +1,256 @@
+"""
+End-to-end pipeline benchmark.
+
+Generates order histories of increasing size with createcsv.generate_orders
+and runs each pipeline stage on them: source inspection, the transforms,
+the staging CSV writes, schema generation and the warehouse load (into a
+local SQLite file standing in for MySQL, so it runs offline). Every stage
+runs in a fresh process so its peak RSS is its own.
+
+Results are written as JSON and compared with a previous run; stages that
+got slower or bigger than the threshold allows are flagged as regressions.
+
+    python scripts/benchmark.py --sizes 1000,10000,100000 --save
+    python scripts/benchmark.py --sizes 1000,10000,100000 --fail-on-regression
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(SCRIPT_DIR))
+
+BASE_DIR = SCRIPT_DIR.parent
+DEFAULT_WORK_DIR = BASE_DIR / "benchmarks" / "data"
+DEFAULT_BASELINE = BASE_DIR / "benchmarks" / "baseline.json"
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_THRESHOLD = 0.25
+STAGES = ["inspection", "transform", "staging_write", "schema", "load"]
+
+
+# --------------------------------------------------
+# STAGES (each runs in its own process)
+# --------------------------------------------------
+
+def _transform_inputs(root):
+    import pandas as pd
+    from costing import RecipeCostMatrix
+    from incremental import read_new_orders
+    from stage_cache import run_stages
+    from transforms import TRANSFORM_STAGES
+
+    source_dir = root / "source-data"
+    outputs = run_stages(
+        TRANSFORM_STAGES, source_dir, lambda name: pd.read_csv(source_dir / f"{name}.csv")
+    )
+    order_chunks, _ = read_new_orders(source_dir / "shopify_orders.csv", chunksize=100_000)
+    cost_matrix = RecipeCostMatrix(outputs["recipe_grams"], outputs["dim_ingredient"])
+    return outputs, order_chunks, cost_matrix
+
+
+def stage_inspection(root):
+    from initial_inspectdata import run_data_inspection
+
+    run_data_inspection(
+        source_folder=root / "source-data",
+        output_file=root / "inspection_report.txt",
+        fail_on_issues=False,
+    )
+    return None
+
+
+def stage_transform(root):
+    from fact_stream import stream_fact_orders
+
+    outputs, order_chunks, cost_matrix = _transform_inputs(root)
+    summary = stream_fact_orders(order_chunks, outputs["dim_product"], cost_matrix, lambda table, df: None)
+    return summary["fact_rows"]
+
+
+def stage_staging_write(root):
+    """Transform again, but only time the staging writes."""
+    from fact_stream import StagingChunkWriter, stream_fact_orders
+    from staging_io import write_staging
+
+    staging_dir = root / "staging-data"
+    staging_dir.mkdir(exist_ok=True)
+    outputs, order_chunks, cost_matrix = _transform_inputs(root)
+    writer = StagingChunkWriter(staging_dir)
+    write_seconds = [0.0]
+
+    def timed(write, *args, **kwargs):
+        start = time.perf_counter()
+        write(*args, **kwargs)
+        write_seconds[0] += time.perf_counter() - start
+
+    for table_name in ["dim_product", "dim_ingredient", "bridge_product_ingredient"]:
+        timed(write_staging, outputs[table_name], staging_dir, table_name)
+    summary = stream_fact_orders(
+        order_chunks, outputs["dim_product"], cost_matrix, lambda table, df: timed(writer.write, table, df)
+    )
+    return summary["fact_rows"], write_seconds[0]
+
+
+def stage_schema(root):
+    from generate_schema_sql import generate_schema
+
+    generate_schema(root / "staging-data", root / "SQL")
+    return None
+
+
+def stage_load(root):
+    from bulk_loader import create_loader_engine, get_loader
+    from staging_io import read_staging
+    import pandas as pd
+
+    db_path = root / "warehouse.db"
+    if db_path.exists():
+        db_path.unlink()
+    engine = create_loader_engine(f"sqlite:///{db_path}", "multirow")
+    loader = get_loader("multirow", engine, verbose=False)
+    staging_dir = root / "staging-data"
+
+    for table_name in ["dim_product", "dim_ingredient", "bridge_product_ingredient"]:
+        loader.load(table_name, read_staging(staging_dir, table_name))
+    with loader.transaction() as write:
+        write("dim_date", read_staging(staging_dir, "dim_date"))
+        rows = 0
+        for chunk in pd.read_csv(staging_dir / "fact_orders.csv", chunksize=100_000):
+            write("fact_orders", chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_stage(stage, root):
+    start = time.perf_counter()
+    result = globals()[f"stage_{stage}"](Path(root))
+    seconds = time.perf_counter() - start
+    if isinstance(result, tuple):
+        result, seconds = result
+    return seconds, result, _peak_rss_mb()
+
+
+# --------------------------------------------------
+# HARNESS
+# --------------------------------------------------
+
+def prepare_dataset(work_dir, size, seed):
+    """Generate (or reuse) source-data for one dataset size."""
+    from createcsv import generate_orders, write_orders, write_reference_data
+
+    root = Path(work_dir) / f"orders_{size}_seed{seed}"
+    source_dir = root / "source-data"
+    if not (source_dir / "shopify_orders.csv").exists():
+        source_dir.mkdir(parents=True, exist_ok=True)
+        write_reference_data(source_dir)
+        write_orders(source_dir, generate_orders(size, start_date="2022-01-01", end_date="2024-12-31", seed=seed))
+    return root
+
+
+def run_benchmark(sizes, work_dir=DEFAULT_WORK_DIR, seed=0, stages=STAGES):
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        root = prepare_dataset(work_dir, size, seed)
+        for stage in stages:
+            # A fresh process per stage keeps peak RSS attributable to it
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, rows, peak_rss_mb = pool.submit(_run_stage, stage, str(root)).result()
+            rows = size if rows is None else rows
+            record = {
+                "size": size,
+                "stage": stage,
+                "seconds": round(seconds, 4),
+                "rows": rows,
+                "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+                "peak_rss_mb": round(peak_rss_mb, 1),
+            }
+            results.append(record)
+            print(
+                f"{size:>10,} orders  {stage:<14} {seconds:9.3f}s  "
+                f"{record['rows_per_sec'] or 0:>14,.0f} rows/sec  {peak_rss_mb:8.1f} MB"
+            )
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def find_regressions(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return messages for stages whose time or peak RSS grew beyond threshold."""
+    previous = {(r["size"], r["stage"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for record in current["results"]:
+        before = previous.get((record["size"], record["stage"]))
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if before[metric] and record[metric] > before[metric] * (1 + threshold):
+                regressions.append(
+                    f"{record['stage']} @ {record['size']:,} orders: {metric} "
+                    f"{before[metric]} -> {record[metric]} (+{record[metric] / before[metric] - 1:.0%})"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bakery pipeline stages")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated order counts, e.g. 1000,10000,10000000")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help="Previous results to compare against")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Where to write this run's results (JSON)")
+    parser.add_argument("--save", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown/memory growth before flagging a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    stages = [stage for stage in args.stages.split(",") if stage]
+    current = run_benchmark(sizes, work_dir=args.work_dir, seed=args.seed, stages=stages)
+
+    regressions = []
+    if args.baseline.exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(current, json.load(f), args.threshold)
+        print("\nNo regressions against baseline." if not regressions else "\nREGRESSIONS:")
+        for message in regressions:
+            print(f"  {message}")
+
+    outputs = [args.output] if args.output else []
+    if args.save or not args.baseline.exists():
+        outputs.append(args.baseline)
+    for path in outputs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {path}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Bulk loaders for the warehouse LOAD step.
+
+Each loader writes DataFrames into existing (or auto-created) tables inside
+explicit transactions and records rows/sec per table:
+
+- multirow: INSERT batches of batch_size rows sent with executemany (one
+            compiled statement; MySQL drivers rewrite it into multi-row
+            INSERT ... VALUES)
+- infile:   LOAD DATA LOCAL INFILE from a temporary CSV (MySQL only)
+- to_sql:   pandas DataFrame.to_sql with chunksize (executemany as well)
+- upsert:   stage into a temp table, then merge only new or changed rows
+            keyed on each table's business key (idempotent reruns)
+
+multirow and to_sql work against any SQLAlchemy engine, including SQLite,
+which is what local runs and benchmarks use in place of MySQL.
+
+sqlalchemy is only imported once a loader touches the database, so the
+CLI can list and validate loaders without paying for the import.
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Business keys the upsert loader merges on
+BUSINESS_KEYS = {
+    "dim_location": ["location_key"],
+    # One row per version of a product or ingredient (see scd.py)
+    "dim_product": ["product_sku", "valid_from"],
+    "dim_ingredient": ["ingredient", "valid_from"],
+    "dim_date": ["date_key"],
+    "bridge_product_ingredient": ["product_key", "ingredient_key"],
+    "fact_orders": ["order_id"],
+    "kpi_daily_product": ["period_start_key", "product_key"],
+    "kpi_weekly_product": ["period_start_key", "product_key"],
+    "kpi_monthly_product": ["period_start_key", "product_key"],
+}
+
+
+def business_key(table_name, columns):
+    """BUSINESS_KEYS of table_name; rows tagged with a location are unique per location."""
+    keys = BUSINESS_KEYS[table_name]
+    if "location_key" in columns and "location_key" not in keys:
+        return ["location_key"] + keys
+    return keys
+
+
+# --------------------------------------------------
+# LOADER BASE
+# --------------------------------------------------
+
+class BulkLoader:
+    name = None
+    # Extra keyword arguments the engine needs for this loader
+    engine_options = {}
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.stats = {}
+
+    def load(self, table_name, df):
+        """Load one DataFrame into table_name in its own transaction."""
+        with self.transaction() as write:
+            write(table_name, df)
+
+    def replace_rows(self, table_name, df, key_column, scope=None):
+        """
+        Delete the rows whose key_column value appears in df, then load df,
+        in one transaction. Used to rewrite only the affected buckets of
+        rollup tables. scope ({column: value}) limits the delete further,
+        e.g. to one location.
+        """
+        from sqlalchemy import bindparam, inspect, text
+
+        keys = sorted(df[key_column].unique().tolist())
+        scope = scope or {}
+        condition = "".join(f" AND {col} = :scope_{col}" for col in scope)
+        params = {f"scope_{col}": value for col, value in scope.items()}
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            if inspect(conn).has_table(table_name):
+                delete = text(f"DELETE FROM {table_name} WHERE {key_column} IN :keys{condition}").bindparams(
+                    bindparam("keys", expanding=True)
+                )
+                for batch_start in range(0, len(keys), self.batch_size):
+                    conn.execute(delete, {"keys": keys[batch_start:batch_start + self.batch_size], **params})
+            if not df.empty:
+                self._write(conn, table_name, df)
+        self._record(table_name, len(df), time.perf_counter() - start)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yield a write(table_name, df) callable whose writes share one
+        transaction; used to stream chunks into one or more tables and
+        commit them together.
+        """
+        session_stats = {}
+        with self.engine.begin() as conn:
+            def write(table_name, df):
+                if df.empty:
+                    return
+                start = time.perf_counter()
+                self._write(conn, table_name, df)
+                rows, seconds = session_stats.get(table_name, (0, 0.0))
+                session_stats[table_name] = (rows + len(df), seconds + time.perf_counter() - start)
+
+            yield write
+
+        for table_name, (rows, seconds) in session_stats.items():
+            self._record(table_name, rows, seconds)
+
+    def _write(self, conn, table_name, df):
+        raise NotImplementedError
+
+    # Partitioned loads (see parallel_load.py) write into scratch copies of
+    # the tables and move them into the targets in one final transaction
+
+    def _prepare(self, conn, table_name, df):
+        """Make sure table_name exists before the scratch table is copied from it."""
+        from sqlalchemy import inspect
+
+        if not inspect(conn).has_table(table_name):
+            df.head(0).to_sql(table_name, con=conn, index=False)
+
+    def _write_scratch(self, conn, scratch_name, df):
+        self._write(conn, scratch_name, df)
+
+    def _merge_scratch(self, conn, table_name, scratch_name, columns):
+        """Move the rows of scratch_name into table_name; returns the row count."""
+        from sqlalchemy import text
+
+        column_list = ", ".join(columns)
+        result = conn.execute(text(
+            f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {scratch_name}"
+        ))
+        return max(result.rowcount, 0)
+
+    def _record(self, table_name, rows, seconds):
+        total_rows, total_seconds = self.stats.get(table_name, (0, 0.0))
+        self.stats[table_name] = (total_rows + rows, total_seconds + seconds)
+        if self.verbose:
+            rate = rows / seconds if seconds else float("inf")
+            print(f"{table_name}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/sec) via {self.name}")
+
+
+def _sql_values(df):
+    """Convert a DataFrame into row dicts of plain Python values (NaN -> None)."""
+    # Column by column: tolist() yields Python scalars, and only columns
+    # with missing values need a second pass
+    columns = []
+    for name in df.columns:
+        values = df[name].tolist()
+        if df[name].hasnans:
+            missing = df[name].isna().to_numpy()
+            values = [None if is_missing else value for value, is_missing in zip(values, missing)]
+        columns.append(values)
+    names = list(df.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+# --------------------------------------------------
+# LOADERS
+# --------------------------------------------------
+
+class MultiRowInsertLoader(BulkLoader):
+    name = "multirow"
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+        super().__init__(engine, batch_size, verbose)
+        self._tables = {}
+
+    def _table(self, conn, table_name, df):
+        from sqlalchemy import MetaData, Table
+        from sqlalchemy.exc import NoSuchTableError
+
+        if table_name not in self._tables:
+            try:
+                table = Table(table_name, MetaData(), autoload_with=conn)
+            except NoSuchTableError:
+                # Local stand-ins start empty; create the table from the frame
+                df.head(0).to_sql(table_name, con=conn, index=False)
+                table = Table(table_name, MetaData(), autoload_with=conn)
+            self._tables[table_name] = table
+        return self._tables[table_name]
+
+    def _prepare(self, conn, table_name, df):
+        self._table(conn, table_name, df)
+
+    def _write(self, conn, table_name, df):
+        from sqlalchemy import insert
+
+        table = self._table(conn, table_name, df)
+        statement = insert(table)
+        # executemany: the statement is compiled once, not once per batch
+        # with a bind parameter for every value
+        for start in range(0, len(df), self.batch_size):
+            conn.execute(statement, _sql_values(df.iloc[start:start + self.batch_size]))
+
+
+class UpsertLoader(MultiRowInsertLoader):
+    name = "upsert"
+
+    def _table(self, conn, table_name, df):
+        if table_name not in self._tables:
+            super()._table(conn, table_name, df)
+            self._ensure_unique_key(conn, table_name, df.columns)
+        return self._tables[table_name]
+
+    def _ensure_unique_key(self, conn, table_name, columns):
+        """
+        The merge needs a unique key to conflict on. Tables created by the
+        schema script have one; tables created by an append run get one here.
+        """
+        from sqlalchemy import inspect, text
+
+        keys = business_key(table_name, columns)
+        inspector = inspect(conn)
+        unique_keys = [inspector.get_pk_constraint(table_name)["constrained_columns"]]
+        unique_keys += [c["column_names"] for c in inspector.get_unique_constraints(table_name)]
+        unique_keys += [i["column_names"] for i in inspector.get_indexes(table_name) if i["unique"]]
+        # ON DUPLICATE KEY fires on any unique key, so on MySQL a key that starts
+        # with the business key will do (partitioned fact tables must add
+        # date_key to theirs)
+        if conn.dialect.name == "mysql" and any(key[:len(keys)] == keys for key in unique_keys):
+            return
+        if keys not in unique_keys:
+            self._remove_duplicates(conn, table_name, keys)
+            conn.execute(text(f"CREATE UNIQUE INDEX ux_{table_name} ON {table_name} ({', '.join(keys)})"))
+
+    def _remove_duplicates(self, conn, table_name, keys):
+        """
+        Append-mode runs can leave several rows per business key, which the
+        unique key can't be created over. Keep the last row loaded for each
+        key (highest rowid on SQLite, table order elsewhere).
+        """
+        import pandas as pd
+        from sqlalchemy import and_, bindparam, delete, insert
+
+        table = self._tables[table_name]
+        key_list = ", ".join(keys)
+        duplicated = f"SELECT {key_list} FROM {table_name} GROUP BY {key_list} HAVING COUNT(*) > 1"
+        join = " AND ".join(f"t.{key} = d.{key}" for key in keys)
+        order = " ORDER BY t.rowid" if conn.dialect.name == "sqlite" else ""
+        rows = pd.read_sql(f"SELECT t.* FROM {table_name} t JOIN ({duplicated}) d ON {join}{order}", conn)
+        if rows.empty:
+            return
+
+        kept = rows.drop_duplicates(subset=keys, keep="last")
+        conn.execute(
+            delete(table).where(and_(*[table.c[key] == bindparam(f"key_{key}") for key in keys])),
+            [{f"key_{key}": value for key, value in row.items()} for row in _sql_values(kept[keys])],
+        )
+        conn.execute(insert(table), _sql_values(kept))
+        print(
+            f"{table_name}: removed {len(rows) - len(kept)} duplicate rows of {len(kept)} "
+            f"({key_list}) values before adding its unique key; kept the last row loaded"
+        )
+
+    def _write(self, conn, table_name, df):
+        from sqlalchemy import text
+
+        if table_name not in BUSINESS_KEYS:
+            raise ValueError(f"No business key defined for {table_name}; cannot upsert.")
+        self._table(conn, table_name, df)
+
+        # Stage the batch into a temp table with the target's column types
+        staging_name = f"tmp_{table_name}"
+        drop = "DROP TEMPORARY TABLE" if conn.dialect.name == "mysql" else "DROP TABLE"
+        conn.execute(text(f"{drop} IF EXISTS {staging_name}"))
+        conn.execute(text(f"CREATE TEMPORARY TABLE {staging_name} AS SELECT * FROM {table_name} WHERE 1 = 0"))
+        self._write_scratch(conn, staging_name, df)
+        self._merge_scratch(conn, table_name, staging_name, list(df.columns))
+        conn.execute(text(f"{drop} {staging_name}"))
+
+    def _write_scratch(self, conn, scratch_name, df):
+        # Plain inserts: the staging tables have no unique key to merge on
+        from sqlalchemy import column, insert, table
+
+        statement = insert(table(scratch_name, *[column(col) for col in df.columns]))
+        for start in range(0, len(df), self.batch_size):
+            conn.execute(statement, _sql_values(df.iloc[start:start + self.batch_size]))
+
+    def _merge_scratch(self, conn, table_name, scratch_name, columns):
+        from sqlalchemy import text
+
+        result = conn.execute(text(_merge_sql(conn.dialect.name, table_name, scratch_name, columns)))
+        merged = max(result.rowcount, 0)
+        if self.verbose:
+            print(f"{table_name}: {merged} new or changed rows merged")
+        return merged
+
+
+def _merge_sql(dialect, table_name, staging_name, columns):
+    """
+    Set-based merge of staging_name into table_name. Only rows that are new
+    or differ from the warehouse are selected, so unchanged rows cost nothing.
+    """
+    keys = business_key(table_name, columns)
+    values = [col for col in columns if col not in keys]
+
+    join = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+    if dialect == "mysql":
+        changed = " OR ".join(f"NOT (s.{col} <=> t.{col})" for col in values)
+    else:
+        changed = " OR ".join(f"s.{col} IS NOT t.{col}" for col in values)
+    where = f"t.{keys[0]} IS NULL" + (f" OR {changed}" if changed else "")
+
+    select = (
+        f"SELECT {', '.join(f's.{col}' for col in columns)} "
+        f"FROM {staging_name} s LEFT JOIN {table_name} t ON {join} "
+        f"WHERE {where}"
+    )
+    insert_into = f"INSERT INTO {table_name} ({', '.join(columns)}) {select}"
+
+    if dialect == "mysql":
+        # The SELECT joins the target, so its column names would be ambiguous
+        # in the UPDATE clause; selecting from a derived table hides the join
+        insert_into = f"INSERT INTO {table_name} ({', '.join(columns)}) SELECT * FROM ({select}) AS src"
+        updates = ", ".join(f"{col} = VALUES({col})" for col in values) or f"{keys[0]} = {keys[0]}"
+        return f"{insert_into} ON DUPLICATE KEY UPDATE {updates}"
+
+    updates = ", ".join(f"{col} = excluded.{col}" for col in values)
+    conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    return f"{insert_into} ON CONFLICT ({', '.join(keys)}) {conflict}"
+
+
+class LoadDataInfileLoader(BulkLoader):
+    name = "infile"
+    engine_options = {"connect_args": {"local_infile": True}}
+
+    def _write(self, conn, table_name, df):
+        from sqlalchemy import text
+
+        if conn.dialect.name != "mysql":
+            raise ValueError("The infile loader needs a MySQL connection; use multirow instead.")
+
+        fd, path = tempfile.mkstemp(suffix=".csv", prefix=f"{table_name}_")
+        os.close(fd)
+        try:
+            # \N is how LOAD DATA spells NULL
+            df.to_csv(path, index=False, header=False, na_rep="\\N", lineterminator="\n")
+            columns = ", ".join(f"`{col}`" for col in df.columns)
+            infile = path.replace("\\", "/")
+            conn.execute(text(
+                f"LOAD DATA LOCAL INFILE '{infile}' INTO TABLE `{table_name}` "
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                "LINES TERMINATED BY '\\n' "
+                f"({columns})"
+            ))
+        finally:
+            os.remove(path)
+
+
+class ToSqlLoader(BulkLoader):
+    name = "to_sql"
+
+    def _write(self, conn, table_name, df):
+        df.to_sql(
+            table_name,
+            con=conn,
+            if_exists="append",
+            index=False,
+            chunksize=self.batch_size,
+        )
+
+
+LOADERS = {
+    loader.name: loader
+    for loader in (MultiRowInsertLoader, UpsertLoader, LoadDataInfileLoader, ToSqlLoader)
+}
+
+
+def get_loader(name, engine, batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+    if name not in LOADERS:
+        raise ValueError(f"Unknown loader '{name}'. Choose from: {', '.join(LOADERS)}")
+    return LOADERS[name](engine, batch_size=batch_size, verbose=verbose)
+
+
+def create_loader_engine(db_url, loader_name, pool_size=None):
+    """
+    Create the engine, enabling what the chosen loader needs on MySQL.
+    pool_size caps the number of open connections (parallel loads).
+    """
+    from sqlalchemy import create_engine, make_url
+
+    options = {}
+    backend = make_url(db_url).get_backend_name()
+    if backend == "mysql":
+        options = dict(LOADERS[loader_name].engine_options)
+    if pool_size is not None and backend != "sqlite":
+        options.update(pool_size=pool_size, max_overflow=0)
+    return create_engine(db_url, **options)
@@ -2,11 +2,21 @@
 Python script to create CSV files for bakery pipeline data.
 Using ChatGPT-generated dummy data to simulate Shopify data 
 for orders and products, and ingredient/recipe data for cost calculations.
+
+By default the 100 hand-written orders below are written. With --orders N
+a seeded generator streams N synthetic orders instead, for load and soak
+testing, optionally with dirty rows to exercise the validations:
+
+    python scripts/createcsv.py --orders 5000000 --seed 7 --dirty-rate 0.001
 '''
 
+import argparse
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
-output_path = "/Users/katiewojciechowski/Projects/bakery-project/bakery-pipeline/source-data/"
+OUTPUT_DIR = Path(__file__).resolve().parent.parent / "source-data"
 
 # ----------------------
 # Shopify Products
@@ -24,8 +34,6 @@ products_data = [
     {"cookie_sku":"ADD-SEASALT","product_name":"Sea Salt Topping","category":"Add-on","price":0.00}
 ]
 
-products_df = pd.DataFrame(products_data)
-products_df.to_csv(output_path + "shopify_products.csv", index=False)
 
 # ----------------------
 # Ingredients
@@ -50,8 +58,6 @@ ingredients_data = [
     {"ingredient":"Sea salt","unit":"tsp","grams_per_unit":6,"supplier":"SaltWorks","container_description":"1 lb pouch","container_grams":454,"cost_per_unit":0.03,"cost_per_gram":0.005000}
 ]
 
-ingredients_df = pd.DataFrame(ingredients_data)
-ingredients_df.to_csv(output_path + "ingredients.csv", index=False)
 
 # ----------------------
 # Recipes
@@ -90,8 +96,6 @@ recipes_data = [
     {"sku":"ADD-SEASALT","ingredient":"Sea salt","quantity_unit":"tsp","quantity":0.1},
 ]
 
-recipes_df = pd.DataFrame(recipes_data)
-recipes_df.to_csv(output_path + "recipes.csv", index=False)
 
 # ----------------------
 # Shopify Orders
@@ -203,6 +207,172 @@ order_list = [
     {"order_id":"1100","date":"2024-02-11","sku":"CK-CHOC-001","quantity":2,"add_on_sku":"ADD-NUTELLA","total_price":64.00}
 ]
 
-orders_df = pd.DataFrame(order_list)
-orders_df['date'] = pd.to_datetime(orders_df['date'])  # Convert to datetime
-orders_df.to_csv(output_path + "shopify_orders.csv", index=False)
\ No newline at end of file
+
+# ----------------------
+# Synthetic Order Generator
+# ----------------------
+
+GENERATOR_CHUNKSIZE = 100_000
+
+DEFAULT_SKU_WEIGHTS = {"CK-CHOC-001": 0.45, "CK-SUGAR-001": 0.30, "CK-NUTMARB-001": 0.25}
+DEFAULT_ADD_ON_WEIGHTS = {"ADD-NUTELLA": 0.40, "ADD-PB": 0.25, "ADD-SEASALT": 0.35}
+DEFAULT_QUANTITY_WEIGHTS = {1: 0.35, 2: 0.30, 3: 0.20, 4: 0.10, 5: 0.05}
+
+# Relative order volume per month (Jan..Dec) and weekday (Mon..Sun)
+SEASONALITY = {
+    "flat": ([1.0] * 12, [1.0] * 7),
+    "bakery": (
+        [0.8, 1.2, 0.9, 0.9, 1.0, 0.9, 0.8, 0.8, 0.9, 1.0, 1.3, 1.6],
+        [0.7, 0.8, 0.9, 1.0, 1.3, 1.5, 1.2],
+    ),
+}
+
+DIRTY_KINDS = ("bad_sku", "negative_quantity", "duplicate_id")
+
+
+def _normalized(weights):
+    values = np.asarray(list(weights.values()), dtype=float)
+    return list(weights.keys()), values / values.sum()
+
+
+def generate_orders(
+    n_orders,
+    start_date="2024-01-01",
+    end_date="2024-12-31",
+    sku_weights=None,
+    add_on_rate=0.5,
+    add_on_weights=None,
+    quantity_weights=None,
+    seasonality="bakery",
+    dirty_rate=0.0,
+    dirty_kinds=DIRTY_KINDS,
+    seed=0,
+    first_order_id=1001,
+    chunksize=GENERATOR_CHUNKSIZE,
+):
+    """
+    Yield DataFrames of synthetic orders, chunksize rows at a time.
+
+    Orders are spread over the date range by month/weekday seasonality and
+    come out in date order with increasing order_id, like a Shopify export.
+    Output is deterministic for a given seed and chunksize. With dirty_rate
+    set, that share of rows gets one of dirty_kinds applied.
+    """
+    prices = {p["cookie_sku"]: p["price"] for p in products_data}
+    skus, sku_p = _normalized(sku_weights or DEFAULT_SKU_WEIGHTS)
+    add_ons, add_on_p = _normalized(add_on_weights or DEFAULT_ADD_ON_WEIGHTS)
+    quantities, quantity_p = _normalized(quantity_weights or DEFAULT_QUANTITY_WEIGHTS)
+    sku_prices = np.array([prices[sku] for sku in skus])
+    add_on_prices = np.array([prices[sku] for sku in add_ons])
+
+    # Spread all orders over the days up front; only per-day counts are kept
+    days = pd.date_range(start_date, end_date, freq="D")
+    month_weights, weekday_weights = SEASONALITY[seasonality] if isinstance(seasonality, str) else seasonality
+    day_p = np.asarray(month_weights)[days.month - 1] * np.asarray(weekday_weights)[days.dayofweek]
+    day_counts = np.random.default_rng([seed, 0]).multinomial(n_orders, day_p / day_p.sum())
+    day_ends = np.cumsum(day_counts)
+    day_labels = days.strftime("%Y-%m-%d").to_numpy()
+
+    for chunk_index, start in enumerate(range(0, n_orders, chunksize)):
+        rng = np.random.default_rng([seed, chunk_index + 1])
+        size = min(chunksize, n_orders - start)
+        positions = np.arange(start, start + size)
+
+        sku_idx = rng.choice(len(skus), size=size, p=sku_p)
+        quantity = np.asarray(quantities)[rng.choice(len(quantities), size=size, p=quantity_p)]
+        has_add_on = rng.random(size) < add_on_rate
+        add_on_idx = rng.choice(len(add_ons), size=size, p=add_on_p)
+
+        unit_price = sku_prices[sku_idx] + np.where(has_add_on, add_on_prices[add_on_idx], 0.0)
+        orders = pd.DataFrame({
+            "order_id": first_order_id + positions,
+            "date": day_labels[np.searchsorted(day_ends, positions, side="right")],
+            "sku": np.asarray(skus, dtype=object)[sku_idx],
+            "quantity": quantity,
+            "add_on_sku": np.where(has_add_on, np.asarray(add_ons, dtype=object)[add_on_idx], ""),
+            "total_price": unit_price * quantity,
+        })
+
+        if dirty_rate and dirty_kinds:
+            dirty = np.flatnonzero(rng.random(size) < dirty_rate)
+            kinds = np.asarray(dirty_kinds)[rng.integers(len(dirty_kinds), size=len(dirty))]
+            orders.loc[dirty[kinds == "bad_sku"], "sku"] = "CK-UNKNOWN-999"
+            orders.loc[dirty[kinds == "negative_quantity"], "quantity"] *= -1
+            # Re-delivered orders reuse the id of the order just before them
+            duplicate = dirty[(kinds == "duplicate_id") & (dirty > 0)]
+            orders.loc[duplicate, "order_id"] = orders["order_id"].to_numpy()[duplicate - 1]
+
+        yield orders
+
+
+# ----------------------
+# Write CSVs
+# ----------------------
+
+def write_reference_data(output_dir):
+    pd.DataFrame(products_data).to_csv(Path(output_dir) / "shopify_products.csv", index=False)
+    pd.DataFrame(ingredients_data).to_csv(Path(output_dir) / "ingredients.csv", index=False)
+    pd.DataFrame(recipes_data).to_csv(Path(output_dir) / "recipes.csv", index=False)
+
+
+def write_orders(output_dir, chunks):
+    """Stream order chunks to shopify_orders.csv; returns the row count."""
+    path = Path(output_dir) / "shopify_orders.csv"
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def _parse_weights(text):
+    """Parse "KEY=WEIGHT,KEY=WEIGHT" into a dict."""
+    pairs = (item.split("=") for item in text.split(","))
+    return {key.strip(): float(weight) for key, weight in pairs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate bakery source CSVs")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--orders", type=int, default=None,
+                        help="Generate this many synthetic orders instead of the 100 sample orders")
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--end-date", default="2024-12-31")
+    parser.add_argument("--sku-weights", type=_parse_weights, default=None,
+                        help='Cookie mix, e.g. "CK-CHOC-001=0.5,CK-SUGAR-001=0.3,CK-NUTMARB-001=0.2"')
+    parser.add_argument("--add-on-rate", type=float, default=0.5)
+    parser.add_argument("--seasonality", choices=sorted(SEASONALITY), default="bakery")
+    parser.add_argument("--dirty-rate", type=float, default=0.0,
+                        help="Share of rows to corrupt (bad SKU, negative quantity, duplicate id)")
+    parser.add_argument("--dirty-kinds", default=",".join(DIRTY_KINDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=GENERATOR_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    write_reference_data(args.output_dir)
+
+    if args.orders is None:
+        orders_df = pd.DataFrame(order_list)
+        orders_df['date'] = pd.to_datetime(orders_df['date'])  # Convert to datetime
+        orders_df.to_csv(args.output_dir / "shopify_orders.csv", index=False)
+        print(f"Wrote {len(orders_df)} sample orders to {args.output_dir}")
+        return
+
+    rows = write_orders(args.output_dir, generate_orders(
+        args.orders,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        sku_weights=args.sku_weights,
+        add_on_rate=args.add_on_rate,
+        seasonality=args.seasonality,
+        dirty_rate=args.dirty_rate,
+        dirty_kinds=tuple(kind for kind in args.dirty_kinds.split(",") if kind),
+        seed=args.seed,
+        chunksize=args.chunksize,
+    ))
+    print(f"Wrote {rows} generated orders to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,333 @@
+"""
+Persistent index of the orders already loaded, for dropping re-deliveries.
+
+Every order that reaches the warehouse is recorded by order_id together
+with a hash of its source row. Extract checks each batch against the
+index: an order_id seen before with the same row is a re-delivery and is
+dropped; one seen before with different values is a conflict, dropped
+and appended to conflicts.csv for review. The first loaded row of an
+order_id always wins. Repeats within one run are left to the inspection,
+which fails on them.
+
+The index lives in staging-data/dedup/ as an LSM-style set of sorted key
+files:
+
+- a base file of sorted order_ids and their row hashes, memory-mapped,
+  with a Bloom filter over its order_ids
+- small sorted segment files, one per committed run or micro-batch
+
+A batch is first tested against the Bloom filter, so only the order_ids
+that might have been seen (re-deliveries plus ~1% false positives) are
+binary-searched in the sorted files. Checking a batch costs O(batch), not
+O(history). New keys are held in memory until the load has committed and
+are then written as a new segment; the manifest is replaced last, so a
+crash never leaves a half-written index behind. Compaction merges the
+segments into a new base and re-sizes the Bloom filter; it runs on its own
+once the segments grow large, or on demand:
+
+    python scripts/dedup_index.py --compact
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEDUP_DIR = "dedup"
+MANIFEST_FILE = "manifest.json"
+CONFLICTS_FILE = "conflicts.csv"
+
+BLOOM_ERROR_RATE = 0.01
+MIN_CAPACITY = 1_000_000
+
+# Segments are merged into one once there are this many, and into the base
+# once they hold this share of its keys
+MAX_SEGMENTS = 32
+MAX_SEGMENT_SHARE = 0.25
+
+# Row hash of orders recorded without their source row (migrated from the
+# staged fact_orders); any row with that order_id counts as a re-delivery
+UNKNOWN_HASH = 0
+
+
+def row_hashes(orders):
+    """64-bit hash of each order row; numbers hash alike whether parsed as int or float."""
+    columns = {
+        col: orders[col].astype("float64") if pd.api.types.is_numeric_dtype(orders[col]) else orders[col].astype(str)
+        for col in sorted(orders.columns)
+    }
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+    # Keep UNKNOWN_HASH free for migrated keys
+    return np.where(hashes == UNKNOWN_HASH, 1, hashes).astype(np.uint64)
+
+
+# --------------------------------------------------
+# BLOOM FILTER
+# --------------------------------------------------
+
+def _mix(keys):
+    """splitmix64 finalizer: spreads sequential order_ids over all 64 bits."""
+    z = keys.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class BloomFilter:
+    """Bloom filter over int64 keys, as a numpy bit array."""
+
+    def __init__(self, n_bits, n_hashes, bits=None):
+        self.n_bits = int(n_bits)
+        self.n_hashes = int(n_hashes)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=BLOOM_ERROR_RATE):
+        n_bits = int(np.ceil(-capacity * np.log(error_rate) / np.log(2) ** 2))
+        n_hashes = max(1, int(round(n_bits / capacity * np.log(2))))
+        return cls(n_bits, n_hashes)
+
+    def _positions(self, keys):
+        # Double hashing: position i is h1 + i * h2 (mod n_bits)
+        keys = np.asarray(keys, dtype=np.int64).view(np.uint64)
+        h1 = _mix(keys)
+        h2 = _mix(keys ^ np.uint64(0x5851F42D4C957F2D)) | np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, keys):
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    def might_contain(self, keys):
+        positions = self._positions(keys)
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+
+# --------------------------------------------------
+# SORTED KEY FILES
+# --------------------------------------------------
+
+def _sorted_run(order_ids, hashes):
+    order = np.argsort(order_ids, kind="stable")
+    return np.asarray(order_ids, dtype=np.int64)[order], np.asarray(hashes, dtype=np.uint64)[order]
+
+
+def _search(run, order_ids):
+    """(found, stored hash) of order_ids in one sorted run."""
+    keys, hashes = run
+    if len(keys) == 0:
+        return np.zeros(len(order_ids), dtype=bool), np.zeros(len(order_ids), dtype=np.uint64)
+    at = np.minimum(np.searchsorted(keys, order_ids), len(keys) - 1)
+    return keys[at] == order_ids, hashes[at]
+
+
+def _write_atomic(path, write):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class OrderIndex:
+    """
+    The order_ids (and row hashes) already loaded from one staging directory.
+    reset=True starts an empty index that replaces the saved one on commit
+    (full runs reload every order).
+    """
+
+    def __init__(self, index_dir, reset=False):
+        self.index_dir = Path(index_dir)
+        self.manifest = {"generation": 0, "next_segment": 0, "segments": [], "n_bits": 0, "n_hashes": 0}
+        self.base = (np.empty(0, np.int64), np.empty(0, np.uint64))
+        self.segments = []
+        self.bloom = BloomFilter.for_capacity(MIN_CAPACITY)
+        self.reset = reset
+        self._pending = []
+
+        manifest_path = self.index_dir / MANIFEST_FILE
+        if reset or not manifest_path.exists():
+            return
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        base = self._base_name(self.manifest["generation"])
+        self.base = (
+            np.load(self.index_dir / f"{base}-order_ids.npy", mmap_mode="r"),
+            np.load(self.index_dir / f"{base}-row_hashes.npy", mmap_mode="r"),
+        )
+        self.bloom = BloomFilter(
+            self.manifest["n_bits"], self.manifest["n_hashes"], np.load(self.index_dir / f"{base}-bloom.npy")
+        )
+        for name in self.manifest["segments"]:
+            with np.load(self.index_dir / name) as segment:
+                self.segments.append((segment["order_ids"], segment["row_hashes"]))
+                self.bloom.add(segment["order_ids"])
+
+    @staticmethod
+    def _base_name(generation):
+        return f"base-{generation:06d}"
+
+    @property
+    def exists(self):
+        return (self.index_dir / MANIFEST_FILE).exists() and not self.reset
+
+    def __len__(self):
+        return len(self.base[0]) + sum(len(keys) for keys, _ in self.segments + self._pending)
+
+    def lookup(self, order_ids, pending=True):
+        """
+        (seen, stored row hash) of each order_id. pending includes this
+        run's uncommitted keys.
+        """
+        order_ids = np.asarray(order_ids, dtype=np.int64)
+        seen = np.zeros(len(order_ids), dtype=bool)
+        stored = np.zeros(len(order_ids), dtype=np.uint64)
+        candidates = np.flatnonzero(self.bloom.might_contain(order_ids))
+        for run in [self.base] + self.segments + (self._pending if pending else []):
+            if len(candidates) == 0:
+                break
+            found, hashes = _search(run, order_ids[candidates])
+            seen[candidates[found]] = True
+            stored[candidates[found]] = hashes[found]
+            candidates = candidates[~found]
+        return seen, stored
+
+    def add(self, order_ids, hashes):
+        """Record keys in memory; they are written by commit()."""
+        if len(order_ids) == 0:
+            return
+        run = _sorted_run(order_ids, hashes)
+        self._pending.append(run)
+        self.bloom.add(run[0])
+
+    def seed(self, order_ids):
+        """Record order_ids whose source rows are unknown (an index built from loaded facts)."""
+        order_ids = np.unique(np.asarray(order_ids, dtype=np.int64))
+        self.add(order_ids, np.full(len(order_ids), UNKNOWN_HASH, dtype=np.uint64))
+
+    def split(self, orders):
+        """
+        Split a batch of orders into (new, re-delivered, conflicting) rows
+        and record the new ones. Re-delivered and conflicting rows reuse an
+        order_id loaded by an earlier run; conflicting ones with different
+        values.
+
+        An order_id repeated within this run is a source error, not a
+        re-delivery (the inspection fails on it), so it raises ValueError.
+        """
+        order_ids = orders["order_id"].to_numpy(dtype=np.int64)
+        hashes = row_hashes(orders)
+        seen, stored = self.lookup(order_ids, pending=False)
+        repeated = pd.Series(order_ids).duplicated().to_numpy()
+        if self._pending:
+            repeated |= self.lookup(order_ids)[0] & ~seen
+        if repeated.any():
+            raise ValueError(
+                f"{int(repeated.sum())} orders repeat an order_id of this run "
+                f"(first: {order_ids[repeated][0]}); fix the source or quarantine them"
+            )
+
+        conflict = seen & (stored != UNKNOWN_HASH) & (stored != hashes)
+        new = ~seen
+        self.add(order_ids[new], hashes[new])
+        return orders[new], orders[seen & ~conflict], orders[conflict]
+
+    # -----------------------------
+    # PERSISTENCE
+    # -----------------------------
+    def commit(self):
+        """Write this run's keys as a segment; compacts when the segments have grown large."""
+        if not self._pending and not self.reset:
+            return
+        if self.reset or not (self.index_dir / MANIFEST_FILE).exists():
+            # A full run's keys replace the whole index; the first keys become the base
+            self.compact()
+            return
+
+        order_ids, hashes = _sorted_run(
+            np.concatenate([keys for keys, _ in self._pending]),
+            np.concatenate([hashes for _, hashes in self._pending]),
+        )
+        name = f"segment-{self.manifest['next_segment']:08d}.npz"
+        _write_atomic(self.index_dir / name, lambda f: np.savez(f, order_ids=order_ids, row_hashes=hashes))
+        self.segments.append((order_ids, hashes))
+        self._pending = []
+        self.manifest["segments"].append(name)
+        self.manifest["next_segment"] += 1
+        self._save_manifest()
+
+        segment_keys = sum(len(keys) for keys, _ in self.segments)
+        if segment_keys > MAX_SEGMENT_SHARE * max(len(self.base[0]), MIN_CAPACITY):
+            self.compact()
+        elif len(self.segments) > MAX_SEGMENTS:
+            self.merge_segments()
+
+    def merge_segments(self):
+        """Merge the segments into one, leaving the base as it is."""
+        segments, self.segments = self.segments, []
+        self._pending = segments + self._pending
+        self.manifest["segments"] = []
+        self.commit()
+        self._remove_unreferenced()
+
+    def compact(self):
+        """
+        Merge the base, the segments and any uncommitted keys into a new base
+        with a Bloom filter sized for twice its keys.
+        """
+        runs = [self.base] + self.segments + self._pending
+        order_ids, hashes = _sorted_run(
+            np.concatenate([np.asarray(keys) for keys, _ in runs]),
+            np.concatenate([np.asarray(hashes) for _, hashes in runs]),
+        )
+        bloom = BloomFilter.for_capacity(max(MIN_CAPACITY, 2 * len(order_ids)))
+        bloom.add(order_ids)
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        generation = self.manifest["generation"] + 1
+        base = self._base_name(generation)
+        _write_atomic(self.index_dir / f"{base}-order_ids.npy", lambda f: np.save(f, order_ids))
+        _write_atomic(self.index_dir / f"{base}-row_hashes.npy", lambda f: np.save(f, hashes))
+        _write_atomic(self.index_dir / f"{base}-bloom.npy", lambda f: np.save(f, bloom.bits))
+
+        self.manifest.update(generation=generation, segments=[], n_bits=bloom.n_bits, n_hashes=bloom.n_hashes)
+        self._save_manifest()
+        self.base, self.segments, self._pending, self.bloom, self.reset = (order_ids, hashes), [], [], bloom, False
+        self._remove_unreferenced()
+        print(f"Order index compacted: {len(order_ids):,} orders in {base}")
+
+    def _save_manifest(self):
+        data = json.dumps(self.manifest, indent=2).encode("utf-8")
+        _write_atomic(self.index_dir / MANIFEST_FILE, lambda f: f.write(data))
+
+    def _remove_unreferenced(self):
+        base = self._base_name(self.manifest["generation"])
+        keep = set(self.manifest["segments"]) | {MANIFEST_FILE, CONFLICTS_FILE}
+        for path in self.index_dir.iterdir():
+            if path.name not in keep and not path.name.startswith(base + "-"):
+                path.unlink()
+
+
+def record_conflicts(index_dir, conflicts):
+    """Append conflicting re-deliveries to conflicts.csv."""
+    path = Path(index_dir) / CONFLICTS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conflicts.to_csv(path, mode="a", header=not path.exists(), index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact the persistent order index")
+    parser.add_argument("--staging-dir", type=Path, default=Path("staging-data"))
+    parser.add_argument("--compact", action="store_true", help="Merge all segments into a new base file")
+    args = parser.parse_args()
+
+    index = OrderIndex(args.staging_dir / DEDUP_DIR)
+    if args.compact:
+        index.compact()
+    print(
+        f"{len(index):,} orders indexed: {len(index.base[0]):,} in the base, "
+        f"{sum(len(keys) for keys, _ in index.segments):,} in {len(index.segments)} segments"
+    )
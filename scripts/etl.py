@@ -1,6 +1,7 @@
+import argparse
+import json
 import sys
 from pathlib import Path
-import pandas as pd
 
 # -----------------------------
 # ENSURE SCRIPT FOLDER IS ON PYTHON PATH
@@ -9,196 +10,275 @@ import pandas as pd
 SCRIPT_DIR = Path(__file__).resolve().parent
 sys.path.append(str(SCRIPT_DIR))
 
-# Try normal import (works when module is on PYTHONPATH), otherwise load by file path
-try:
-    from initial_inspectdata import run_data_inspection
-except Exception:
-    import importlib.util
-    module_path = SCRIPT_DIR / "initial_inspectdata.py"
-    if not module_path.exists():
-        raise ImportError(f"Could not import 'initial_inspectdata' and file not found at {module_path}")
-    spec = importlib.util.spec_from_file_location("initial_inspectdata", str(module_path))
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    run_data_inspection = module.run_data_inspection
+# Only light modules are imported here; pandas, sqlalchemy and chardet are
+# imported by the pipeline stage that needs them
+from bulk_loader import DEFAULT_BATCH_SIZE, LOADERS
+from instrumentation import PROFILERS
+from parallel_load import DEFAULT_LOAD_WORKERS
+from pipeline import DB_URL_ENV, ETL_STAGES, NO_DB_URL, SOURCE_DIR, SQL_DIR, STAGING_DIR, Pipeline, db_url_from_env
+from stage_cache import DEFAULT_CACHE_MAX_BYTES
+from staging_io import STAGING_FORMATS
+from watch import DEFAULT_BATCH_ROWS, DEFAULT_DEBOUNCE_SECONDS, DEFAULT_MAX_PENDING
 
 # -----------------------------
-# PATH CONFIGURATION
+# RUN OPTIONS
 # -----------------------------
-BASE_DIR = SCRIPT_DIR.parent
-SOURCE_DIR = BASE_DIR / "source-data"
-STAGING_DIR = BASE_DIR / "staging-data"
+def build_parser():
+    parser = argparse.ArgumentParser(description="Cookie bakery ETL pipeline")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=None,
+        help="JSON file of option defaults (e.g. {\"db_url\": ..., \"source_dir\": ...}); flags win",
+    )
+    parser.add_argument("--source-dir", type=Path, default=SOURCE_DIR)
+    parser.add_argument("--staging-dir", type=Path, default=STAGING_DIR)
+    parser.add_argument("--sql-dir", type=Path, default=SQL_DIR, help="Where --schema-only writes the schema")
+    parser.add_argument(
+        "--db-url",
+        default=db_url_from_env(),
+        help=f"SQLAlchemy URL of the warehouse (e.g. sqlite:///bakery.db for a local stand-in); "
+             f"defaults to ${DB_URL_ENV}, or a MySQL URL built from $BAKERY_DB_USER, $BAKERY_DB_PASSWORD, "
+             f"$BAKERY_DB_HOST, $BAKERY_DB_PORT and $BAKERY_DB_NAME",
+    )
 
-STAGING_DIR.mkdir(exist_ok=True)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the resolved configuration and stages without reading any data",
+    )
+    mode.add_argument("--inspect-only", action="store_true", help="Only run the data inspection")
+    mode.add_argument(
+        "--schema-only",
+        action="store_true",
+        help="Only generate the MySQL schema from the current staging tables",
+    )
+    mode.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and load orders appended to shopify_orders.csv in micro-batches",
+    )
+    mode.add_argument(
+        "--locations",
+        type=Path,
+        nargs="+",
+        default=None,
+        metavar="DIR",
+        help="Load several shop locations, one source folder each, in parallel (see multi_location.py)",
+    )
 
-# -----------------------------
-# PIPELINE CONTROL: DATA INSPECTION
-# -----------------------------
-try:
-    run_data_inspection(
-        source_folder=SOURCE_DIR,
-        output_file=SOURCE_DIR / "consolidated_inspection_report.txt",
-        fail_on_issues=True  # Stops ETL if issues are found
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process orders past the saved order_id/date watermark",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Number of orders transformed and loaded per chunk (default 100000)",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=sorted(LOADERS),
+        default="multirow",
+        help=(
+            "Bulk load strategy: batched INSERTs (executemany), LOAD DATA LOCAL INFILE, pandas to_sql, "
+            "or upsert (idempotent merge on business keys)"
+        ),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per INSERT batch",
+    )
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=DEFAULT_LOAD_WORKERS,
+        help="Tables/partitions loaded concurrently, each over its own pooled connection (1 on SQLite)",
+    )
+    parser.add_argument(
+        "--staging-format",
+        choices=STAGING_FORMATS,
+        default="csv",
+        help="Write staging tables as CSV files or typed, compressed Parquet datasets",
+    )
+    parser.add_argument(
+        "--inspect-sample",
+        type=float,
+        default=None,
+        metavar="FRACTION",
+        help="Profile only this random share of rows in very large source files; every row is still validated",
+    )
+    parser.add_argument(
+        "--quarantine",
+        action="store_true",
+        help="Move rows that fail validation to source-data/quarantine/ instead of aborting",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recompute every transform stage instead of loading unchanged ones from the cache",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the stage cache in staging-data/.cache/",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE_SECONDS,
+        help="Watch mode: seconds source files must stay unchanged before a batch is read",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=DEFAULT_BATCH_ROWS,
+        help="Watch mode: orders per micro-batch",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=DEFAULT_MAX_PENDING,
+        help="Watch mode: micro-batches queued before reading pauses",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Don't check orders against the index of loaded orders; filter on the order_id watermark instead",
+    )
+    parser.add_argument(
+        "--effective-date",
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="First day of the new versions of changed products and ingredients (default today)",
+    )
+    parser.add_argument(
+        "--location-workers",
+        type=int,
+        default=None,
+        help="--locations: locations run at once (default one per core; 1 on SQLite)",
+    )
+    parser.add_argument(
+        "--skip-validation",
+        action="store_true",
+        help="Don't run the post-load warehouse validation",
+    )
+    parser.add_argument(
+        "--run-log-dir",
+        type=Path,
+        default=None,
+        help="Where the JSON run log with per-stage spans is written (default staging-data/run-logs/)",
+    )
+    parser.add_argument(
+        "--profile-stage",
+        choices=ETL_STAGES,
+        default=None,
+        help="Profile one stage; the profile is saved next to the run log",
     )
-except RuntimeError as e:
-    print("ETL aborted due to data quality issues.")
-    raise e
+    parser.add_argument(
+        "--profiler",
+        choices=PROFILERS,
+        default="cprofile",
+        help="cProfile (CPU time per function) or tracemalloc (allocations per line)",
+    )
+    return parser
 
-# -----------------------------
-# EXTRACT
-# -----------------------------
-orders = pd.read_csv(SOURCE_DIR / "shopify_orders.csv")
-products = pd.read_csv(SOURCE_DIR / "shopify_products.csv")
-ingredients = pd.read_csv(SOURCE_DIR / "ingredients.csv")
-recipes = pd.read_csv(SOURCE_DIR / "recipes.csv")
 
-# -----------------------------
-# TRANSFORM: DIM_PRODUCT
-# -----------------------------
-dim_product = (
-    products
-    .loc[:, ["cookie_sku", "product_name", "category", "price"]]
-    .drop_duplicates()
-    .reset_index(drop=True)
-)
-dim_product["product_key"] = dim_product.index + 1
-dim_product = dim_product.rename(columns={"cookie_sku": "product_sku"})
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.config is not None:
+        # Config values replace the built-in defaults; explicit flags still win
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        known = {action.dest for action in parser._actions}
+        unknown = sorted(set(config) - known)
+        if unknown:
+            parser.error(f"Unknown option(s) in {args.config}: {', '.join(unknown)}")
+        parser.set_defaults(**config)
+        args = parser.parse_args(argv)
+    # Only these modes run without a warehouse
+    if args.db_url is None and not (args.dry_run or args.inspect_only or args.schema_only):
+        parser.error(NO_DB_URL)
+    return args
 
-# -----------------------------
-# TRANSFORM: DIM_DATE
-# -----------------------------
-orders["date"] = pd.to_datetime(orders["date"])
-
-dim_date = (
-    orders[["date"]]
-    .drop_duplicates()
-    .assign(
-        date_only=lambda df: df["date"].dt.date,
-        date_key=lambda df: df["date"].dt.strftime("%Y%m%d").astype(int),
-        day_of_week=lambda df: df["date"].dt.day_name(),
-        month=lambda df: df["date"].dt.month,
-        year=lambda df: df["date"].dt.year,
-    )
-    .loc[:, ["date_key", "date_only", "day_of_week", "month", "year"]]
-    .reset_index(drop=True)
-)
 
-# -----------------------------
-# TRANSFORM: DIM_INGREDIENT
-# -----------------------------
-dim_ingredient = (
-    ingredients
-    .drop_duplicates()
-    .reset_index(drop=True)
-)
-dim_ingredient["ingredient_key"] = dim_ingredient.index + 1
-dim_ingredient["cost_per_gram"] = (
-    dim_ingredient["cost_per_unit"] / dim_ingredient["grams_per_unit"]
-)
+def pipeline_options(args, incremental, loader=None):
+    """Pipeline keyword arguments; a plain dict so location runs can pickle it."""
+    return dict(
+        source_dir=args.source_dir,
+        staging_dir=args.staging_dir,
+        sql_dir=args.sql_dir,
+        db_url=args.db_url,
+        loader=loader or args.loader,
+        batch_size=args.batch_size,
+        load_workers=args.load_workers,
+        chunksize=args.chunksize,
+        incremental=incremental,
+        staging_format=args.staging_format,
+        inspect_sample=args.inspect_sample,
+        quarantine=args.quarantine,
+        rebuild=args.rebuild,
+        cache_max_mb=args.cache_max_mb,
+        run_log_dir=args.run_log_dir,
+        profile_stage=args.profile_stage,
+        profiler=args.profiler,
+        effective_date=args.effective_date,
+        dedup=not args.no_dedup,
+    )
 
-# -----------------------------
-# TRANSFORM: BRIDGE_PRODUCT_INGREDIENT
-# -----------------------------
-bridge_product_ingredient = (
-    recipes
-    .merge(dim_product, left_on="sku", right_on="product_sku", how="left")
-    .merge(dim_ingredient, on="ingredient", how="left")
-    .loc[:, [
-        "product_key",
-        "ingredient_key",
-        "quantity",
-        "quantity_unit"
-    ]]
-)
 
-# -----------------------------
-# TRANSFORM: INGREDIENT COST PER PRODUCT
-# -----------------------------
-ingredient_costs = (
-    bridge_product_ingredient
-    .merge(
-        dim_ingredient[["ingredient_key", "cost_per_gram"]],
-        on="ingredient_key"
-    )
-    .assign(ingredient_cost=lambda df: df["quantity"] * df["cost_per_gram"])
-    .groupby("product_key", as_index=False)
-    .agg(ingredient_cost=("ingredient_cost", "sum"))
-)
+def make_pipeline(args, incremental, loader=None):
+    return Pipeline(**pipeline_options(args, incremental, loader))
 
-# -----------------------------
-# TRANSFORM: FACT_ORDERS
-# -----------------------------
-fact_orders = (
-    orders
-    .merge(dim_product, left_on="sku", right_on="product_sku")
-    .merge(
-        dim_date,
-        left_on=orders["date"].dt.strftime("%Y%m%d").astype(int),
-        right_on="date_key"
-    )
-    .merge(ingredient_costs, on="product_key", how="left")
-)
-
-fact_orders = fact_orders.assign(
-    gross_margin=lambda df: df["total_price"] - df["ingredient_cost"]
-)
-
-fact_orders = fact_orders.loc[:, [
-    "order_id",
-    "product_key",
-    "date_key",
-    "quantity",
-    "total_price",
-    "ingredient_cost",
-    "gross_margin"
-]]
 
-# -----------------------------
-# LOAD
-# -----------------------------
-dim_product.to_csv(STAGING_DIR / "dim_product.csv", index=False)
-dim_date.to_csv(STAGING_DIR / "dim_date.csv", index=False)
-dim_ingredient.to_csv(STAGING_DIR / "dim_ingredient.csv", index=False)
-bridge_product_ingredient.to_csv(
-    STAGING_DIR / "bridge_product_ingredient.csv", index=False
-)
-fact_orders.to_csv(STAGING_DIR / "fact_orders.csv", index=False)
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = make_pipeline(args, args.incremental)
 
-# -----------------------------
-# LOAD TO MYSQL
-# -----------------------------
-from sqlalchemy import create_engine
-
-# MySQL connection configuration
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "Truehomie12"
-MYSQL_HOST = "localhost"
-MYSQL_PORT = 3306
-MYSQL_DB = "cookie_bakery_dw"
-
-# Create SQLAlchemy engine
-engine = create_engine(
-    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
-)
-
-# Mapping of staging CSV DataFrames to MySQL table names
-mysql_tables = {
-    "dim_product": dim_product,
-    "dim_date": dim_date,
-    "dim_ingredient": dim_ingredient,
-    "bridge_product_ingredient": bridge_product_ingredient,
-    "fact_orders": fact_orders,
-}
-
-# Load tables in the correct order: dimensions -> bridge -> fact
-load_order = ["dim_product", "dim_date", "dim_ingredient", "bridge_product_ingredient", "fact_orders"]
-
-print("\nStarting MySQL load...")
-
-for table_name in load_order:
-    df = mysql_tables[table_name]
-    print(f"Loading {table_name} ({len(df)} rows) into MySQL...")
-    df.to_sql(table_name, con=engine, if_exists="append", index=False)
-    print(f"{table_name} loaded successfully!")
-
-print("All staging tables have been loaded into MySQL!")
\ No newline at end of file
+    if args.watch:
+        from watch import OrderWatcher
+
+        # Full reloads run over rows that are already loaded, so they upsert
+        watcher = OrderWatcher(
+            lambda incremental: make_pipeline(args, incremental, loader=None if incremental else "upsert"),
+            debounce_seconds=args.debounce,
+            batch_rows=args.batch_rows,
+            max_pending=args.max_pending,
+            skip_validation=args.skip_validation,
+        )
+        watcher.run()
+        return
+    if args.locations:
+        from multi_location import run_locations
+
+        _, runner = run_locations(args.locations, pipeline_options(args, args.incremental), args.location_workers)
+        if not args.skip_validation:
+            runner.validate()
+        return
+    if args.dry_run:
+        print("\n".join(pipeline.plan()))
+        return
+    if args.schema_only:
+        pipeline.generate_schema()
+        return
+
+    pipeline.staging_dir.mkdir(exist_ok=True)
+    pipeline.inspect()
+    if args.inspect_only:
+        return
+    pipeline.extract()
+    pipeline.transform()
+    pipeline.load()
+    if not args.skip_validation:
+        pipeline.validate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Streaming build of fact_orders (and the dim_date rows it needs).
+
+Orders are processed in fixed-size chunks. product_key and add_on_key are
+the versions of the SKUs in effect on the order date, found by binary
+search in a small in-memory as-of index (see scd.py), ingredient_cost comes
+from the recipe cost matrix at the ingredient prices of that date (see
+costing.py), and each finished chunk is handed to a sink (staging file,
+MySQL) right away, so peak memory depends on the chunk size rather than
+order history.
+
+SKUs and dates are dictionary-encoded (categoricals from the extract, or
+factorized here): each distinct SKU is looked up and each distinct date is
+parsed and turned into a date_key once per chunk, and the results are
+gathered back onto the rows by their integer codes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scd import VERSIONED_TABLES, AsOfIndex, date_keys_of
+from staging_io import write_staging
+
+DEFAULT_CHUNKSIZE = 100_000
+
+FACT_COLUMNS = [
+    "order_id",
+    "product_key",
+    "add_on_key",
+    "date_key",
+    "quantity",
+    "total_price",
+    "ingredient_cost",
+    "gross_margin",
+]
+
+DIM_DATE_COLUMNS = ["date_key", "date_only", "day_of_week", "month", "year"]
+
+
+# --------------------------------------------------
+# DIMENSION INDEXES
+# --------------------------------------------------
+
+def build_product_index(dim_product):
+    """Return the (sku, order date) -> product_key as-of index."""
+    return AsOfIndex(dim_product, *VERSIONED_TABLES["dim_product"])
+
+
+def lookup_codes(values, index):
+    """
+    Look up every value of a (categorical) column in index, once per distinct
+    value. Returns a float array of index values, NaN where the value is
+    missing or not in the index.
+    """
+    codes, uniques = pd.factorize(values)
+    keys = pd.Series(index).reindex(pd.Index(uniques)).to_numpy(dtype=float)
+    # Code -1 (missing value) picks the trailing NaN
+    return np.append(keys, np.nan)[codes]
+
+
+# --------------------------------------------------
+# CHUNK TRANSFORMS
+# --------------------------------------------------
+
+def build_dim_date(dates):
+    """Build dim_date rows for a Series of order datetimes."""
+    dates = pd.Series(dates.unique())
+    return pd.DataFrame({
+        "date_key": date_keys_of(dates),
+        "date_only": dates.dt.date,
+        "day_of_week": dates.dt.day_name(),
+        "month": dates.dt.month,
+        "year": dates.dt.year,
+    }).loc[:, DIM_DATE_COLUMNS]
+
+
+def transform_order_chunk(orders, product_index, cost_matrix):
+    """
+    Turn one chunk of raw orders into (fact_orders rows, dim_date rows).
+    product_index is the as-of index of dim_product.
+    """
+    # Each distinct date is parsed and keyed once; rows pick theirs by code
+    date_codes, unique_dates = pd.factorize(orders["date"])
+    unique_dates = pd.Series(pd.to_datetime(np.asarray(unique_dates)))
+    date_key = date_keys_of(unique_dates)[date_codes]
+
+    # Each order gets the product version in effect on its date
+    product_key = product_index.lookup(lookup_codes(orders["sku"], product_index.codes), date_key)
+
+    # Orders for unknown SKUs are dropped, matching the inner join on dim_product
+    known = ~np.isnan(product_key)
+    orders, product_key, date_key = orders[known], product_key[known].astype(np.int64), date_key[known]
+    unique_dates = unique_dates.iloc[np.unique(date_codes[known])]
+
+    add_on_key = pd.array(
+        product_index.lookup(lookup_codes(orders["add_on_sku"], product_index.codes), date_key), dtype="Int64"
+    )
+
+    fact = pd.DataFrame({
+        "order_id": orders["order_id"].to_numpy(),
+        "product_key": product_key,
+        "add_on_key": add_on_key,
+        "date_key": date_key,
+        "quantity": orders["quantity"].to_numpy(),
+        "total_price": orders["total_price"].to_numpy(),
+        "ingredient_cost": cost_matrix.order_costs(product_key, add_on_key, orders["quantity"], date_key),
+    })
+    fact["gross_margin"] = fact["total_price"] - fact["ingredient_cost"]
+
+    return fact.loc[:, FACT_COLUMNS], build_dim_date(unique_dates)
+
+
+# --------------------------------------------------
+# STREAMING DRIVER
+# --------------------------------------------------
+
+def stream_fact_orders(order_chunks, dim_product, cost_matrix, write_chunk, known_date_keys=()):
+    """
+    Transform order chunks and pass each result to write_chunk(table, df).
+
+    New dim_date rows are written before the fact rows that reference them.
+    Only the set of date keys seen so far is kept between chunks.
+    Returns a summary with row counts, the highest order_id and the range
+    of order dates processed.
+    """
+    product_index = build_product_index(dim_product)
+    seen_date_keys = set(known_date_keys)
+    summary = {"fact_rows": 0, "date_rows": 0, "max_order_id": None, "min_date_key": None, "max_date_key": None}
+
+    for chunk in order_chunks:
+        fact, dim_date = transform_order_chunk(chunk, product_index, cost_matrix)
+        if fact.empty:
+            continue
+
+        dim_date = dim_date[~dim_date["date_key"].isin(seen_date_keys)]
+        if not dim_date.empty:
+            seen_date_keys.update(dim_date["date_key"])
+            write_chunk("dim_date", dim_date)
+            summary["date_rows"] += len(dim_date)
+
+        write_chunk("fact_orders", fact)
+        summary["fact_rows"] += len(fact)
+        summary["max_order_id"] = max(summary["max_order_id"] or 0, int(fact["order_id"].max()))
+        first_date_key = int(fact["date_key"].min())
+        summary["min_date_key"] = min(summary["min_date_key"] or first_date_key, first_date_key)
+        summary["max_date_key"] = max(summary["max_date_key"] or 0, int(fact["date_key"].max()))
+
+    return summary
+
+
+class StagingChunkWriter:
+    """Write streamed chunks to the staging table in CSV or Parquet format."""
+
+    def __init__(self, staging_dir, append=False, fmt="csv"):
+        self.staging_dir = staging_dir
+        self.append = append
+        self.fmt = fmt
+        self._parts = {}
+
+    def write(self, table_name, df):
+        # The first chunk of a full run replaces the existing table
+        part = self._parts.get(table_name, 0)
+        self._parts[table_name] = part + 1
+        write_staging(
+            df,
+            self.staging_dir,
+            table_name,
+            fmt=self.fmt,
+            append=self.append or part > 0,
+            part=part,
+        )
@@ -1,53 +1,182 @@
+import argparse
 import os
+import re
+
 import pandas as pd
 
+from staging_io import detect_format, list_staging_tables, parquet_column_ranges, sample_staging
+
 STAGING_DIR = "staging-data"
 SQL_DIR = "sql"
 OUTPUT_FILE = "auto_generated_schema.sql"
 
-os.makedirs(SQL_DIR, exist_ok=True)
+# Types are inferred from a bounded sample of each table (plus the Parquet
+# footer statistics, which cover every row), never from a full read
+SAMPLE_ROWS = 100_000
+
+# Keys, counts and money get fixed types that leave room to grow: sizing
+# them from what the staging data holds today would overflow later loads.
+# Only string widths and the integer/decimal/date choice are inferred.
+INTEGER_TYPE = "INT"
+# Only for integer columns whose values already pass the INT range
+BIG_INTEGER_TYPE = "BIGINT"
+INT_MAX = 2 ** 31 - 1
+MONEY_TYPE = "DECIMAL(12,2)"
+DECIMAL_TYPE = "DECIMAL(14,6)"
+UNIT_COST_TYPE = "DECIMAL(16,10)"
+
+# Prices and revenue are whole cents
+MONEY_COLUMNS = {"price", "total_price", "revenue", "cost_per_unit"}
+# Costs per gram are small fractions of a cent
+UNIT_COST_COLUMNS = {"cost_per_gram"}
+
+CHAR_MAX_LENGTH = 16
+VARCHAR_LENGTHS = [16, 32, 64, 128, 255]
+
+# Surrogate keys and ids are integers even when read back as floats
+IDENTIFIER_SUFFIXES = ("_key", "_id")
+
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Business keys the upsert load mode merges on (see bulk_loader.BUSINESS_KEYS)
+UNIQUE_KEYS = {
+    "dim_product": ["product_sku", "valid_from"],
+    "dim_ingredient": ["ingredient", "valid_from"],
+}
+FACT_KEYS = {
+    "fact_orders": ["order_id"],
+}
+
+# Rollup tables hold one row per date bucket and product
+ROLLUP_KEYS = ["period_start_key", "product_key"]
+
+# Tables of multi-location runs carry the location's key (see multi_location.py);
+# their business keys are unique per location
+LOCATION_KEY = "location_key"
+LOCATION_FOREIGN_KEY = (LOCATION_KEY, ("dim_location", LOCATION_KEY))
+
+# column -> (referenced table, referenced column)
+FOREIGN_KEYS = {
+    "bridge_product_ingredient": {
+        "product_key": ("dim_product", "product_key"),
+        "ingredient_key": ("dim_ingredient", "ingredient_key"),
+    },
+    "fact_orders": {
+        "product_key": ("dim_product", "product_key"),
+        "add_on_key": ("dim_product", "product_key"),
+        "date_key": ("dim_date", "date_key"),
+    },
+    **{
+        table_name: {"product_key": ("dim_product", "product_key")}
+        for table_name in ["kpi_daily_product", "kpi_weekly_product", "kpi_monthly_product"]
+    },
+}
+
+# Secondary indexes for the date and product filters of the dashboards
+INDEXES = {
+    "fact_orders": [["date_key"], ["product_key"]],
+}
+
+# Fact tables partitioned by date_key range, one partition per year
+PARTITION_KEYS = {
+    "fact_orders": "date_key",
+}
+
+# Referenced tables have to exist before the tables pointing at them
+TABLE_TYPE_ORDER = {"DIMENSION": 0, "BRIDGE": 1, "FACT": 2, "ROLLUP": 3, "UNKNOWN": 4}
+
+
+# --------------------------------------------------
+# TYPE INFERENCE
+# --------------------------------------------------
+
+def integer_type(low, high):
+    return BIG_INTEGER_TYPE if max(abs(int(low)), abs(int(high))) > INT_MAX else INTEGER_TYPE
+
+
+def decimal_type(column_name):
+    if column_name in MONEY_COLUMNS:
+        return MONEY_TYPE
+    if column_name in UNIT_COST_COLUMNS:
+        return UNIT_COST_TYPE
+    return DECIMAL_TYPE
+
 
-def pandas_dtype_to_mysql(dtype):
-    if pd.api.types.is_integer_dtype(dtype):
-        return "INT"
-    elif pd.api.types.is_float_dtype(dtype):
-        return "DECIMAL(10,2)"
-    elif pd.api.types.is_bool_dtype(dtype):
+def string_type(values):
+    strings = values.astype(str)
+    if strings.map(lambda v: bool(ISO_DATE.match(v))).all():
+        return "DATE"
+    lengths = strings.str.len()
+    longest = int(lengths.max())
+    if lengths.min() == longest and longest <= CHAR_MAX_LENGTH:
+        return f"CHAR({longest})"
+    return f"VARCHAR({next((n for n in VARCHAR_LENGTHS if n >= longest * 2), max(longest, 255))})"
+
+
+def infer_mysql_type(column_name, values, value_range=None):
+    """
+    Pick the MySQL type for a sampled column. value_range, when known
+    (Parquet footers), is the (min, max) over the whole table.
+    """
+    values = values.dropna()
+    if values.empty:
+        return INTEGER_TYPE if column_name.endswith(IDENTIFIER_SUFFIXES) else "VARCHAR(255)"
+
+    if pd.api.types.is_bool_dtype(values):
         return "BOOLEAN"
-    elif pd.api.types.is_datetime64_any_dtype(dtype):
+    if pd.api.types.is_datetime64_any_dtype(values):
         return "DATETIME"
-    else:
-        return "VARCHAR(255)"
+    if not pd.api.types.is_numeric_dtype(values):
+        if values.map(lambda v: hasattr(v, "isoformat")).all():
+            return "DATE"
+        return string_type(values)
 
-sql_statements = []
+    low, high = value_range if value_range is not None else (values.min(), values.max())
+    # Nullable integer keys (e.g. fact_orders.add_on_key) are read back as floats
+    if column_name.endswith(IDENTIFIER_SUFFIXES) or pd.api.types.is_integer_dtype(values):
+        return integer_type(low, high)
+    return decimal_type(column_name)
 
-for filename in sorted(os.listdir(STAGING_DIR)):
-    if not filename.endswith(".csv"):
-        continue
 
-    table_name = filename.replace(".csv", "")
-    file_path = os.path.join(STAGING_DIR, filename)
-    df = pd.read_csv(file_path)
+# --------------------------------------------------
+# DDL
+# --------------------------------------------------
 
-    # Detect table type
+def table_type_of(table_name):
     if table_name.startswith("dim_"):
-        table_type = "DIMENSION"
+        return "DIMENSION"
     elif table_name.startswith("fact_"):
-        table_type = "FACT"
+        return "FACT"
     elif table_name.startswith("bridge_"):
-        table_type = "BRIDGE"
-    else:
-        table_type = "UNKNOWN"
+        return "BRIDGE"
+    elif table_name.startswith("kpi_"):
+        return "ROLLUP"
+    return "UNKNOWN"
 
-    columns_sql = []
-    key_columns = []
 
-    for col in df.columns:
-        mysql_type = pandas_dtype_to_mysql(df[col].dtype)
-        columns_sql.append(f"    {col} {mysql_type}")
+def year_partitions(partition_key, low, high):
+    """PARTITION BY RANGE clause with one partition per year of YYYYMMDD keys."""
+    years = range(int(low) // 10000, int(high) // 10000 + 1)
+    partitions = [f"    PARTITION p{year} VALUES LESS THAN ({(year + 1) * 10000})" for year in years]
+    # Later years land in pmax until the partitions are reorganized
+    partitions.append("    PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return f"PARTITION BY RANGE ({partition_key}) (\n" + ",\n".join(partitions) + "\n)"
 
-        if col.endswith("_key"):
-            key_columns.append(col)
+
+def business_key(keys, column_types):
+    if LOCATION_KEY in column_types and LOCATION_KEY not in keys:
+        return [LOCATION_KEY] + keys
+    return keys
+
+
+def create_table_sql(table_name, column_types, value_ranges, partition_fact=True):
+    table_type = table_type_of(table_name)
+    columns_sql = [f"    {col} {mysql_type}" for col, mysql_type in column_types.items()]
+    key_columns = [col for col in column_types if col.endswith("_key")]
+
+    partition_key = PARTITION_KEYS.get(table_name) if partition_fact else None
+    if partition_key is not None and partition_key not in value_ranges:
+        partition_key = None
 
     # Primary key logic
     if table_type == "DIMENSION" and key_columns:
@@ -56,22 +185,103 @@ for filename in sorted(os.listdir(STAGING_DIR)):
     elif table_type == "BRIDGE" and len(key_columns) >= 2:
         columns_sql.append(f"    PRIMARY KEY ({', '.join(key_columns)})")
 
-    # Fact tables: no automatic PK
+    # Fact tables: PK on the order business key so reruns can upsert. MySQL
+    # requires the partitioning column in every unique key of the table.
+    elif table_type == "FACT" and table_name in FACT_KEYS:
+        primary_key = business_key(FACT_KEYS[table_name], column_types) + ([partition_key] if partition_key else [])
+        columns_sql.append(f"    PRIMARY KEY ({', '.join(primary_key)})")
+
+    elif table_type == "ROLLUP" and all(col in column_types for col in ROLLUP_KEYS):
+        columns_sql.append(f"    PRIMARY KEY ({', '.join(ROLLUP_KEYS)})")
+
+    if table_name in UNIQUE_KEYS:
+        unique_key = business_key(UNIQUE_KEYS[table_name], column_types)
+        columns_sql.append(f"    UNIQUE KEY ux_{table_name} ({', '.join(unique_key)})")
 
-    create_table_sql = f"""
+    for index_columns in INDEXES.get(table_name, []):
+        if all(col in column_types for col in index_columns):
+            columns_sql.append(f"    KEY ix_{table_name}_{'_'.join(index_columns)} ({', '.join(index_columns)})")
+
+    # Partitioned InnoDB tables cannot have foreign keys; the post-load
+    # validation checks those references instead
+    notes = []
+    foreign_keys = dict(FOREIGN_KEYS.get(table_name, {}))
+    if table_name != "dim_location":
+        foreign_keys.update([LOCATION_FOREIGN_KEY])
+    for col, (ref_table, ref_col) in foreign_keys.items():
+        if col not in column_types:
+            continue
+        if partition_key:
+            notes.append(f"-- {col} references {ref_table}({ref_col}) (not enforced: partitioned table)")
+            continue
+        columns_sql.append(
+            f"    CONSTRAINT fk_{table_name}_{col} FOREIGN KEY ({col}) REFERENCES {ref_table} ({ref_col})"
+        )
+
+    columns_block = ",\n".join(columns_sql)
+    partition_clause = ""
+    if partition_key:
+        partition_clause = "\n" + year_partitions(partition_key, *value_ranges[partition_key])
+    notes_block = "".join(f"{note}\n" for note in notes)
+    return f"""
 -- {table_type} TABLE
-CREATE TABLE {table_name} (
-{",\n".join(columns_sql)}
-);
+{notes_block}CREATE TABLE {table_name} (
+{columns_block}
+){partition_clause};
 """.strip()
 
-    sql_statements.append(create_table_sql)
 
-output_path = os.path.join(SQL_DIR, OUTPUT_FILE)
-with open(output_path, "w") as f:
-    f.write("-- Auto-generated schema from staging CSVs\n")
-    f.write("-- Includes dimension, fact, and bridge tables\n")
-    f.write("-- Review keys and constraints before production use\n\n")
-    f.write("\n\n".join(sql_statements))
+def infer_table_schema(staging_dir, table_name, sample_rows=SAMPLE_ROWS):
+    """Return ({column: MySQL type}, {column: (min, max)}) for a staging table."""
+    sample = sample_staging(staging_dir, table_name, sample_rows)
+    value_ranges = {}
+    if detect_format(staging_dir, table_name) == "parquet":
+        value_ranges = parquet_column_ranges(staging_dir, table_name)
+    for col in sample.columns:
+        if col not in value_ranges and pd.api.types.is_numeric_dtype(sample[col]) and sample[col].notna().any():
+            value_ranges[col] = (sample[col].min(), sample[col].max())
+
+    column_types = {}
+    for col in sample.columns:
+        mysql_type = infer_mysql_type(col, sample[col], value_ranges.get(col))
+        # Keys must match the INT primary keys they reference
+        if col.endswith("_key"):
+            mysql_type = INTEGER_TYPE
+        column_types[col] = mysql_type
+    return column_types, value_ranges
+
+
+def generate_schema(staging_dir=STAGING_DIR, sql_dir=SQL_DIR, sample_rows=SAMPLE_ROWS, partition_fact=True):
+    """Write CREATE TABLE statements for every staging table; returns the file path."""
+    sql_statements = []
+
+    # Staging tables may be CSV files or Parquet datasets; Parquet keeps its dtypes
+    table_names = sorted(list_staging_tables(staging_dir), key=lambda t: (TABLE_TYPE_ORDER[table_type_of(t)], t))
+    for table_name in table_names:
+        column_types, value_ranges = infer_table_schema(staging_dir, table_name, sample_rows)
+        sql_statements.append(create_table_sql(table_name, column_types, value_ranges, partition_fact))
+
+    os.makedirs(sql_dir, exist_ok=True)
+    output_path = os.path.join(sql_dir, OUTPUT_FILE)
+    with open(output_path, "w") as f:
+        f.write("-- Auto-generated schema from staging tables\n")
+        f.write("-- Includes dimension, fact, and bridge tables\n")
+        f.write("-- Review keys and constraints before production use\n\n")
+        f.write("\n\n".join(sql_statements))
+
+    print(f"Schema written to {output_path}")
+    return output_path
+
 
-print(f"Schema written to {output_path}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the MySQL schema from the staging tables")
+    parser.add_argument("--staging-dir", default=STAGING_DIR)
+    parser.add_argument("--sql-dir", default=SQL_DIR)
+    parser.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS, help="Rows sampled per table")
+    parser.add_argument(
+        "--no-partition",
+        action="store_true",
+        help="Don't partition fact_orders by date_key (its foreign keys are then enforced)",
+    )
+    args = parser.parse_args()
+    generate_schema(args.staging_dir, args.sql_dir, args.sample_rows, partition_fact=not args.no_partition)
@@ -7,58 +7,77 @@ Requirements:
 
 - Place this script in your project folder.
 - Make sure /staging-data/ contains:
-    - all staging CSVs
+    - all staging tables (CSVs, or Parquet datasets under staging-data/parquet/)
     - credentials.json for your service account
 - Make sure the service account email is shared with the Google Sheet "Cookie_Bakery"
+
+Only rows that changed since the last upload are sent (see sheets_sync.py).
+Run with --dry-run to sync against an in-memory fake sheet instead.
 """
 
+import argparse
 import os
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+
+from sheets_sync import (
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_SYNC_WORKERS,
+    SNAPSHOT_DIR,
+    FakeSpreadsheet,
+    SheetSync,
+)
+from staging_io import list_staging_tables, read_staging
 
 # --- Configuration ---
 STAGING_DIR = 'staging-data'          # folder containing CSVs and credentials.json
 GOOGLE_SHEET_NAME = 'Cookie_Bakery'   # your Google Sheet name
 
-# --- Authenticate with Google Sheets API ---
-creds_path = os.path.join(STAGING_DIR, 'credentials.json')
-scopes = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
-creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-client = gspread.authorize(creds)
-
-# --- Open the Google Sheet ---
-try:
-    sh = client.open(GOOGLE_SHEET_NAME)
-    print(f'Connected to Google Sheet: "{GOOGLE_SHEET_NAME}"')
-except gspread.SpreadsheetNotFound:
-    sh = client.create(GOOGLE_SHEET_NAME)
-    print(f'Created new Google Sheet: "{GOOGLE_SHEET_NAME}"')
-
-# --- Loop through all CSVs in staging-data ---
-for filename in os.listdir(STAGING_DIR):
-    if filename.endswith('.csv'):
-        csv_path = os.path.join(STAGING_DIR, filename)
-        sheet_name = os.path.splitext(filename)[0]  # use CSV filename as sheet tab name
-        df = pd.read_csv(csv_path)
-
-        # Check if sheet exists; create if not
-        try:
-            worksheet = sh.worksheet(sheet_name)
-            worksheet.clear()  # clear previous data
-            print(f'Overwriting existing sheet tab: "{sheet_name}"')
-        except gspread.WorksheetNotFound:
-            # Make sure rows and cols are integers slightly bigger than df size
-            worksheet = sh.add_worksheet(
-                title=sheet_name, 
-                rows=len(df)+10, 
-                cols=len(df.columns)+5
-            )
-            print(f'Created new sheet tab: "{sheet_name}"')
-
-        # Upload dataframe to sheet
-        worksheet.update([df.columns.values.tolist()] + df.values.tolist())
-        print(f'Uploaded {filename} to Google Sheet tab "{sheet_name}"')
\ No newline at end of file
+
+def open_spreadsheet():
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    # --- Authenticate with Google Sheets API ---
+    creds_path = os.path.join(STAGING_DIR, 'credentials.json')
+    scopes = [
+        'https://www.googleapis.com/auth/spreadsheets',
+        'https://www.googleapis.com/auth/drive'
+    ]
+    creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
+    client = gspread.authorize(creds)
+
+    # --- Open the Google Sheet ---
+    try:
+        sh = client.open(GOOGLE_SHEET_NAME)
+        print(f'Connected to Google Sheet: "{GOOGLE_SHEET_NAME}"')
+    except gspread.SpreadsheetNotFound:
+        sh = client.create(GOOGLE_SHEET_NAME)
+        print(f'Created new Google Sheet: "{GOOGLE_SHEET_NAME}"')
+    return sh
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the staging tables to Google Sheets")
+    parser.add_argument("--dry-run", action="store_true", help="Sync against an in-memory fake sheet")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per batch_update call")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SYNC_WORKERS, help="Tabs synced concurrently")
+    args = parser.parse_args()
+
+    sh = FakeSpreadsheet() if args.dry_run else open_spreadsheet()
+    # A dry run must not touch the snapshots of the real sheet
+    snapshot_dir = os.path.join(STAGING_DIR, SNAPSHOT_DIR, "dry-run" if args.dry_run else "")
+    sync = SheetSync(sh, snapshot_dir, chunk_rows=args.chunk_rows, workers=args.workers)
+
+    # --- Sync every staging table to the tab of the same name ---
+    tables = {
+        table_name: (lambda name=table_name, fmt=staging_format: read_staging(STAGING_DIR, name, fmt=fmt))
+        for table_name, staging_format in list_staging_tables(STAGING_DIR).items()
+    }
+    for sheet_name, result in sync.sync(tables).items():
+        print(
+            f'Synced sheet tab "{sheet_name}": {result["mode"]}, {result["rows_sent"]} rows sent, '
+            f'{result["rows_cleared"]} cleared in {result["requests"]} requests'
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,172 +1,547 @@
 import os
-import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import chardet
 
 ROUNDING_TOLERANCE = 1e-6
+PROFILE_CHUNKSIZE = 100_000
+ENCODING_SAMPLE_BYTES = 10000
+
+# In sampling mode only files at least this large are sampled, so the small
+# reference files (products, recipes, ingredients) are always read in full
+SAMPLE_MIN_BYTES = 64 * 1024 * 1024
 
 
 # --------------------------------------------------
 # PHASE 1: STRUCTURAL & QUALITY INSPECTION
 # --------------------------------------------------
 
-def inspect_csv(file_path):
-    print(f"INSPECTING FILE: {os.path.basename(file_path)}")
-    print("-" * 60)
-
-    # Detect encoding
+def detect_encoding(file_path):
     with open(file_path, "rb") as f:
-        rawdata = f.read(10000)
-    encoding = chardet.detect(rawdata)["encoding"]
-
-    # Detect delimiter
+        rawdata = f.read(ENCODING_SAMPLE_BYTES)
+    # Plain ASCII exports are the common case and need no statistical guess
+    if rawdata.isascii():
+        return "ascii"
+    import chardet
+    return chardet.detect(rawdata)["encoding"]
+
+
+def _merge_numeric_stats(stats, values):
+    """Fold a chunk of numeric values into running count/mean/M2/min/max."""
+    values = values.dropna().to_numpy(dtype=float)
+    if values.size == 0:
+        return stats
+    count, mean = values.size, values.mean()
+    m2 = ((values - mean) ** 2).sum()
+    if stats is None:
+        return {"count": count, "mean": mean, "m2": m2, "min": values.min(), "max": values.max()}
+
+    # Chan et al. parallel variance update
+    total = stats["count"] + count
+    delta = mean - stats["mean"]
+    return {
+        "count": total,
+        "mean": stats["mean"] + delta * count / total,
+        "m2": stats["m2"] + m2 + delta ** 2 * stats["count"] * count / total,
+        "min": min(stats["min"], values.min()),
+        "max": max(stats["max"], values.max()),
+    }
+
+
+def _sniff(file_path):
+    """(encoding, delimiter) of a CSV."""
+    encoding = detect_encoding(file_path)
     with open(file_path, "r", encoding=encoding) as f:
         sample = f.read(1024)
-        delimiter = "," if sample.count(",") > sample.count("\t") else "\t"
-
-    df = pd.read_csv(file_path, encoding=encoding, delimiter=delimiter)
-
-    print(f"Encoding: {encoding}")
-    print(f"Delimiter: {repr(delimiter)}")
-    print(f"Row Count: {len(df)}\n")
-
-    print("Column Names & Data Types:")
-    print(df.dtypes, "\n")
-
-    print("Sample Rows:")
-    print(df.head(), "\n")
+    return encoding, "," if sample.count(",") > sample.count("\t") else "\t"
+
+
+def _read_chunks(file_path, encoding, delimiter, chunksize):
+    return pd.read_csv(file_path, encoding=encoding, delimiter=delimiter, chunksize=chunksize)
+
+
+def profile_csv(file_path, sample_fraction=None, seed=0, chunksize=PROFILE_CHUNKSIZE, on_chunk=None):
+    """
+    Profile one CSV in a single streaming pass over fixed-size chunks.
+
+    Returns a plain dict of per-column statistics for the report writer.
+    Chunks are not kept; on_chunk(chunk) is called with each one (e.g. to
+    validate it). With sample_fraction set, only a seeded random share of
+    the rows is profiled; on_chunk still sees every row, so validation and
+    quarantine are never sampled.
+    """
+    encoding, delimiter = _sniff(file_path)
+    reader = _read_chunks(file_path, encoding, delimiter, chunksize)
+    rng = np.random.default_rng(seed) if sample_fraction is not None else None
+
+    head = None
+    # Empty frames concatenated to the common dtype of every chunk
+    dtypes = None
+    row_count = 0
+    parsed_rows = 0
+    numeric_stats = {}
+    invalid = None
+    row_hashes = []
+
+    for chunk in reader:
+        row_count += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        if rng is not None:
+            chunk = chunk[rng.random(len(chunk)) < sample_fraction]
+        if head is None:
+            head = chunk.head()
+        dtypes = chunk.iloc[:0] if dtypes is None else pd.concat([dtypes, chunk.iloc[:0]])
+        parsed_rows += len(chunk)
+
+        for col in chunk.select_dtypes(include="number").columns:
+            stats = _merge_numeric_stats(numeric_stats.get(col), chunk[col])
+            # A small sample can leave a column without any values yet
+            if stats is not None:
+                numeric_stats[col] = stats
+
+        # Nulls, "-" placeholders and zeros, counted together per column
+        counts = chunk.isna().sum()
+        for col in chunk.columns:
+            if pd.api.types.is_numeric_dtype(chunk[col]):
+                counts[col] += (chunk[col] == 0).sum()
+            else:
+                counts[col] += (chunk[col] == "-").sum()
+        invalid = counts if invalid is None else invalid.add(counts, fill_value=0)
+
+        # Whole-row duplicates across chunks via 64-bit row hashes (8 bytes a row)
+        row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+
+    if head is None:
+        head = dtypes = pd.read_csv(file_path, encoding=encoding, delimiter=delimiter, nrows=0)
+
+    statistics = {
+        col: {
+            "count": stats["count"],
+            "mean": stats["mean"],
+            "std": float(np.sqrt(stats["m2"] / (stats["count"] - 1))) if stats["count"] > 1 else float("nan"),
+            "min": stats["min"],
+            "max": stats["max"],
+        }
+        for col, stats in numeric_stats.items()
+    }
+    invalid = {} if invalid is None else {col: int(n) for col, n in invalid.items() if n > 0}
+    row_hashes = np.sort(np.concatenate(row_hashes)) if row_hashes else np.empty(0, dtype=np.uint64)
+    duplicates = np.count_nonzero(row_hashes[1:] == row_hashes[:-1])
+
+    return {
+        "file_name": os.path.basename(file_path),
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "row_count": row_count,
+        "sampled_rows": parsed_rows if sample_fraction is not None else None,
+        "dtypes": {col: str(dtype) for col, dtype in dtypes.dtypes.items()},
+        "head": head,
+        "statistics": statistics,
+        "invalid_counts": invalid,
+        "duplicate_rows": int(duplicates),
+    }
+
+
+def read_rows(file_path, rows, chunksize=PROFILE_CHUNKSIZE):
+    """Re-read the rows of file_path with the given row indexes."""
+    encoding, delimiter = _sniff(file_path)
+    reader = _read_chunks(file_path, encoding, delimiter, chunksize)
+    rows = pd.Index(rows)
+    parts = [chunk[chunk.index.isin(rows)] for chunk in reader]
+    return pd.concat(parts) if parts else pd.DataFrame()
+
+
+def render_profile(profile):
+    """Render one file profile as a section of the inspection report."""
+    lines = [
+        f"INSPECTING FILE: {profile['file_name']}",
+        "-" * 60,
+        f"Encoding: {profile['encoding']}",
+        f"Delimiter: {repr(profile['delimiter'])}",
+        f"Row Count: {profile['row_count']}",
+    ]
+    if profile["sampled_rows"] is not None:
+        lines.append(f"Sampled Rows: {profile['sampled_rows']} (statistics below cover the sample only)")
+
+    lines += ["", "Column Names & Data Types:", pd.Series(profile["dtypes"]).to_string(), ""]
+    lines += ["Sample Rows:", profile["head"].to_string(), ""]
+
+    lines.append("Basic Statistics (Numeric Columns):")
+    if profile["statistics"]:
+        lines.append(pd.DataFrame(profile["statistics"]).to_string())
+    else:
+        lines.append("No numeric columns.")
+    lines.append("")
+
+    lines.append("Missing / Invalid Values Per Column:")
+    if profile["invalid_counts"]:
+        lines.append(pd.Series(profile["invalid_counts"]).to_string())
+    else:
+        lines.append("No missing or invalid values detected.")
+    lines.append("")
+
+    lines.append(f"Duplicate Rows: {profile['duplicate_rows']}")
+    lines.append("-" * 60 + "\n")
+    return "\n".join(lines)
 
-    print("Basic Statistics (Numeric Columns):")
-    print(df.describe(), "\n")
 
-    print("Missing / Invalid Values Per Column:")
-    missing = (
-        df.isnull().sum()
-        + (df == "-").sum(numeric_only=False)
-        + (df == 0).sum(numeric_only=False)
-    )
-    missing = missing[missing > 0]
-    print(missing if not missing.empty else "No missing or invalid values detected.", "\n")
-
-    print(f"Duplicate Rows: {df.duplicated().sum()}")
-    print("-" * 60 + "\n")
-
-    return df
+def inspect_csv(file_path):
+    """Profile a single CSV, print its report section and return the data."""
+    chunks = []
+    profile = profile_csv(file_path, on_chunk=chunks.append)
+    print(render_profile(profile))
+    return pd.concat(chunks, ignore_index=True) if chunks else profile["head"]
+
+
+def _inspect_job(job):
+    """Profile and validate one source file (in a worker process)."""
+    path, table_name, sample_fraction, indexes = job
+    validator = TableValidator(table_name, indexes)
+    profile = profile_csv(path, sample_fraction, on_chunk=validator.add)
+    violations, failed_rows = validator.finish(lambda rows: read_rows(path, rows))
+    return profile, violations, failed_rows
+
+
+def inspect_sources(source_folder, workers=None, sample_fraction=None, sample_min_bytes=SAMPLE_MIN_BYTES):
+    """
+    Profile and validate every CSV in source_folder, in parallel across a
+    process pool. Each worker streams its file and sends back only the
+    profile, the violations and the rows that failed a rule.
+
+    With sample_fraction set, files of at least sample_min_bytes are profiled
+    from a sample; every row is still validated.
+    Returns (profiles, violations, failed_rows); profiles and failed_rows
+    are keyed by lower-case file stem.
+    """
+    filenames = sorted(f for f in os.listdir(source_folder) if f.endswith(".csv"))
+    names = [f.replace(".csv", "").lower() for f in filenames]
+    indexes = read_key_indexes(source_folder, dict(zip(names, filenames)))
+
+    jobs = []
+    for filename, name in zip(filenames, names):
+        path = os.path.join(source_folder, filename)
+        sample = sample_fraction if os.path.getsize(path) >= sample_min_bytes else None
+        jobs.append((path, name, sample, indexes))
+
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_inspect_job, jobs))
+    else:
+        results = [_inspect_job(job) for job in jobs]
+
+    profiles = {name: profile for name, (profile, _, _) in zip(names, results)}
+    violations = _in_rule_order([violation for _, found, _ in results for violation in found])
+    failed_rows = {name: rows for name, (_, _, rows) in zip(names, results) if rows is not None}
+    return profiles, violations, failed_rows
 
 
 # --------------------------------------------------
 # PHASE 2: VALIDATION CHECKS
 # --------------------------------------------------
 
-def run_validations(data):
-    issues = []
+VALID_CATEGORIES = {"Dozen Cookies", "Add-on"}
 
-    orders = data.get("shopify_orders")
-    products = data.get("shopify_products")
-    recipes = data.get("recipes")
-    ingredients = data.get("ingredients")
 
-    # Referential Integrity
-    if orders is not None and products is not None:
-        if not orders["sku"].isin(products["cookie_sku"]).all():
-            issues.append("Orders.sku contains values not found in Products.cookie_sku")
-
-        if "add_on_sku" in orders.columns:
-            invalid_addons = orders["add_on_sku"].dropna()
-            if not invalid_addons.isin(products["cookie_sku"]).all():
-                issues.append("Orders.add_on_sku contains invalid product references")
+def _missing_from(index, values):
+    # get_indexer reuses the hash table the Index builds on first use
+    return pd.Series(index.get_indexer(values) < 0, index=values.index)
 
-    if recipes is not None and products is not None:
-        if not recipes["sku"].isin(products["cookie_sku"]).all():
-            issues.append("Recipes.sku contains values not found in Products.cookie_sku")
 
-    if recipes is not None and ingredients is not None:
-        if not recipes["ingredient"].isin(ingredients["ingredient"]).all():
-            issues.append("Recipes.ingredient contains values not found in Ingredients")
-
-    # Domain & Validity
-    if orders is not None:
-        if (orders["quantity"] <= 0).any():
-            issues.append("Orders.quantity must be > 0")
-        if (orders["total_price"] < 0).any():
-            issues.append("Orders.total_price must be ≥ 0")
+def _invalid_add_ons(df, ix):
+    # add_on_sku is optional; exports without it have nothing to check
+    if "add_on_sku" not in df:
+        return pd.Series(False, index=df.index)
+    return df["add_on_sku"].notna() & _missing_from(ix["product_sku"], df["add_on_sku"])
 
-    if recipes is not None and (recipes["quantity"] <= 0).any():
-        issues.append("Recipes.quantity must be > 0")
 
-    if products is not None:
-        if (products["price"] < 0).any():
-            issues.append("Products.price must be ≥ 0")
+def _cost_per_gram_mismatch(df):
+    diff = (df["cost_per_unit"] / df["grams_per_unit"] - df["cost_per_gram"]).abs()
+    return diff > ROUNDING_TOLERANCE
 
-        valid_categories = {"Dozen Cookies", "Add-on"}
-        if not products["category"].isin(valid_categories).all():
-            issues.append("Products.category contains invalid values")
 
-    if ingredients is not None:
-        if (ingredients["cost_per_unit"] < 0).any():
-            issues.append("Ingredients.cost_per_unit must be ≥ 0")
-        if (ingredients["cost_per_gram"] < 0).any():
-            issues.append("Ingredients.cost_per_gram must be ≥ 0")
-
-        diff = (
-            ingredients["cost_per_unit"] / ingredients["grams_per_unit"]
-            - ingredients["cost_per_gram"]
-        ).abs()
-
-        if (diff > ROUNDING_TOLERANCE).any():
-            issues.append("Ingredients.cost_per_gram calculation mismatch")
-
-        if (ingredients["container_grams"] < ingredients["grams_per_unit"]).any():
-            issues.append("Ingredients.container_grams < grams_per_unit")
-
-    # Completeness
-    if orders is not None and orders["order_id"].isna().any():
-        issues.append("Null Orders.order_id detected")
+# (table, message, key indexes required, check returning a violation mask)
+VALIDATION_RULES = [
+    # Referential Integrity
+    ("shopify_orders", "Orders.sku contains values not found in Products.cookie_sku", ["product_sku"],
+     lambda df, ix: _missing_from(ix["product_sku"], df["sku"])),
+    ("shopify_orders", "Orders.add_on_sku contains invalid product references", ["product_sku"],
+     _invalid_add_ons),
+    ("recipes", "Recipes.sku contains values not found in Products.cookie_sku", ["product_sku"],
+     lambda df, ix: _missing_from(ix["product_sku"], df["sku"])),
+    ("recipes", "Recipes.ingredient contains values not found in Ingredients", ["ingredient"],
+     lambda df, ix: _missing_from(ix["ingredient"], df["ingredient"])),
 
-    if products is not None and products["cookie_sku"].isna().any():
-        issues.append("Null Products.cookie_sku detected")
+    # Domain & Validity
+    ("shopify_orders", "Orders.quantity must be > 0", [],
+     lambda df, ix: df["quantity"] <= 0),
+    ("shopify_orders", "Orders.total_price must be ≥ 0", [],
+     lambda df, ix: df["total_price"] < 0),
+    ("recipes", "Recipes.quantity must be > 0", [],
+     lambda df, ix: df["quantity"] <= 0),
+    ("shopify_products", "Products.price must be ≥ 0", [],
+     lambda df, ix: df["price"] < 0),
+    ("shopify_products", "Products.category contains invalid values", [],
+     lambda df, ix: ~df["category"].isin(VALID_CATEGORIES)),
+    ("ingredients", "Ingredients.cost_per_unit must be ≥ 0", [],
+     lambda df, ix: df["cost_per_unit"] < 0),
+    ("ingredients", "Ingredients.cost_per_gram must be ≥ 0", [],
+     lambda df, ix: df["cost_per_gram"] < 0),
+    ("ingredients", "Ingredients.cost_per_gram calculation mismatch", [],
+     lambda df, ix: _cost_per_gram_mismatch(df)),
+    ("ingredients", "Ingredients.container_grams < grams_per_unit", [],
+     lambda df, ix: df["container_grams"] < df["grams_per_unit"]),
+
+    # Completeness & Uniqueness
+    ("shopify_orders", "Null Orders.order_id detected", [],
+     lambda df, ix: df["order_id"].isna()),
+    ("shopify_orders", "Duplicate Orders.order_id detected", ["order_id"],
+     lambda df, ix: pd.Series(ix["order_id"].duplicated(keep=False), index=df.index)),
+    ("shopify_products", "Null Products.cookie_sku detected", [],
+     lambda df, ix: df["cookie_sku"].isna()),
+    ("ingredients", "Null Ingredients.ingredient detected", [],
+     lambda df, ix: df["ingredient"].isna()),
+]
+
+# Columns that identify a quarantined row when the ETL re-reads the sources
+QUARANTINE_KEYS = {
+    "shopify_orders": ["order_id"],
+    "shopify_products": ["cookie_sku"],
+    "ingredients": ["ingredient"],
+    "recipes": ["sku", "ingredient"],
+}
+
+
+# Key index -> (table, column) it is built from. Reference indexes come
+# from the small lookup files; own-key indexes are built from the table the
+# rule checks, so they need the whole column
+KEY_SOURCES = {
+    "product_sku": ("shopify_products", "cookie_sku"),
+    "ingredient": ("ingredients", "ingredient"),
+}
+OWN_KEYS = {
+    "order_id": ("shopify_orders", "order_id"),
+}
+
+RULE_ORDER = {rule[1]: i for i, rule in enumerate(VALIDATION_RULES)}
+TABLE_ORDER = {table_name: i for i, table_name in enumerate(dict.fromkeys(rule[0] for rule in VALIDATION_RULES))}
+
+
+def build_key_indexes(data):
+    """Build the reference key indexes the rules look values up in, once per source."""
+    indexes = {}
+    for index_name, (table_name, column) in KEY_SOURCES.items():
+        if data.get(table_name) is not None:
+            indexes[index_name] = pd.Index(data[table_name][column].dropna().unique())
+    return indexes
+
+
+def read_key_indexes(source_folder, filenames):
+    """build_key_indexes from the key columns of the files ({table: file name}) alone."""
+    indexes = {}
+    for index_name, (table_name, column) in KEY_SOURCES.items():
+        if table_name not in filenames:
+            continue
+        path = os.path.join(source_folder, filenames[table_name])
+        encoding, delimiter = _sniff(path)
+        if column not in pd.read_csv(path, encoding=encoding, delimiter=delimiter, nrows=0):
+            continue
+        values = pd.read_csv(path, encoding=encoding, delimiter=delimiter, usecols=[column])[column]
+        indexes[index_name] = pd.Index(values.dropna().unique())
+    return indexes
+
+
+def _in_rule_order(violations):
+    return sorted(violations, key=lambda v: (TABLE_ORDER[v["table"]], RULE_ORDER[v["message"]]))
+
+
+class TableValidator:
+    """
+    Evaluates the rules of one table chunk by chunk, keeping only the rows
+    that fail. Rules on the table's own keys (duplicate order ids) need the
+    whole column, so only that column is kept and they run in finish().
+    """
+
+    def __init__(self, table_name, indexes):
+        self.table_name = table_name
+        self.indexes = indexes
+        own = {name: column for name, (table, column) in OWN_KEYS.items() if table == table_name}
+        rules = [
+            (message, requires, check)
+            for table, message, requires, check in VALIDATION_RULES
+            if table == table_name and all(key in indexes or key in own for key in requires)
+        ]
+        self.own_keys = own
+        self.chunk_rules = [(m, check) for m, requires, check in rules if not any(key in own for key in requires)]
+        self.table_rules = [(m, check) for m, requires, check in rules if any(key in own for key in requires)]
+        self._rows = {}
+        self._failed = []
+        self._keys = []
+
+    def _apply(self, rules, df, indexes):
+        masks = pd.DataFrame({message: check(df, indexes) for message, check in rules}, index=df.index)
+        for message in masks.columns[masks.any().to_numpy()]:
+            self._rows.setdefault(message, []).append(df.index[masks[message].to_numpy()].to_numpy())
+        return masks.any(axis=1).to_numpy() if len(masks.columns) else np.zeros(len(df), dtype=bool)
+
+    def add(self, chunk):
+        failed = self._apply(self.chunk_rules, chunk, self.indexes)
+        if failed.any():
+            self._failed.append(chunk[failed])
+        if self.table_rules:
+            self._keys.append(chunk[list(dict.fromkeys(self.own_keys.values()))])
+
+    def finish(self, read_rows):
+        """
+        Run the whole-table rules and return (violations, failed rows or
+        None). read_rows(row indexes) re-reads failed rows that were not
+        kept, which only happens when a whole-table rule fails.
+        """
+        if self.table_rules and self._keys:
+            keys = pd.concat(self._keys)
+            indexes = {**self.indexes, **{name: pd.Index(keys[column]) for name, column in self.own_keys.items()}}
+            failed = self._apply(self.table_rules, keys, indexes)
+            kept = pd.Index([]) if not self._failed else pd.concat(self._failed).index
+            missing = keys.index[failed].difference(kept)
+            if len(missing):
+                self._failed.append(read_rows(missing))
+
+        violations = [
+            {"table": self.table_name, "message": message, "count": len(rows), "rows": rows}
+            for message, parts in self._rows.items()
+            for rows in [np.sort(np.concatenate(parts))]
+        ]
+        failed_rows = pd.concat(self._failed).sort_index() if self._failed else None
+        return _in_rule_order(violations), failed_rows
+
+
+def validate_sources(data):
+    """
+    Evaluate every rule on in-memory tables,
+    one vectorized pass per table.
+
+    Returns a list of violations, one per failing rule, each a dict with
+    the table, message, violation count and the offending row indexes.
+    """
+    indexes = build_key_indexes(data)
+    violations = []
+    for table_name in TABLE_ORDER:
+        df = data.get(table_name)
+        if df is None:
+            continue
+        validator = TableValidator(table_name, indexes)
+        validator.add(df)
+        violations += validator.finish(lambda rows: df.loc[rows])[0]
+    return violations
 
-    if ingredients is not None and ingredients["ingredient"].isna().any():
-        issues.append("Null Ingredients.ingredient detected")
 
-    return issues
+def run_validations(data):
+    return [violation["message"] for violation in validate_sources(data)]
+
+
+def quarantine_rows(data, violations, quarantine_dir):
+    """
+    Write every row that failed a rule to quarantine_dir/<table>.csv with a
+    failed_rules column, replacing the quarantine files of earlier runs.
+    data holds the tables, or just their failed rows, by row index.
+    Returns the number of quarantined rows per table.
+    """
+    os.makedirs(quarantine_dir, exist_ok=True)
+    for filename in os.listdir(quarantine_dir):
+        if filename.endswith(".csv"):
+            os.remove(os.path.join(quarantine_dir, filename))
+
+    failed = {}
+    for violation in violations:
+        for row in violation["rows"]:
+            failed.setdefault(violation["table"], {}).setdefault(row, []).append(violation["message"])
+
+    counts = {}
+    for table_name, rows in failed.items():
+        bad = data[table_name].loc[list(rows)].copy()
+        bad["failed_rules"] = ["; ".join(rules) for rules in rows.values()]
+        bad.to_csv(os.path.join(quarantine_dir, f"{table_name}.csv"), index=False)
+        counts[table_name] = len(bad)
+    return counts
+
+
+def load_quarantine(quarantine_dir):
+    """Return {table: DataFrame of quarantined key columns} from a quarantine run."""
+    quarantined = {}
+    if quarantine_dir is None or not os.path.isdir(quarantine_dir):
+        return quarantined
+    for table_name, keys in QUARANTINE_KEYS.items():
+        path = os.path.join(quarantine_dir, f"{table_name}.csv")
+        if os.path.exists(path):
+            quarantined[table_name] = pd.read_csv(path, usecols=keys)
+    return quarantined
+
+
+def drop_quarantined(df, table_name, quarantined):
+    """Drop rows of df whose keys were quarantined by the inspection."""
+    bad = quarantined.get(table_name)
+    if bad is None or bad.empty:
+        return df
+    keys = QUARANTINE_KEYS[table_name]
+    bad_index = pd.MultiIndex.from_frame(bad[keys])
+    row_index = pd.MultiIndex.from_frame(df[keys])
+    return df[~row_index.isin(bad_index)]
 
 
 # --------------------------------------------------
 # PIPELINE ENTRY POINT
 # --------------------------------------------------
 
+def render_report(profiles, violations, quarantined=None):
+    sections = [render_profile(profile) for profile in profiles.values()]
+    sections.append("\nVALIDATION SUMMARY")
+    sections.append("=" * 60)
+    if not violations:
+        sections.append("✅ All validation checks passed.")
+    for i, violation in enumerate(violations, 1):
+        rows = ", ".join(str(row) for row in violation["rows"][:10])
+        more = " ..." if violation["count"] > 10 else ""
+        sections.append(
+            f"{i}. ❌ {violation['message']} ({violation['count']} rows; row indexes: {rows}{more})"
+        )
+    for table_name, count in (quarantined or {}).items():
+        sections.append(f"Quarantined {count} rows of {table_name}")
+    return "\n".join(sections) + "\n"
+
+
 def run_data_inspection(
     source_folder="./source-data",
     output_file="./source-data/consolidated_inspection_report.txt",
-    fail_on_issues=True
+    fail_on_issues=True,
+    workers=None,
+    sample_fraction=None,
+    sample_min_bytes=SAMPLE_MIN_BYTES,
+    quarantine_dir=None,
 ):
-    original_stdout = sys.stdout
-    dataframes = {}
-
-    with open(output_file, "w", encoding="utf-8") as report:
-        sys.stdout = report
-
-        for filename in os.listdir(source_folder):
-            if filename.endswith(".csv"):
-                path = os.path.join(source_folder, filename)
-                df = inspect_csv(path)
-                dataframes[filename.replace(".csv", "").lower()] = df
-
-        print("\nVALIDATION SUMMARY")
-        print("=" * 60)
-
-        issues = run_validations(dataframes)
+    """
+    Inspect and validate the source files and write the report.
+
+    With quarantine_dir set, rows that fail validation are written there
+    (see load_quarantine/drop_quarantined) instead of failing the run.
+    """
+    profiles, violations, failed_rows = inspect_sources(
+        source_folder,
+        workers=workers,
+        sample_fraction=sample_fraction,
+        sample_min_bytes=sample_min_bytes,
+    )
+    issues = [violation["message"] for violation in violations]
 
-        if not issues:
-            print("✅ All validation checks passed.")
-        else:
-            for i, issue in enumerate(issues, 1):
-                print(f"{i}. ❌ {issue}")
+    quarantined = None
+    if quarantine_dir is not None:
+        quarantined = quarantine_rows(failed_rows, violations, quarantine_dir)
 
-    sys.stdout = original_stdout
+    with open(output_file, "w", encoding="utf-8") as report:
+        report.write(render_report(profiles, violations, quarantined))
 
-    if issues and fail_on_issues:
+    if issues and fail_on_issues and quarantine_dir is None:
         raise RuntimeError("Data inspection failed — see inspection report.")
 
     return issues
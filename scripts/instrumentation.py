@@ -0,0 +1,156 @@
+"""
+Per-stage instrumentation for ETL runs.
+
+Each pipeline stage runs inside a RunLog span that records its duration,
+input/output row counts, bytes read and written, and the process memory
+high-water mark. Every finished span is appended to a JSON run log right
+away, so a failed run still shows how far it got.
+
+One stage can optionally run under cProfile or tracemalloc; the profile is
+saved next to the run log.
+"""
+
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+RUN_LOG_DIR = "run-logs"
+PROFILERS = ["cprofile", "tracemalloc"]
+TRACEMALLOC_TOP = 25
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def io_counters():
+    """Bytes this process has read/written so far, or (None, None) off Linux."""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None, None
+    return int(counters["rchar"]), int(counters["wchar"])
+
+
+def file_bytes(paths):
+    return sum(Path(p).stat().st_size for p in paths if Path(p).exists())
+
+
+class Span:
+    """Measurements of one stage; the stage fills in rows and extra timings."""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, key):
+        """Accumulate the time spent in a sub-step (e.g. staging writes)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[key] = self.timings.get(key, 0.0) + time.perf_counter() - start
+
+
+class RunLog:
+    def __init__(self, log_dir, profile_stage=None, profiler="cprofile"):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}'. Choose from: {', '.join(PROFILERS)}")
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = self.log_dir / f"run-{self.run_id}.json"
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, rows_in=None):
+        span = Span(name, rows_in)
+        read_before, written_before = io_counters()
+        peak_before = peak_rss_bytes()
+        profiler = self._start_profiler() if name == self.profile_stage else None
+        status = "error"
+        start = time.perf_counter()
+        try:
+            yield span
+            status = "ok"
+        finally:
+            seconds = time.perf_counter() - start
+            profile_file = self._stop_profiler(profiler, name) if profiler is not None else None
+            read_after, written_after = io_counters()
+            peak_after = peak_rss_bytes()
+            record = {
+                "stage": name,
+                "status": status,
+                "seconds": round(seconds, 4),
+                "rows_in": span.rows_in,
+                "rows_out": span.rows_out,
+                "bytes_read": span.bytes_read if span.bytes_read is not None
+                else (read_after - read_before if read_after is not None else None),
+                "bytes_written": span.bytes_written if span.bytes_written is not None
+                else (written_after - written_before if written_after is not None else None),
+                "peak_rss_mb": round(peak_after / (1024 * 1024), 1),
+                # How much this stage raised the process high-water mark
+                "peak_rss_growth_mb": round((peak_after - peak_before) / (1024 * 1024), 1),
+            }
+            if span.timings:
+                record["timings"] = {key: round(value, 4) for key, value in span.timings.items()}
+            if profile_file is not None:
+                record["profile"] = profile_file.name
+            self.spans.append(record)
+            self.write()
+
+    def _start_profiler(self):
+        if self.profiler == "tracemalloc":
+            tracemalloc.start()
+            return tracemalloc
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, stage_name):
+        base = self.log_dir / f"run-{self.run_id}-{stage_name}"
+        if profiler is tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(str(base) + ".tracemalloc")
+            # Human-readable top allocations alongside the raw snapshot
+            with open(str(base) + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+            return Path(str(base) + ".tracemalloc")
+        profiler.disable()
+        profiler.dump_stats(str(base) + ".prof")
+        return Path(str(base) + ".prof")
+
+    def write(self):
+        log = {
+            "run_id": self.run_id,
+            "started": self.started,
+            "argv": sys.argv[1:],
+            "pid": os.getpid(),
+            "spans": self.spans,
+        }
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(log, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,408 @@
+"""
+Local HTTP query service for the KPI rollups.
+
+Serves orders, dozens, revenue, ingredient cost, gross margin and margin %
+by product and date range straight from the staging rollups
+(kpi_daily_product, kpi_weekly_product, kpi_monthly_product), so dashboards
+neither query the warehouse at fact grain nor pull whole tables through
+Google Sheets.
+
+    GET /kpi?grain=weekly&start=2024-01-01&end=2024-03-31&product=CK-CHOC-001&by=period,product
+    GET /metrics
+
+Encoded results are kept in an in-memory LRU cache. Every ETL run that
+changes the rollups appends the months of the orders it added to
+kpi_changes.jsonl in staging (record_changes). Before answering, the
+service checks that file. When it has grown, the rollups are re-read and
+only the cached results whose date range overlaps those months are
+dropped. Full runs and product changes drop everything. /metrics reports
+cache hits, misses, evictions and invalidations, and request latencies.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from rollups import MEASURES, ROLLUP_TABLES, margin_pct
+from scd import current_versions
+from staging_io import detect_format, read_staging
+
+STAGING_DIR = Path(__file__).resolve().parent.parent / "staging-data"
+CHANGES_FILE = "kpi_changes.jsonl"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_ENTRIES = 256
+# Latencies kept per outcome for the percentiles in /metrics
+LATENCY_SAMPLES = 1000
+
+GRAIN_TABLES = {grain: table_name for table_name, grain in ROLLUP_TABLES.items()}
+# by= value -> column the rows are grouped on
+GROUP_COLUMNS = {"period": "period_start_key", "product": "product_sku"}
+
+
+# --------------------------------------------------
+# CHANGE LOG (WRITTEN BY THE PIPELINE)
+# --------------------------------------------------
+
+def changed_months(date_keys):
+    """Sorted YYYYMM months of YYYYMMDD date keys."""
+    return sorted({int(key) // 100 for key in date_keys})
+
+
+def record_changes(staging_dir, date_keys=(), full=False):
+    """Append the months whose rollup buckets a run changed; full=True marks every result stale."""
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "full": bool(full),
+        "months": [] if full else changed_months(date_keys),
+    }
+    with open(Path(staging_dir) / CHANGES_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def read_changes(staging_dir, offset=0):
+    """
+    (change records appended since offset, new offset). A change log that
+    shrank or disappeared was replaced, which counts as a full change.
+    """
+    path = Path(staging_dir) / CHANGES_FILE
+    size = path.stat().st_size if path.exists() else 0
+    if size == offset:
+        return [], offset
+    if size < offset:
+        return [{"full": True, "months": []}], size
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    # A record still being written is picked up by the next check
+    complete = data[:data.rfind(b"\n") + 1]
+    records = [json.loads(line) for line in complete.splitlines() if line.strip()]
+    return records, offset + len(complete)
+
+
+# --------------------------------------------------
+# QUERIES
+# --------------------------------------------------
+
+def _date_key(value, name):
+    try:
+        return int(date.fromisoformat(value).strftime("%Y%m%d"))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD), got '{value}'") from None
+
+
+def _iso_date(date_key):
+    if date_key is None:
+        return None
+    key = str(date_key)
+    return f"{key[:4]}-{key[4:6]}-{key[6:]}"
+
+
+def _values(params, name):
+    return [value for raw in params.get(name, []) for value in raw.split(",") if value]
+
+
+def parse_query(params):
+    """
+    Normalize the parameters of a /kpi request (parse_qs output) into
+    (grain, start_key, end_key, products, by); equivalent requests share a
+    cache entry. Raises ValueError on bad parameters.
+    """
+    grain = params.get("grain", ["daily"])[0]
+    if grain not in GRAIN_TABLES:
+        raise ValueError(f"grain must be one of {', '.join(GRAIN_TABLES)}")
+    start_key = _date_key(params["start"][0], "start") if params.get("start") else None
+    end_key = _date_key(params["end"][0], "end") if params.get("end") else None
+    by = _values(params, "by") if "by" in params else ["product"]
+    unknown = [group for group in by if group not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"by must be a list of {', '.join(GROUP_COLUMNS)}, got '{','.join(unknown)}'")
+    by = [group for group in GROUP_COLUMNS if group in by]
+    return grain, start_key, end_key, tuple(sorted(set(_values(params, "product")))), tuple(by)
+
+
+def depends_on(grain, start_key, end_key):
+    """
+    (first, last) YYYYMM month of the orders a query's buckets are summed
+    from; None where the range is open.
+    """
+    last = None
+    if end_key is not None:
+        end = datetime.strptime(str(end_key), "%Y%m%d").date()
+        if grain == "weekly":
+            end += timedelta(days=6)
+        last = end.year * 100 + end.month
+    return (start_key // 100 if start_key is not None else None), last
+
+
+class KpiStore:
+    """
+    The rollups of a staging area, sorted by period and labelled with product
+    SKUs and names. A store is a snapshot: it is never changed once read, a
+    reload reads a new one.
+    """
+
+    def __init__(self, staging_dir):
+        self.staging_dir = Path(staging_dir)
+        products = read_staging(self.staging_dir, "dim_product")
+        sku_by_key = products.set_index("product_key")["product_sku"]
+        # Every version of a product is reported under the current version's name
+        self.product_names = current_versions(products).drop_duplicates("product_sku", keep="last").set_index(
+            "product_sku"
+        )["product_name"]
+
+        rollups = {}
+        for grain, table_name in GRAIN_TABLES.items():
+            if detect_format(self.staging_dir, table_name) is None:
+                continue
+            rollup = read_staging(self.staging_dir, table_name, columns=["period_start_key", "product_key"] + MEASURES)
+            rollup["product_sku"] = rollup["product_key"].map(sku_by_key)
+            rollups[grain] = rollup.sort_values("period_start_key", kind="stable").reset_index(drop=True)
+        self.rollups = rollups
+
+    def answer(self, grain, start_key, end_key, products, by):
+        """The rows of a normalized query as a DataFrame."""
+        rollup = self.rollups.get(grain)
+        if rollup is None:
+            raise LookupError(f"{GRAIN_TABLES[grain]} is not in {self.staging_dir} yet; run the ETL first")
+
+        # Rows are sorted by period, so the date range is two binary searches
+        periods = rollup["period_start_key"].to_numpy()
+        lo = np.searchsorted(periods, start_key, side="left") if start_key is not None else 0
+        hi = np.searchsorted(periods, end_key, side="right") if end_key is not None else len(periods)
+        rows = rollup.iloc[lo:hi]
+        if products:
+            rows = rows[rows["product_sku"].isin(products)]
+
+        columns = [GROUP_COLUMNS[group] for group in by]
+        if columns:
+            sums = rows.groupby(columns, as_index=False)[MEASURES].sum()
+        else:
+            sums = pd.DataFrame([rows[MEASURES].sum()], columns=MEASURES)
+        sums["margin_pct"] = margin_pct(sums["gross_margin"], sums["revenue"])
+        sums[["revenue", "ingredient_cost", "gross_margin"]] = sums[["revenue", "ingredient_cost", "gross_margin"]].round(2)
+
+        if "period_start_key" in sums:
+            keys = sums.pop("period_start_key").astype(str)
+            sums.insert(0, "period_start", keys.str[:4] + "-" + keys.str[4:6] + "-" + keys.str[6:])
+        if "product_sku" in sums:
+            sums.insert(sums.columns.get_loc("product_sku") + 1, "product_name", sums["product_sku"].map(self.product_names))
+        return sums
+
+
+# --------------------------------------------------
+# CACHE AND METRICS
+# --------------------------------------------------
+
+class ResultCache:
+    """LRU cache of encoded results, each tagged with the (first, last) order months it depends on."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, body, months):
+        self._entries[key] = (body, months)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, records):
+        """Drop the results a batch of change records made stale; returns how many."""
+        if any(record["full"] for record in records):
+            stale = list(self._entries)
+        else:
+            changed = np.array(sorted({month for record in records for month in record["months"]}), dtype=np.int64)
+            stale = []
+            for key, (_, (first, last)) in self._entries.items():
+                lo = np.searchsorted(changed, first, side="left") if first is not None else 0
+                hi = np.searchsorted(changed, last, side="right") if last is not None else len(changed)
+                if hi > lo:
+                    stale.append(key)
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+
+class LatencyStats:
+    """Recent request latencies of one outcome (hit, miss, error)."""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.count = 0
+        self._recent = deque(maxlen=samples)
+
+    def add(self, seconds):
+        self.count += 1
+        self._recent.append(seconds * 1000)
+
+    def summary(self):
+        if not self._recent:
+            return {"count": self.count}
+        recent = np.array(self._recent)
+        return {
+            "count": self.count,
+            "p50_ms": round(float(np.percentile(recent, 50)), 3),
+            "p95_ms": round(float(np.percentile(recent, 95)), 3),
+            "max_ms": round(float(recent.max()), 3),
+        }
+
+
+# --------------------------------------------------
+# SERVICE
+# --------------------------------------------------
+
+class KpiService:
+    """Answers /kpi and /metrics requests; safe to call from the server's request threads."""
+
+    def __init__(self, staging_dir=STAGING_DIR, cache_entries=DEFAULT_CACHE_ENTRIES):
+        self.staging_dir = Path(staging_dir)
+        self.cache = ResultCache(cache_entries)
+        self.latency = {outcome: LatencyStats() for outcome in ["hit", "miss", "error"]}
+        self.reloads = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # Bumped on every reload, so results computed from older rollups aren't cached
+        self._generation = 0
+        # The rollups read now already include every change logged so far
+        changes_path = self.staging_dir / CHANGES_FILE
+        self._changes_offset = changes_path.stat().st_size if changes_path.exists() else 0
+        self.store = KpiStore(self.staging_dir)
+
+    def refresh(self):
+        """Pick up the ETL runs logged since the last check."""
+        records, self._changes_offset = read_changes(self.staging_dir, self._changes_offset)
+        if not records:
+            return
+        # Requests being answered keep the store they started with
+        self.store = KpiStore(self.staging_dir)
+        self.reloads += 1
+        self._generation += 1
+        dropped = self.cache.invalidate(records)
+        print(f"Rollups reloaded after {len(records)} ETL run(s); {dropped} cached results dropped")
+
+    def handle(self, path, params):
+        """(HTTP status, JSON body bytes) of a request."""
+        started = time.perf_counter()
+        if path == "/metrics":
+            return 200, json.dumps(self.metrics()).encode()
+        if path != "/kpi":
+            return 404, json.dumps({"error": f"Unknown path '{path}'; use /kpi or /metrics"}).encode()
+
+        outcome = "error"
+        try:
+            query = parse_query(params)
+            with self._lock:
+                self.refresh()
+                body = self.cache.get(query)
+                store, generation = self.store, self._generation
+            if body is not None:
+                outcome = "hit"
+                return 200, body
+            rows = store.answer(*query)
+            grain, start_key, end_key, products, by = query
+            # The normalized query, not the raw parameters: the body is shared
+            # by every request of the same cache key
+            body = json.dumps({
+                "grain": grain,
+                "start": _iso_date(start_key),
+                "end": _iso_date(end_key),
+                "products": list(products),
+                "by": list(by),
+                "rows": json.loads(rows.to_json(orient="records")),
+            }).encode()
+            with self._lock:
+                if generation == self._generation:
+                    self.cache.put(query, body, depends_on(grain, start_key, end_key))
+            outcome = "miss"
+            return 200, body
+        except ValueError as e:
+            return 400, json.dumps({"error": str(e)}).encode()
+        except LookupError as e:
+            return 503, json.dumps({"error": str(e)}).encode()
+        finally:
+            self.latency[outcome].add(time.perf_counter() - started)
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.cache.hits + self.cache.misses
+            return {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "cache": {
+                    "entries": len(self.cache),
+                    "max_entries": self.cache.max_entries,
+                    "hits": self.cache.hits,
+                    "misses": self.cache.misses,
+                    "hit_rate": round(self.cache.hits / lookups, 4) if lookups else None,
+                    "evictions": self.cache.evictions,
+                    "invalidations": self.cache.invalidations,
+                },
+                "reloads": self.reloads,
+                "latency": {outcome: stats.summary() for outcome, stats in self.latency.items()},
+            }
+
+
+class KpiRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, body = self.server.service.handle(url.path, parse_qs(url.query))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Requests are counted in /metrics instead of logged one by one
+        pass
+
+
+def serve(staging_dir=STAGING_DIR, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_entries=DEFAULT_CACHE_ENTRIES):
+    server = ThreadingHTTPServer((host, port), KpiRequestHandler)
+    server.service = KpiService(staging_dir, cache_entries)
+    print(f"Serving KPIs from {staging_dir} on http://{host}:{server.server_port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the KPI rollups over HTTP with a result cache")
+    parser.add_argument("--staging-dir", type=Path, default=STAGING_DIR)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help="Results kept in the LRU cache")
+    args = parser.parse_args(argv)
+    serve(args.staging_dir, args.host, args.port, args.cache_entries)
+
+
+if __name__ == "__main__":
+    main()
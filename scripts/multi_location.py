@@ -0,0 +1,188 @@
+"""
+Multi-location runner: one pipeline per shop location, run in parallel.
+
+Every location has its own source root (Shopify export, products, recipes,
+ingredients) and its own staging directory under the staging root. The
+locations are inspected, transformed and loaded in a process pool, one
+process per location and up to one per core, all into the same warehouse.
+
+Rows are tagged with a location_key. Each location's product keys are
+offset into their own block of LOCATION_KEY_BLOCK keys, so product_key
+stays a single-column key that is unique across locations. Facts, the
+bridge and the rollups point at the location's own products.
+
+Ingredients and dates are shared. The runner merges the ingredient files
+of all locations once, before fanning out; the first location listing an
+ingredient defines it. It versions and loads dim_ingredient and
+dim_location itself, and every location builds its bridge from the same
+ingredient versions. The location pipelines load with the upsert loader,
+so dates that several shops have orders on are merged rather than
+duplicated.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Product keys of location n are n * LOCATION_KEY_BLOCK + the local key
+LOCATION_KEY_BLOCK = 1000
+PRODUCT_KEY_COLUMNS = ["product_key", "add_on_key"]
+
+# Loaded once by the runner; dim_date is shared too, but each location
+# upserts the dates it has orders on
+SHARED_TABLES = ["dim_ingredient"]
+UNTAGGED_TABLES = ["dim_ingredient", "dim_date", "dim_location"]
+
+SHARED_DIR = "shared"
+
+
+def tag_location(table_name, df, location_key):
+    """Add location_key to a location's rows and move its product keys into the location's block."""
+    if table_name in UNTAGGED_TABLES:
+        return df
+    offset = location_key * LOCATION_KEY_BLOCK
+    if "product_key" in df and len(df) and df["product_key"].max() >= LOCATION_KEY_BLOCK:
+        raise ValueError(f"Locations are limited to {LOCATION_KEY_BLOCK - 1} products")
+    return df.assign(
+        **{col: df[col] + offset for col in PRODUCT_KEY_COLUMNS if col in df},
+        location_key=location_key,
+    )
+
+
+def untag_location(table_name, df, location_key):
+    """Undo tag_location (for version histories read back from staging)."""
+    if table_name in UNTAGGED_TABLES:
+        return df
+    offset = location_key * LOCATION_KEY_BLOCK
+    return df.drop(columns="location_key", errors="ignore").assign(
+        **{col: df[col] - offset for col in PRODUCT_KEY_COLUMNS if col in df}
+    )
+
+
+# --------------------------------------------------
+# SHARED DIMENSIONS
+# --------------------------------------------------
+
+def location_keys(names, existing=None):
+    """
+    {location name: location_key}. Locations keep the key they were given
+    by earlier runs (existing: dim_location); new ones get the next free keys.
+    """
+    keys = {}
+    if existing is not None:
+        keys = dict(zip(existing["location"], existing["location_key"].astype(int)))
+    next_key = max(keys.values(), default=0) + 1
+    for name in names:
+        if name not in keys:
+            keys[name] = next_key
+            next_key += 1
+    return {name: keys[name] for name in names}
+
+
+def merge_ingredients(source_dirs):
+    """Union of the locations' ingredients.csv; the first location listing an ingredient wins."""
+    import pandas as pd
+
+    frames = [pd.read_csv(Path(source_dir) / "ingredients.csv") for source_dir in source_dirs]
+    merged = pd.concat(frames, ignore_index=True)
+    conflicting = merged.drop_duplicates().duplicated(subset="ingredient", keep=False)
+    for ingredient in sorted(merged.drop_duplicates().loc[conflicting, "ingredient"].unique()):
+        print(f"Ingredient '{ingredient}' differs between locations; using the first location's row")
+    return merged.drop_duplicates(subset="ingredient", keep="first").reset_index(drop=True)
+
+
+# --------------------------------------------------
+# RUNNER
+# --------------------------------------------------
+
+def run_location(options):
+    """Run one location's pipeline (in a worker process); returns its summary."""
+    from pipeline import Pipeline
+
+    pipeline = Pipeline(**options)
+    pipeline.staging_dir.mkdir(parents=True, exist_ok=True)
+    pipeline.inspect()
+    pipeline.extract()
+    pipeline.transform()
+    summary = pipeline.load()
+    return {"location_key": options["location_key"], "source_dir": str(options["source_dir"]), **summary}
+
+
+def run_locations(source_dirs, pipeline_options, workers=None):
+    """
+    Run the pipeline for every source root in source_dirs into one warehouse.
+    pipeline_options are the Pipeline arguments shared by all locations;
+    staging_dir is the staging root. Returns the summary of each location
+    and the runner's own pipeline, which validates the combined warehouse.
+    """
+    import pandas as pd
+
+    from parallel_load import max_writers
+    from pipeline import Pipeline
+    from staging_io import detect_format, read_staging, write_staging
+    from scd import apply_versions
+    from transforms import build_dim_ingredient
+
+    source_dirs = [Path(source_dir).resolve() for source_dir in source_dirs]
+    names = [source_dir.name for source_dir in source_dirs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Location folders must have distinct names: {', '.join(duplicates)}")
+
+    staging_root = Path(pipeline_options["staging_dir"])
+    shared_dir = staging_root / SHARED_DIR
+    shared_dir.mkdir(parents=True, exist_ok=True)
+
+    # Shared dimensions are built and loaded once, before the locations start
+    existing = read_staging(shared_dir, "dim_location") if detect_format(shared_dir, "dim_location") else None
+    keys = location_keys(names, existing)
+    dim_location = pd.DataFrame({
+        "location_key": [keys[name] for name in names],
+        "location": names,
+        "source_dir": [str(source_dir) for source_dir in source_dirs],
+    })
+    if existing is not None:
+        dim_location = pd.concat(
+            [existing[~existing["location"].isin(names)], dim_location], ignore_index=True
+        ).sort_values("location_key")
+
+    ingredients_path = shared_dir / "sources" / "ingredients.csv"
+    ingredients_path.parent.mkdir(exist_ok=True)
+    merge_ingredients(source_dirs).to_csv(ingredients_path, index=False)
+    history = read_staging(shared_dir, "dim_ingredient") if detect_format(shared_dir, "dim_ingredient") else None
+    dim_ingredient, _ = apply_versions(
+        "dim_ingredient",
+        build_dim_ingredient(pd.read_csv(ingredients_path)),
+        history,
+        pipeline_options.get("effective_date"),
+    )
+
+    # The runner loads with upsert so repeated runs don't duplicate the shared rows
+    shared = Pipeline(**{**pipeline_options, "loader": "upsert", "run_log_dir": shared_dir / "run-logs"})
+    for table_name, df in {"dim_location": dim_location, "dim_ingredient": dim_ingredient}.items():
+        write_staging(df, shared_dir, table_name, fmt=pipeline_options.get("staging_format", "csv"))
+        shared.loader.load(table_name, df)
+
+    jobs = [
+        {
+            **pipeline_options,
+            "source_dir": source_dir,
+            "staging_dir": staging_root / name,
+            "run_log_dir": Path(pipeline_options["run_log_dir"]) / name if pipeline_options.get("run_log_dir") else None,
+            "loader": "upsert",
+            "location_key": keys[name],
+            "source_paths": {"ingredients": ingredients_path},
+            "shared_tables": {table_name: shared_dir for table_name in SHARED_TABLES},
+        }
+        for name, source_dir in zip(names, source_dirs)
+    ]
+
+    # SQLite takes one writer at a time, so its locations run one after another
+    workers = max_writers(shared.loader.engine, min(workers or os.cpu_count() or 1, len(jobs)))
+    print(f"\nRunning {len(jobs)} locations in {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(run_location, jobs))
+
+    for summary in summaries:
+        print(f"Location {summary['location_key']} ({summary['source_dir']}): {summary['fact_rows']} orders loaded")
+    return summaries, shared
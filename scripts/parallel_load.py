@@ -0,0 +1,179 @@
+"""
+Dependency-aware parallel loading of the warehouse tables.
+
+Tables are nodes of a small DAG: the dimensions don't depend on each other,
+the bridge needs dim_product and dim_ingredient, and fact_orders needs
+dim_product and dim_date. run_dag starts every table as soon as the tables
+it depends on are loaded, with at most `workers` loads (and pooled
+connections) at once.
+
+The streamed dim_date/fact_orders chunks are split into date_key range
+partitions (one calendar month is one range) that are written concurrently,
+each on its own connection, into scratch copies of the tables. Nothing reads
+the scratch tables, so the partitions commit into them as they go. Once the
+whole stream is written, one transaction moves the scratch rows into the
+real tables through the loader (append or merge), so the stream lands in a
+single commit or not at all. The price is a second copy of every row:
+client -> scratch table over the partition connections, then scratch ->
+target inside the server (INSERT ... SELECT, no network round trips).
+
+With a single partition (one load worker, or SQLite, which allows a single
+writer at a time) there is nothing to coordinate: the stream is written
+straight into the real tables in one loader transaction, without scratch
+tables or the second copy.
+"""
+
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+
+DEFAULT_LOAD_WORKERS = 4
+
+# Tables each table needs to be loaded first (foreign key targets)
+TABLE_DEPENDENCIES = {
+    "dim_product": [],
+    "dim_ingredient": [],
+    "dim_date": [],
+    "bridge_product_ingredient": ["dim_product", "dim_ingredient"],
+    "fact_orders": ["dim_product", "dim_date"],
+}
+
+
+def max_writers(engine, workers):
+    """How many connections may write at once on this backend."""
+    return 1 if engine.dialect.name == "sqlite" else max(1, workers)
+
+
+# --------------------------------------------------
+# DAG SCHEDULING
+# --------------------------------------------------
+
+def run_dag(tasks, dependencies=TABLE_DEPENDENCIES, workers=DEFAULT_LOAD_WORKERS):
+    """
+    Run tasks ({table name: callable}) once their dependencies are done.
+
+    Dependencies on tables that are not part of this run are treated as
+    already loaded. If a task fails, nothing new is started and the error is
+    raised once the running tasks have finished.
+    """
+    pending = {
+        name: [dep for dep in dependencies.get(name, []) if dep in tasks]
+        for name in tasks
+    }
+    unknown = [dep for deps in pending.values() for dep in deps if dep not in pending]
+    if unknown:
+        raise ValueError(f"Unknown table dependencies: {', '.join(unknown)}")
+
+    done = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = {}
+        while pending or running:
+            ready = [name for name, deps in pending.items() if all(dep in done for dep in deps)]
+            for name in ready:
+                del pending[name]
+                running[pool.submit(tasks[name])] = name
+            if not running:
+                raise ValueError(f"Circular table dependencies: {', '.join(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    wait(running)
+                    raise future.exception()
+                done.add(name)
+
+
+# --------------------------------------------------
+# PARTITIONED STREAMING LOAD
+# --------------------------------------------------
+
+def date_partitions(df, n_partitions):
+    """Split rows into n_partitions groups of whole months of date_key."""
+    if n_partitions == 1:
+        return [df]
+    month_index = df["date_key"] // 100
+    partition = (month_index // 100 * 12 + month_index % 100) % n_partitions
+    return [df[partition == i] for i in range(n_partitions)]
+
+
+@contextmanager
+def partitioned_transaction(loader, partitions):
+    """
+    Yield a write(table_name, df) callable like BulkLoader.transaction(), but
+    spread each chunk over `partitions` connections by date_key range.
+
+    Partition i of every table is written on connection i into a scratch
+    table. The scratch tables are merged into their targets, in the order
+    the tables were first written (dim_date before the facts that reference
+    it), in one transaction when the block exits, and dropped either way.
+    With one partition the rows go straight to the targets instead.
+    """
+    from sqlalchemy import text
+
+    partitions = max_writers(loader.engine, partitions)
+    # Nothing to coordinate: skip the scratch tables and their second copy
+    if partitions == 1:
+        with loader.transaction() as write:
+            yield write
+        return
+
+    session_stats = {}
+    # table name -> (scratch table name, columns), in first-write order
+    scratch_tables = {}
+    suffix = uuid.uuid4().hex[:8]
+
+    def drop_scratch_tables():
+        with loader.engine.begin() as conn:
+            for scratch_name, _ in scratch_tables.values():
+                conn.execute(text(f"DROP TABLE IF EXISTS {scratch_name}"))
+
+    with ExitStack() as stack:
+        stack.callback(drop_scratch_tables)
+        connections = [stack.enter_context(loader.engine.connect()) for _ in range(partitions)]
+        # One thread per connection keeps each connection's writes in order
+        pools = [stack.enter_context(ThreadPoolExecutor(max_workers=1)) for _ in range(partitions)]
+
+        def create_scratch_table(table_name, df):
+            # Separate transaction: DDL commits implicitly on MySQL anyway
+            scratch_name = f"{table_name}_load_{suffix}"
+            with loader.engine.begin() as conn:
+                loader._prepare(conn, table_name, df)
+                conn.execute(text(f"CREATE TABLE {scratch_name} AS SELECT * FROM {table_name} WHERE 1 = 0"))
+            scratch_tables[table_name] = (scratch_name, list(df.columns))
+
+        def write_partition(conn, scratch_name, df):
+            with conn.begin():
+                loader._write_scratch(conn, scratch_name, df)
+            return len(df)
+
+        def write(table_name, df):
+            if df.empty:
+                return
+            start = time.perf_counter()
+            if table_name not in scratch_tables:
+                create_scratch_table(table_name, df)
+            scratch_name = scratch_tables[table_name][0]
+            futures = [
+                pools[i].submit(write_partition, connections[i], scratch_name, part)
+                for i, part in enumerate(date_partitions(df, partitions))
+                if not part.empty
+            ]
+            written = sum(future.result() for future in futures)
+
+            # Wall time of the chunk, not the sum over partitions
+            rows, seconds = session_stats.get(table_name, (0, 0.0))
+            session_stats[table_name] = (rows + written, seconds + time.perf_counter() - start)
+
+        yield write
+
+        with loader.engine.begin() as conn:
+            for table_name, (scratch_name, columns) in scratch_tables.items():
+                start = time.perf_counter()
+                loader._merge_scratch(conn, table_name, scratch_name, columns)
+                rows, seconds = session_stats[table_name]
+                session_stats[table_name] = (rows, seconds + time.perf_counter() - start)
+
+    for table_name, (rows, seconds) in session_stats.items():
+        loader._record(table_name, rows, seconds)
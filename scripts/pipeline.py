@@ -0,0 +1,648 @@
+"""
+The bakery ETL as an importable, lazily initialized pipeline.
+
+Nothing runs on import. pandas, sqlalchemy, pyarrow and chardet are imported
+by the stage that needs them, and the database engine is only created when
+the load starts, so dry runs and inspection- or schema-only runs start
+quickly. An orchestrator can run the pipeline in-process:
+
+    pipeline = Pipeline(db_url="sqlite:///bakery.db")
+    pipeline.run()
+
+or call inspect(), extract(), transform() and load() one at a time.
+etl.py is the command-line entry point.
+"""
+
+import os
+import sys
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote_plus
+
+# This allows importing other scripts in the same folder
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(SCRIPT_DIR))
+
+from bulk_loader import DEFAULT_BATCH_SIZE
+from instrumentation import RUN_LOG_DIR, RunLog, file_bytes
+from parallel_load import DEFAULT_LOAD_WORKERS
+from stage_cache import CACHE_DIR, DEFAULT_CACHE_MAX_BYTES
+
+# -----------------------------
+# PATH CONFIGURATION
+# -----------------------------
+BASE_DIR = SCRIPT_DIR.parent
+SOURCE_DIR = BASE_DIR / "source-data"
+STAGING_DIR = BASE_DIR / "staging-data"
+SQL_DIR = BASE_DIR / "SQL"
+
+# Warehouse connection, from the environment only: a full SQLAlchemy URL,
+# or the MySQL user and password (host, port and database are optional)
+DB_URL_ENV = "BAKERY_DB_URL"
+MYSQL_ENV = {
+    "user": "BAKERY_DB_USER",
+    "password": "BAKERY_DB_PASSWORD",
+    "host": "BAKERY_DB_HOST",
+    "port": "BAKERY_DB_PORT",
+    "database": "BAKERY_DB_NAME",
+}
+MYSQL_DEFAULTS = {"host": "localhost", "port": "3306", "database": "cookie_bakery_dw"}
+NO_DB_URL = (
+    f"No warehouse configured: pass --db-url, set ${DB_URL_ENV} (or ${MYSQL_ENV['user']} and "
+    f"${MYSQL_ENV['password']} for MySQL), or put db_url in the --config file."
+)
+
+
+def db_url_from_env(environ=None):
+    """The warehouse URL configured in the environment, or None."""
+    environ = os.environ if environ is None else environ
+    if environ.get(DB_URL_ENV):
+        return environ[DB_URL_ENV]
+    settings = {key: environ.get(name) or MYSQL_DEFAULTS.get(key) for key, name in MYSQL_ENV.items()}
+    if not (settings["user"] and settings["password"]):
+        return None
+    return (
+        f"mysql+pymysql://{quote_plus(settings['user'])}:{quote_plus(settings['password'])}"
+        f"@{settings['host']}:{settings['port']}/{settings['database']}"
+    )
+
+SOURCE_TABLES = ["shopify_orders", "shopify_products", "ingredients", "recipes"]
+
+# Stage names used in the run log and by --profile-stage
+ETL_STAGES = ["inspection", "transform", "staging_dimensions", "load_dimensions", "fact_orders", "rollups", "validation"]
+
+
+class Pipeline:
+    def __init__(
+        self,
+        source_dir=SOURCE_DIR,
+        staging_dir=STAGING_DIR,
+        sql_dir=SQL_DIR,
+        db_url=None,
+        loader="multirow",
+        batch_size=DEFAULT_BATCH_SIZE,
+        load_workers=DEFAULT_LOAD_WORKERS,
+        chunksize=None,
+        incremental=False,
+        staging_format="csv",
+        inspect_sample=None,
+        quarantine=False,
+        rebuild=False,
+        cache_max_mb=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+        run_log_dir=None,
+        profile_stage=None,
+        profiler="cprofile",
+        location_key=None,
+        source_paths=None,
+        shared_tables=None,
+        effective_date=None,
+        dedup=True,
+    ):
+        self.source_dir = Path(source_dir)
+        self.staging_dir = Path(staging_dir)
+        self.sql_dir = Path(sql_dir)
+        # Without db_url the warehouse comes from the environment (db_url_from_env)
+        self.db_url = db_url or db_url_from_env()
+        self.loader_name = loader
+        self.batch_size = batch_size
+        self.load_workers = load_workers
+        self.chunksize = chunksize
+        self.incremental = incremental
+        self.staging_format = staging_format
+        self.inspect_sample = inspect_sample
+        self.quarantine_dir = self.source_dir / "quarantine" if quarantine else None
+        self.rebuild = rebuild
+        self.cache_max_mb = cache_max_mb
+        self.run_log_dir = Path(run_log_dir) if run_log_dir else self.staging_dir / RUN_LOG_DIR
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        # Multi-location runs (see multi_location.py): rows are tagged with the
+        # location, some sources are shared, and shared tables ({table: staging
+        # dir}) are built and loaded once by the runner rather than by every
+        # location's pipeline
+        self.location_key = location_key
+        self.source_paths = {name: Path(path) for name, path in (source_paths or {}).items()}
+        self.shared_tables = {name: Path(path) for name, path in (shared_tables or {}).items()}
+        # First day of the new versions of changed products and ingredients (default today)
+        self.effective_date = effective_date
+        # Drop orders loaded by an earlier run (see dedup_index.py)
+        self.dedup = dedup
+
+        self._run_log = None
+        self._loader = None
+        self.quarantined = {}
+        self.watermark = None
+        self.order_chunks = None
+        self.orders_offset = None
+        self.order_index = None
+        self.tables = {}
+        self.new_versions = {}
+        self.cost_matrix = None
+        # Kept across watch-mode batches: the dimension tables already written
+        # to staging, and the dim_date keys already staged and loaded
+        self.staged_tables = {}
+        self.known_date_keys = None
+
+    # -----------------------------
+    # LAZY RESOURCES
+    # -----------------------------
+    @property
+    def run_log(self):
+        if self._run_log is None:
+            self._run_log = RunLog(self.run_log_dir, profile_stage=self.profile_stage, profiler=self.profiler)
+            print(f"Run log: {self._run_log.path}")
+        return self._run_log
+
+    def rotate_run_log(self):
+        """Start a new run log file with the next span (long-running watch mode)."""
+        self._run_log = None
+
+    @property
+    def loader(self):
+        """The bulk loader; the engine is created on first use."""
+        if self._loader is None:
+            from bulk_loader import create_loader_engine, get_loader
+
+            if self.db_url is None:
+                raise ValueError(NO_DB_URL)
+            # One pooled connection per parallel load worker
+            engine = create_loader_engine(self.db_url, self.loader_name, pool_size=self.load_workers)
+            self._loader = get_loader(self.loader_name, engine, batch_size=self.batch_size)
+        return self._loader
+
+    def plan(self):
+        """Describe what a run would do without reading any data."""
+        lines = [
+            f"Source data:  {self.source_dir}",
+            f"Staging data: {self.staging_dir} ({self.staging_format})",
+            f"Warehouse:    {self.db_url.split('@')[-1] if self.db_url else 'not configured'} (loader: {self.loader_name})",
+            f"Mode:         {'incremental' if self.incremental else 'full'} run",
+            f"Stages:       {' -> '.join(ETL_STAGES)}",
+        ]
+        if self.location_key is not None:
+            lines.append(f"Location key: {self.location_key}")
+        missing = [name for name in SOURCE_TABLES if not (self.source_dir / f"{name}.csv").exists()]
+        if missing:
+            lines.append(f"Missing source files: {', '.join(missing)}")
+        return lines
+
+    # -----------------------------
+    # PIPELINE CONTROL: DATA INSPECTION
+    # -----------------------------
+    def inspect(self):
+        """Profile and validate the source files; raises RuntimeError on issues."""
+        from initial_inspectdata import load_quarantine, run_data_inspection
+
+        try:
+            with self.run_log.span("inspection") as span:
+                # Files are profiled in worker processes, so count their bytes directly
+                span.bytes_read = file_bytes(self.source_dir.glob("*.csv"))
+                issues = run_data_inspection(
+                    source_folder=self.source_dir,
+                    output_file=self.source_dir / "consolidated_inspection_report.txt",
+                    fail_on_issues=True,  # Stops ETL if issues are found
+                    sample_fraction=self.inspect_sample,
+                    quarantine_dir=self.quarantine_dir,
+                )
+        except RuntimeError as e:
+            print("ETL aborted due to data quality issues.")
+            raise e
+
+        # Rows quarantined by the inspection are left out of every table below
+        self.quarantined = load_quarantine(self.quarantine_dir)
+        for table_name, rows in self.quarantined.items():
+            print(f"Skipping {len(rows)} quarantined rows of {table_name}")
+        return issues
+
+    # -----------------------------
+    # EXTRACT
+    # -----------------------------
+    def extract(self):
+        """Open the orders past the watermark as a lazy stream of chunks."""
+        from fact_stream import DEFAULT_CHUNKSIZE
+        from incremental import load_watermark, read_new_orders, source_rewritten
+        from initial_inspectdata import drop_quarantined
+
+        orders_path = self.source_dir / "shopify_orders.csv"
+        # Without a saved watermark an incremental run falls back to a full load
+        self.watermark = load_watermark(self.staging_dir) if self.incremental else None
+        if self.watermark is not None and source_rewritten(orders_path, self.watermark):
+            print("shopify_orders.csv was rewritten since the last run, not appended to; running a full load")
+            self.watermark = None
+        self.chunksize = self.chunksize or DEFAULT_CHUNKSIZE
+
+        # The order index replaces the order_id cursor: late orders with lower
+        # ids still load, re-delivered ones are dropped
+        self.order_index = self._open_order_index() if self.dedup else None
+        order_chunks, self.orders_offset = read_new_orders(
+            orders_path,
+            self.watermark,
+            chunksize=self.chunksize,
+            by_order_id=self.order_index is None,
+        )
+        self.order_chunks = (
+            drop_quarantined(chunk, "shopify_orders", self.quarantined) for chunk in order_chunks
+        )
+        if self.order_index is not None:
+            self.order_chunks = (self._drop_seen(chunk) for chunk in self.order_chunks)
+
+        if self.watermark is not None and self.order_index is not None:
+            print(f"Incremental run: loading orders not in the order index ({len(self.order_index)} orders)")
+        elif self.watermark is not None:
+            print(f"Incremental run: loading orders past order_id {self.watermark['order_id']}")
+
+    def extract_batch(self, orders, end_offset):
+        """
+        Load an already-read batch of appended orders instead of re-reading
+        the export (watch mode); end_offset is where the batch ends in
+        shopify_orders.csv and becomes the new watermark offset.
+        """
+        from fact_stream import DEFAULT_CHUNKSIZE
+        from incremental import load_watermark
+
+        self.watermark = load_watermark(self.staging_dir)
+        self.chunksize = self.chunksize or DEFAULT_CHUNKSIZE
+        if self.dedup:
+            self.order_index = self.order_index or self._open_order_index()
+            orders = self._drop_seen(orders)
+        elif self.watermark is not None:
+            orders = orders[orders["order_id"] > self.watermark["order_id"]]
+        self.order_chunks = [orders] if len(orders) else []
+        self.orders_offset = end_offset
+
+    def _open_order_index(self):
+        from dedup_index import DEDUP_DIR, OrderIndex
+        from staging_io import detect_format, read_staging
+
+        # A full run reloads every order, so it starts a fresh index
+        index = OrderIndex(self.staging_dir / DEDUP_DIR, reset=self.watermark is None)
+        if self.watermark is not None and not index.exists and detect_format(self.staging_dir, "fact_orders"):
+            print("Building the order index from the staged fact_orders...")
+            index.seed(read_staging(self.staging_dir, "fact_orders", columns=["order_id"])["order_id"])
+        return index
+
+    def _drop_seen(self, orders):
+        """Drop orders loaded before; conflicting re-deliveries are written to dedup/conflicts.csv."""
+        from dedup_index import record_conflicts
+
+        new, redelivered, conflicts = self.order_index.split(orders)
+        if len(redelivered):
+            print(f"Dropped {len(redelivered)} orders that were already loaded")
+        if len(conflicts):
+            record_conflicts(self.order_index.index_dir, conflicts)
+            print(
+                f"Dropped {len(conflicts)} orders reusing a loaded order_id with different values "
+                f"(see {self.order_index.index_dir})"
+            )
+        return new
+
+    def _load_source(self, name):
+        import pandas as pd
+        from initial_inspectdata import drop_quarantined
+
+        path = self.source_paths.get(name, self.source_dir / f"{name}.csv")
+        return drop_quarantined(pd.read_csv(path), name, self.quarantined)
+
+    # -----------------------------
+    # TRANSFORM: DIMENSIONS, BRIDGE, RECIPE MATRIX
+    # -----------------------------
+    def transform(self):
+        """Build the dimension tables and the recipe cost matrix."""
+        from costing import RecipeCostMatrix
+        from stage_cache import StageCache, run_stages
+        from transforms import DIMENSION_STAGES, RECIPE_STAGES
+
+        # Stages whose input files are unchanged since the last run are loaded
+        # from the stage cache instead of being recomputed
+        stage_cache = StageCache(
+            self.staging_dir / CACHE_DIR,
+            max_bytes=self.cache_max_mb * 1024 * 1024,
+            rebuild=self.rebuild,
+        )
+        with self.run_log.span("transform") as span:
+            run = partial(
+                run_stages,
+                source_dir=self.source_dir,
+                load_source=self._load_source,
+                cache=stage_cache,
+                quarantine_dir=self.quarantine_dir,
+                source_paths=self.source_paths,
+            )
+            # Today's dimension rows become new versions where they changed;
+            # the recipes are compiled against the versions
+            snapshots = run(DIMENSION_STAGES)
+            stage_outputs = run(RECIPE_STAGES, inputs=self._versioned(snapshots))
+            for table_name in ["dim_product", "dim_ingredient", "bridge_product_ingredient"]:
+                self.tables[table_name] = stage_outputs[table_name]
+
+            # Per-order ingredient cost = quantity x (product recipe + add-on recipe)
+            self.cost_matrix = RecipeCostMatrix(stage_outputs["recipe_grams"], self.tables["dim_ingredient"])
+            span.rows_out = sum(len(df) for df in self.tables.values())
+        return self.tables
+
+    def _versioned(self, snapshots):
+        """Merge the dimension snapshots into their version history in staging (see scd.py)."""
+        from scd import VERSIONED_TABLES, apply_versions
+        from staging_io import detect_format, read_staging
+
+        versions = {}
+        for table_name in VERSIONED_TABLES:
+            if table_name in self.shared_tables:
+                # Versioned and loaded by the multi-location runner
+                versions[table_name] = read_staging(self.shared_tables[table_name], table_name)
+                continue
+            history = None
+            if detect_format(self.staging_dir, table_name):
+                history = self._untag_location(table_name, read_staging(self.staging_dir, table_name))
+            versions[table_name], self.new_versions[table_name] = apply_versions(
+                table_name, snapshots[table_name], history, self.effective_date
+            )
+        return versions
+
+    # -----------------------------
+    # LOAD
+    # -----------------------------
+    def load(self):
+        """
+        Write the dimensions to staging and the warehouse, then stream
+        dim_date and fact_orders (transformed chunk by chunk) into both.
+        Returns the streaming summary.
+        """
+        from fact_stream import StagingChunkWriter, stream_fact_orders
+        from incremental import loaded_date_keys
+        from parallel_load import max_writers, partitioned_transaction, run_dag
+        from rollups import RollupAccumulator
+        from staging_io import write_staging
+
+        if self.order_chunks is None:
+            self.extract()
+        if self.cost_matrix is None:
+            self.transform()
+
+        dimensions = {
+            table_name: self._tag_location(table_name, df)
+            for table_name, df in self.tables.items()
+            if table_name not in self.shared_tables
+        }
+        # Only transform() builds new tables; later watch batches reuse them,
+        # as any change to their sources starts a new pipeline
+        unstaged = [t for t in dimensions if self.staged_tables.get(t) is not self.tables[t]]
+        with self.run_log.span("staging_dimensions") as span:
+            for table_name in unstaged:
+                write_staging(dimensions[table_name], self.staging_dir, table_name, fmt=self.staging_format)
+                self.staged_tables[table_name] = self.tables[table_name]
+            span.rows_in = span.rows_out = sum(len(dimensions[t]) for t in unstaged)
+
+        # Dimensions load concurrently, the bridge once dim_product and
+        # dim_ingredient are in. dim_date and fact_orders are streamed chunk
+        # by chunk further down.
+        load_order = [t for t in ["dim_product", "dim_ingredient", "bridge_product_ingredient"] if t in dimensions]
+
+        # Product, ingredient and bridge rows are already in the warehouse after the
+        # first run; incremental runs only add new dates and new orders, and the
+        # versions a changed product or ingredient opened or closed.
+        # Full runs with --loader upsert can be repeated safely: unchanged rows are skipped.
+        new_versions = {}
+        if self.watermark is not None:
+            load_order = []
+            new_versions = {
+                table_name: self._tag_location(table_name, df)
+                for table_name, df in self.new_versions.items()
+                if len(df) and table_name in dimensions
+            }
+
+        print("\nStarting MySQL load...")
+
+        def load_table(table_name):
+            df = dimensions[table_name]
+            print(f"Loading {table_name} ({len(df)} rows) into MySQL...")
+            self.loader.load(table_name, df)
+            print(f"{table_name} loaded successfully!")
+
+        # Each table is loaded in a single transaction
+        with self.run_log.span("load_dimensions") as span:
+            run_dag(
+                {table_name: partial(load_table, table_name) for table_name in load_order},
+                workers=max_writers(self.loader.engine, self.load_workers),
+            )
+            span.rows_in = span.rows_out = sum(len(dimensions[table_name]) for table_name in load_order)
+            if new_versions:
+                self._load_new_versions(new_versions, dimensions["bridge_product_ingredient"])
+                span.rows_out += sum(len(df) for df in new_versions.values())
+
+        # -----------------------------
+        # TRANSFORM + LOAD: DIM_DATE / FACT_ORDERS (STREAMED)
+        # -----------------------------
+        staging_writer = StagingChunkWriter(
+            self.staging_dir, append=self.watermark is not None, fmt=self.staging_format
+        )
+
+        print(f"Streaming dim_date and fact_orders in chunks of {self.chunksize} orders...")
+
+        # Chunks are spread over parallel connections by date_key range and
+        # committed together, so a failed run leaves no partial batch behind
+        # in the warehouse
+        load_transaction = partitioned_transaction(self.loader, self.load_workers)
+        rollup_sums = RollupAccumulator()
+        if self.known_date_keys is None:
+            self.known_date_keys = loaded_date_keys(self.staging_dir, self.watermark)
+        new_date_keys = set()
+        with self.run_log.span("fact_orders") as span, load_transaction as load_chunk:
+            span.rows_in = 0
+
+            def counted(chunks):
+                for chunk in chunks:
+                    span.rows_in += len(chunk)
+                    yield chunk
+
+            # The rest of the span's time is the extract and transform of the chunks
+            def write_chunk(table_name, df):
+                if table_name == "dim_date":
+                    new_date_keys.update(df["date_key"])
+                df = self._tag_location(table_name, df)
+                if table_name == "fact_orders":
+                    with span.timed("rollup_sums"):
+                        rollup_sums.add(df)
+                with span.timed("staging_write"):
+                    staging_writer.write(table_name, df)
+                with span.timed("load"):
+                    load_chunk(table_name, df)
+
+            summary = stream_fact_orders(
+                counted(self.order_chunks),
+                self.tables["dim_product"],
+                self.cost_matrix,
+                write_chunk,
+                known_date_keys=self.known_date_keys,
+            )
+            span.rows_out = summary["fact_rows"]
+        # Committed now, so later batches need not stage them again
+        self.known_date_keys |= new_date_keys
+
+        print(f"dim_date loaded successfully! ({summary['date_rows']} new rows)")
+        print(f"fact_orders loaded successfully! ({summary['fact_rows']} rows)")
+
+        print("All staging tables have been loaded into MySQL!")
+
+        daily = self._update_rollups(rollup_sums)
+        self._record_kpi_changes(daily)
+        # In the warehouse now; later watch batches don't load them again
+        self.new_versions = {}
+        self._advance_watermark(summary)
+        return summary
+
+    def _load_new_versions(self, new_versions, bridge):
+        """Merge the changed versions into the warehouse, then rewrite the bridge that points at them."""
+        from bulk_loader import get_loader
+
+        # Merged on (business key, valid_from): closed versions get their
+        # valid_to, new versions are inserted, facts keep their references
+        upsert = get_loader("upsert", self.loader.engine, batch_size=self.batch_size)
+        for table_name, df in new_versions.items():
+            print(f"Loading {len(df)} new or closed {table_name} versions into MySQL...")
+            upsert.load(table_name, df)
+        # New product versions bring their own bridge rows; the bridge is small
+        self.loader.replace_rows("bridge_product_ingredient", bridge, "product_key")
+
+    def _tag_location(self, table_name, df):
+        if self.location_key is None:
+            return df
+        from multi_location import tag_location
+
+        return tag_location(table_name, df, self.location_key)
+
+    def _untag_location(self, table_name, df):
+        if self.location_key is None:
+            return df
+        from multi_location import untag_location
+
+        return untag_location(table_name, df, self.location_key)
+
+    # -----------------------------
+    # KPI ROLLUPS
+    # -----------------------------
+    def _update_rollups(self, rollup_sums):
+        """
+        Add this run's daily sums to the KPI rollups; only the date buckets
+        that received new orders are rewritten in the warehouse. Returns the
+        daily sums that were added.
+        """
+        from rollups import ROLLUP_TABLES, daily_sums, merge_rollup, rollup_deltas
+        from staging_io import detect_format, read_staging, write_staging
+
+        with self.run_log.span("rollups") as span:
+            daily = rollup_sums.daily()
+            incremental = self.watermark is not None
+            missing = [t for t in ROLLUP_TABLES if detect_format(self.staging_dir, t) is None]
+            if incremental and missing:
+                # Rollups are new to this staging area: build them once from the staged facts
+                print(f"Building {', '.join(missing)} from staged fact_orders...")
+                daily = daily_sums(read_staging(
+                    self.staging_dir,
+                    "fact_orders",
+                    columns=["product_key", "date_key", "quantity", "total_price", "ingredient_cost", "gross_margin"],
+                ))
+                incremental = False
+            if daily.empty:
+                print("No new orders; KPI rollups unchanged.")
+                return daily
+
+            span.rows_in, span.rows_out = len(daily), 0
+            # Other locations' rows of the same buckets are left alone
+            scope = {"location_key": self.location_key} if self.location_key is not None else None
+            for table_name, delta in rollup_deltas(daily).items():
+                existing = read_staging(self.staging_dir, table_name) if incremental else None
+                rollup, changed = merge_rollup(existing, delta)
+                if scope:
+                    rollup, changed = rollup.assign(**scope), changed.assign(**scope)
+                write_staging(rollup, self.staging_dir, table_name, fmt=self.staging_format)
+                self.loader.replace_rows(table_name, changed, "period_start_key", scope=scope)
+                span.rows_out += len(changed)
+                print(f"{table_name}: {changed['period_start_key'].nunique()} buckets updated ({len(rollup)} rows)")
+        return daily
+
+    def _record_kpi_changes(self, daily):
+        """Log the months this run changed, so kpi_service.py drops only the cached results over them."""
+        from kpi_service import record_changes
+
+        # A new product version renames the product in any cached result
+        full = self.watermark is None or len(self.new_versions.get("dim_product", ())) > 0
+        if full or len(daily):
+            record_changes(self.staging_dir, daily["period_start_key"], full=full)
+
+    # -----------------------------
+    # ADVANCE WATERMARK
+    # -----------------------------
+    def _advance_watermark(self, summary):
+        from incremental import save_watermark, source_digest
+
+        # Only saved after a successful load so a failed run is retried in full
+        if self.order_index is not None:
+            self.order_index.commit()
+        watermark = self.watermark
+        if summary["fact_rows"] == 0:
+            # Rows that were all dropped (re-deliveries) are still read: move
+            # past them so later runs don't read and drop them again
+            if watermark is None or watermark["source_offset"] == self.orders_offset:
+                print("No new orders to load; watermark unchanged.")
+                return
+            order_id, date = watermark["order_id"], watermark["date"]
+        else:
+            max_date_key = str(summary["max_date_key"])
+            max_date = f"{max_date_key[:4]}-{max_date_key[4:6]}-{max_date_key[6:]}"
+            order_id = max(summary["max_order_id"], watermark["order_id"] if watermark else 0)
+            date = max(max_date, watermark["date"] if watermark else "")
+        self.watermark = save_watermark(
+            self.staging_dir,
+            order_id=order_id,
+            date=date,
+            source_offset=self.orders_offset,
+            source_digest=source_digest(self.source_dir / "shopify_orders.csv", self.orders_offset),
+        )
+        print(f"Watermark advanced to order_id {self.watermark['order_id']} ({self.watermark['date']})")
+
+    # -----------------------------
+    # POST-LOAD VALIDATION
+    # -----------------------------
+    def validate(self, date_range=None):
+        """
+        Check the loaded warehouse in one pass, or only the facts of a
+        (first, last) date_key range; raises RuntimeError on violations.
+        """
+        import json
+
+        from warehouse_validation import format_report, validate_warehouse
+
+        with self.run_log.span("validation") as span:
+            report = validate_warehouse(self.loader.engine, date_range)
+            # The facts checked: all of fact_orders, or those of date_range
+            checked = report["metrics"].get("total_orders")
+            span.rows_in = int(checked) if checked is not None else None
+            span.rows_out = sum(check["violations"] for check in report["checks"])
+
+        report_path = self.run_log.log_dir / f"run-{self.run_log.run_id}-validation.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(format_report(report))
+        if not report["passed"]:
+            failed = [check["check"] for check in report["checks"] if not check["passed"]]
+            raise RuntimeError(f"Warehouse validation failed: {', '.join(failed)} (see {report_path})")
+        return report
+
+    # -----------------------------
+    # SCHEMA
+    # -----------------------------
+    def generate_schema(self):
+        """Write the MySQL schema for the current staging tables."""
+        from generate_schema_sql import generate_schema
+
+        return generate_schema(self.staging_dir, self.sql_dir)
+
+    def run(self, validate=True):
+        self.inspect()
+        self.extract()
+        self.transform()
+        summary = self.load()
+        if validate:
+            self.validate()
+        return summary
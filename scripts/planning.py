@@ -0,0 +1,189 @@
+"""
+Ingredient demand planning.
+
+Dozens ordered (history from fact_orders, or forecast scenarios) are
+pushed through the recipe matrix of costing.py to get grams of every
+ingredient per day, week or month. Orders are never walked one by one:
+dozens are summed per (scenario, period, product) with a bincount and the
+resulting (periods x products) matrix is multiplied by the (products x
+ingredients) grams matrix once. Add-ons count like the product they are.
+
+Grams are then rounded up to whole containers (container_grams of
+dim_ingredient) and grouped into a purchase plan per supplier.
+
+Forecasts are CSVs in the shape of shopify_orders.csv (date, sku,
+quantity and optionally add_on_sku and scenario), or are derived from the
+most recent history with one scenario per growth factor.
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from costing import RecipeCostMatrix, build_recipe_grams
+from rollups import period_start_key
+from scd import VERSIONED_TABLES, AsOfIndex, date_keys_of
+from staging_io import read_staging
+
+STAGING_DIR = Path(__file__).resolve().parent.parent / "staging-data"
+OUTPUT_DIR = STAGING_DIR / "planning"
+GRAINS = ["daily", "weekly", "monthly"]
+HISTORY = "history"
+
+FACT_COLUMNS = ["product_key", "add_on_key", "date_key", "quantity"]
+INGREDIENT_COLUMNS = ["ingredient_key", "ingredient", "supplier", "container_description", "container_grams", "cost_per_gram"]
+
+
+# --------------------------------------------------
+# DOZENS IN: HISTORY AND FORECASTS
+# --------------------------------------------------
+
+def read_forecast(path, dim_product):
+    """
+    Read a forecast CSV (date, sku, quantity[, add_on_sku][, scenario]) into
+    the fact_orders columns the planner works on. SKUs resolve to the
+    product version in effect on each date.
+    """
+    forecast = pd.read_csv(path)
+    index = AsOfIndex(dim_product, *VERSIONED_TABLES["dim_product"])
+    unknown = sorted(set(forecast["sku"]) - set(index.codes.index))
+    if unknown:
+        raise ValueError(f"Unknown SKUs in {path}: {', '.join(unknown)}")
+    add_on_skus = forecast["add_on_sku"] if "add_on_sku" in forecast else pd.Series(np.nan, index=forecast.index)
+    unknown_add_ons = add_on_skus.notna() & ~add_on_skus.isin(index.codes.index)
+    if unknown_add_ons.any():
+        print(
+            f"Dropped the add-ons of {unknown_add_ons.sum()} forecast rows with unknown SKUs: "
+            f"{', '.join(sorted(add_on_skus[unknown_add_ons].astype(str).unique()))}"
+        )
+    date_key = date_keys_of(pd.to_datetime(forecast["date"]))
+    return pd.DataFrame({
+        "scenario": forecast["scenario"].astype(str) if "scenario" in forecast else "forecast",
+        "product_key": index.lookup(forecast["sku"].map(index.codes), date_key),
+        "add_on_key": index.lookup(add_on_skus.map(index.codes), date_key),
+        "date_key": date_key,
+        "quantity": forecast["quantity"].to_numpy(dtype=float),
+    })
+
+
+def growth_forecast(history, days, growth_factors):
+    """
+    Repeat the last `days` days of history right after it, once per growth
+    factor (scenario "growth_1.1" scales every quantity by 1.1).
+    """
+    dates = pd.to_datetime(history["date_key"].astype(str), format="%Y%m%d")
+    recent = dates > dates.max() - pd.Timedelta(days=days)
+    shifted = date_keys_of(dates[recent] + pd.Timedelta(days=days))
+    base = history.loc[recent, ["product_key", "add_on_key", "quantity"]].assign(date_key=shifted)
+    return pd.concat(
+        [
+            base.assign(scenario=f"growth_{factor:g}", quantity=base["quantity"] * factor)
+            for factor in growth_factors
+        ],
+        ignore_index=True,
+    )
+
+
+# --------------------------------------------------
+# GRAMS AND CONTAINERS OUT
+# --------------------------------------------------
+
+def ingredient_demand(orders, cost_matrix, grain="daily"):
+    """
+    Grams of each ingredient per scenario and period for orders with
+    product_key, add_on_key, date_key, quantity and (optionally) scenario.
+    Returns a long DataFrame: scenario, period_start_key, ingredient_key, grams.
+    """
+    groups = pd.DataFrame({
+        "scenario": orders["scenario"].to_numpy() if "scenario" in orders else HISTORY,
+        "period_start_key": period_start_key(orders["date_key"].to_numpy(), grain).to_numpy(),
+    })
+    codes, uniques = pd.MultiIndex.from_frame(groups).factorize(sort=True)
+    grams = cost_matrix.grouped_grams(
+        codes, len(uniques), orders["product_key"], orders["add_on_key"], orders["quantity"]
+    )
+
+    demand = pd.DataFrame(grams, columns=cost_matrix.ingredient_keys)
+    demand = pd.concat([uniques.to_frame(index=False, name=list(groups.columns)), demand], axis=1)
+    demand = demand.melt(id_vars=["scenario", "period_start_key"], var_name="ingredient_key", value_name="grams")
+    return demand[demand["grams"] > 0].reset_index(drop=True)
+
+
+def purchase_plan(demand, dim_ingredient):
+    """
+    Whole containers to buy of each ingredient per scenario and period,
+    ordered by supplier, with what they cost.
+    """
+    plan = demand.merge(dim_ingredient[INGREDIENT_COLUMNS], on="ingredient_key")
+    # Round up, but don't let float noise turn exactly 2 containers into 3
+    plan["containers"] = np.ceil(plan["grams"] / plan["container_grams"] - 1e-9).astype(int)
+    plan["cost"] = (plan["containers"] * plan["container_grams"] * plan["cost_per_gram"]).round(2)
+    plan["grams"] = plan["grams"].round(1)
+    columns = [
+        "scenario", "period_start_key", "supplier", "ingredient_key", "ingredient",
+        "grams", "container_description", "containers", "cost",
+    ]
+    return plan[columns].sort_values(["scenario", "period_start_key", "supplier", "ingredient"]).reset_index(drop=True)
+
+
+def supplier_totals(plan):
+    """Containers and cost per scenario, period and supplier."""
+    totals = plan.groupby(["scenario", "period_start_key", "supplier"], as_index=False)[["containers", "cost"]].sum()
+    # Sums of rounded costs pick up float noise again
+    return totals.assign(cost=totals["cost"].round(2))
+
+
+# --------------------------------------------------
+# COMMAND LINE
+# --------------------------------------------------
+
+def load_planning_inputs(staging_dir):
+    """(fact_orders history, dim_product, dim_ingredient, recipe matrix) from the staging tables."""
+    dim_product = read_staging(staging_dir, "dim_product")
+    dim_ingredient = read_staging(staging_dir, "dim_ingredient")
+    bridge = read_staging(staging_dir, "bridge_product_ingredient")
+    history = read_staging(staging_dir, "fact_orders", columns=FACT_COLUMNS)
+    cost_matrix = RecipeCostMatrix(build_recipe_grams(bridge, dim_ingredient), dim_ingredient)
+    return history, dim_product, dim_ingredient, cost_matrix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan ingredient purchases from order history and forecasts")
+    parser.add_argument("--staging-dir", type=Path, default=STAGING_DIR)
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--grain", choices=GRAINS, default="weekly")
+    parser.add_argument("--forecast", type=Path, default=None,
+                        help="Forecast CSV: date, sku, quantity[, add_on_sku][, scenario]")
+    parser.add_argument("--forecast-days", type=int, default=28,
+                        help="Without --forecast, repeat this many days of recent history as the forecast")
+    parser.add_argument("--growth", type=float, nargs="+", default=[1.0],
+                        help="Growth factors of the derived forecast, one scenario each")
+    parser.add_argument("--no-history", action="store_true", help="Only plan the forecast scenarios")
+    args = parser.parse_args(argv)
+
+    history, dim_product, dim_ingredient, cost_matrix = load_planning_inputs(args.staging_dir)
+    if args.forecast is not None:
+        forecast = read_forecast(args.forecast, dim_product)
+    else:
+        forecast = growth_forecast(history, args.forecast_days, args.growth)
+    orders = forecast if args.no_history else pd.concat([history.assign(scenario=HISTORY), forecast], ignore_index=True)
+
+    demand = ingredient_demand(orders, cost_matrix, args.grain)
+    plan = purchase_plan(demand, dim_ingredient)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = {
+        f"ingredient_demand_{args.grain}.csv": demand,
+        f"purchase_plan_{args.grain}.csv": plan,
+        f"supplier_totals_{args.grain}.csv": supplier_totals(plan),
+    }
+    for file_name, df in outputs.items():
+        df.to_csv(args.output_dir / file_name, index=False)
+        print(f"{file_name}: {len(df):,} rows")
+    print(f"Planned {orders['scenario'].nunique()} scenario(s) from {len(orders):,} order rows into {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
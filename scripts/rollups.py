@@ -0,0 +1,113 @@
+"""
+Pre-aggregated KPI rollups of fact_orders for the dashboards.
+
+Revenue, ingredient cost, gross margin, orders and dozens are summed per
+product at daily, weekly (weeks start on Monday) and monthly grain. The
+sums are accumulated from the fact chunks while they stream, so the fact
+table is never re-scanned: on an incremental run the new orders' partial
+sums are added to the date buckets they fall in and only those buckets are
+rewritten. margin_pct is derived from the sums after merging.
+
+Rollups are keyed by product_key, i.e. per product version (see scd.py):
+a price change starts new rows under the new version's key rather than
+restating the old ones, and product_key stays unique across locations,
+where a SKU is not. Per-SKU figures group the rows by dim_product's
+product_sku, as kpi_service.py does.
+
+margin_pct is a percentage (42.5 means 42.5%) here, in the KPI service and
+in the post-load validation.
+"""
+
+import pandas as pd
+
+# Rollup table -> how a date_key maps to the first date_key of its bucket
+ROLLUP_TABLES = {
+    "kpi_daily_product": "daily",
+    "kpi_weekly_product": "weekly",
+    "kpi_monthly_product": "monthly",
+}
+ROLLUP_KEYS = ["period_start_key", "product_key"]
+MEASURES = ["orders", "dozens", "revenue", "ingredient_cost", "gross_margin"]
+ROLLUP_COLUMNS = ROLLUP_KEYS + MEASURES + ["margin_pct"]
+
+
+def period_start_key(date_keys, grain):
+    """Map YYYYMMDD date keys to the date key their daily/weekly/monthly bucket starts on."""
+    date_keys = pd.Series(date_keys)
+    if grain == "daily":
+        return date_keys
+    if grain == "monthly":
+        return date_keys // 100 * 100 + 1
+    if grain == "weekly":
+        dates = pd.to_datetime(date_keys.astype(str), format="%Y%m%d")
+        starts = dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+        return starts.dt.year * 10000 + starts.dt.month * 100 + starts.dt.day
+    raise ValueError(f"Unknown rollup grain '{grain}'")
+
+
+def _sum_by_bucket(df):
+    return df.groupby(ROLLUP_KEYS, as_index=False)[MEASURES].sum()
+
+
+def margin_pct(gross_margin, revenue):
+    """Gross margin as a percentage of revenue, rounded to 2 places; NaN without revenue."""
+    return (gross_margin / revenue.where(revenue != 0) * 100).round(2)
+
+
+def with_margin_pct(rollup):
+    return rollup.assign(margin_pct=margin_pct(rollup["gross_margin"], rollup["revenue"])).loc[:, ROLLUP_COLUMNS]
+
+
+def daily_sums(fact):
+    """Daily x product partial sums of a chunk of fact_orders rows."""
+    return _sum_by_bucket(pd.DataFrame({
+        "period_start_key": fact["date_key"],
+        "product_key": fact["product_key"],
+        "orders": 1,
+        "dozens": fact["quantity"],
+        "revenue": fact["total_price"],
+        "ingredient_cost": fact["ingredient_cost"],
+        "gross_margin": fact["gross_margin"],
+    }))
+
+
+class RollupAccumulator:
+    """Collects daily partial sums of streamed fact chunks."""
+
+    def __init__(self):
+        self._parts = []
+
+    def add(self, fact):
+        self._parts.append(daily_sums(fact))
+        # Keep memory flat: fold the partials together every so often
+        if len(self._parts) >= 32:
+            self._parts = [_sum_by_bucket(pd.concat(self._parts, ignore_index=True))]
+
+    def daily(self):
+        if not self._parts:
+            return pd.DataFrame(columns=ROLLUP_KEYS + MEASURES)
+        return _sum_by_bucket(pd.concat(self._parts, ignore_index=True))
+
+
+def rollup_deltas(daily):
+    """{rollup table: partial sums per bucket} from daily partial sums."""
+    deltas = {}
+    for table_name, grain in ROLLUP_TABLES.items():
+        bucketed = daily.assign(period_start_key=period_start_key(daily["period_start_key"], grain).to_numpy())
+        deltas[table_name] = _sum_by_bucket(bucketed)
+    return deltas
+
+
+def merge_rollup(existing, delta):
+    """
+    Add delta's sums to the buckets of existing they fall in. Returns
+    (full rollup, rows of the buckets that changed).
+    """
+    affected = delta["period_start_key"].unique()
+    if existing is None or existing.empty:
+        merged = delta
+    else:
+        existing = existing.loc[:, ROLLUP_KEYS + MEASURES]
+        merged = _sum_by_bucket(pd.concat([existing, delta], ignore_index=True))
+    merged = with_margin_pct(merged).sort_values(ROLLUP_KEYS).reset_index(drop=True)
+    return merged, merged[merged["period_start_key"].isin(affected)]
@@ -0,0 +1,189 @@
+"""
+Point-in-time (SCD type 2) versions of dim_product and dim_ingredient.
+
+Every run builds today's snapshot of a dimension from the source files and
+merges it into the version history kept in staging. A row whose attributes
+changed (a new price, a new supplier) is not updated in place: the version
+in effect is closed on the effective date and a new version with its own
+surrogate key starts on that date. Facts keep pointing at the version that
+was in effect on their order date, so a price change only affects orders
+from the effective date on.
+
+valid_from is inclusive and valid_to exclusive, both ISO dates. The first
+version of a row is valid from VALID_FROM_MIN, the open version until
+VALID_TO_MAX.
+
+AsOfIndex resolves (business key, date) pairs to versions by binary search
+over the versions sorted by business key and valid_from, so the fact build
+looks up whole chunks of orders with one np.searchsorted instead of a
+merge.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+VALID_FROM_MIN = "1900-01-01"
+VALID_TO_MAX = "9999-12-31"
+VERSION_COLUMNS = ["valid_from", "valid_to"]
+
+# table -> (business key, surrogate key)
+VERSIONED_TABLES = {
+    "dim_product": ("product_sku", "product_key"),
+    "dim_ingredient": ("ingredient", "ingredient_key"),
+}
+
+# YYYYMMDD keys are below this, so business code * DATE_KEY_SPAN + date_key
+# sorts by business key first and date second
+DATE_KEY_SPAN = 10 ** 8
+
+
+def date_keys_of(dates):
+    """YYYYMMDD integer keys of datetimes or of ISO date strings."""
+    dates = pd.Series(dates)
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(dtype=np.int64)
+    # Strings are not parsed, so VALID_TO_MAX (past pandas' last Timestamp) works too
+    return dates.astype(str).str.replace("-", "", regex=False).astype(np.int64).to_numpy()
+
+
+def current_versions(versions):
+    """The versions in effect now (all rows of an unversioned dimension)."""
+    if "valid_to" not in versions:
+        return versions
+    return versions[versions["valid_to"] == VALID_TO_MAX]
+
+
+# --------------------------------------------------
+# VERSION HISTORY
+# --------------------------------------------------
+
+def _differs(left, right):
+    if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+        return ~np.isclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), equal_nan=True)
+    return (left.astype(str) != right.astype(str)).to_numpy()
+
+
+def apply_versions(table_name, snapshot, history=None, effective_date=None):
+    """
+    Merge today's snapshot of a dimension into its version history.
+
+    Unchanged rows keep their version. Changed rows close their version on
+    effective_date (default today) and open a new one with the next free
+    surrogate key; a row changed again on the day its version started is
+    corrected in place. Rows new to the history start at VALID_FROM_MIN.
+    Rows that left the source keep their open version.
+
+    Returns (versions, changed): the full history and the versions that
+    were added or closed.
+    """
+    business_key, key_column = VERSIONED_TABLES[table_name]
+    columns = list(snapshot.columns) + VERSION_COLUMNS
+    if history is None or "valid_from" not in history:
+        versions = snapshot.assign(valid_from=VALID_FROM_MIN, valid_to=VALID_TO_MAX)
+        return versions, versions
+
+    effective_date = effective_date or date.today().isoformat()
+    history = history.loc[:, columns].reset_index(drop=True)
+    is_open = history["valid_to"] == VALID_TO_MAX
+    current = snapshot.set_index(business_key)
+    prior = history[is_open].set_index(business_key).reindex(current.index)
+
+    new = ~current.index.isin(history.loc[is_open, business_key])
+    attributes = [col for col in current.columns if col != key_column]
+    changed = ~new & np.logical_or.reduce(
+        [_differs(current[col], prior[col]) for col in attributes], initial=False
+    )
+    # A second change on the day a version started corrects that version
+    restated = changed & (prior["valid_from"] == effective_date).to_numpy()
+    superseded = changed & ~restated
+
+    history = history[~history[key_column].isin(prior.loc[restated, key_column])]
+    closing = history[business_key].isin(current.index[superseded]) & (history["valid_to"] == VALID_TO_MAX)
+    history.loc[closing, "valid_to"] = effective_date
+
+    keys = prior[key_column].to_numpy(dtype=float)
+    fresh = superseded | new
+    next_key = int(history[key_column].max()) + 1 if len(history) else 1
+    keys[fresh] = np.arange(next_key, next_key + fresh.sum())
+
+    added_rows = restated | fresh
+    added = snapshot[added_rows].assign(
+        **{key_column: keys[added_rows].astype(np.int64)},
+        valid_from=np.where(new, VALID_FROM_MIN, effective_date)[added_rows],
+        valid_to=VALID_TO_MAX,
+    )
+    versions = pd.concat([history, added.loc[:, columns]], ignore_index=True)
+    versions = versions.sort_values(key_column).reset_index(drop=True)
+
+    changed_keys = set(history.loc[closing, key_column]) | set(added[key_column])
+    if changed_keys:
+        print(f"{table_name}: {added_rows.sum()} new or corrected versions from {effective_date}")
+    return versions, versions[versions[key_column].isin(changed_keys)]
+
+
+# --------------------------------------------------
+# AS-OF LOOKUP
+# --------------------------------------------------
+
+class AsOfIndex:
+    """
+    The versions of a dimension sorted by (business key, valid_from), for
+    looking up the version in effect on a date. Unversioned dimensions are
+    one version per business key, valid at any date.
+    """
+
+    def __init__(self, versions, business_key, key_column):
+        codes, uniques = pd.factorize(versions[business_key])
+        # Business key -> code; lookups translate each distinct value once
+        self.codes = pd.Series(np.arange(len(uniques)), index=pd.Index(uniques))
+        valid_from = versions["valid_from"] if "valid_from" in versions else [VALID_FROM_MIN] * len(versions)
+        valid_to = versions["valid_to"] if "valid_to" in versions else [VALID_TO_MAX] * len(versions)
+
+        start = date_keys_of(valid_from)
+        order = np.lexsort((start, codes))
+        self._sorted = codes[order].astype(np.int64) * DATE_KEY_SPAN + start[order]
+        self._codes = codes[order]
+        self.valid_from = start[order]
+        self.valid_to = date_keys_of(valid_to)[order]
+        self.keys = versions[key_column].to_numpy()[order]
+
+    def positions(self, codes, date_keys):
+        """
+        Positions (into the sorted versions) of the versions of business key
+        codes in effect on date_keys; -1 where there is none.
+        """
+        # Codes of values missing from the index may come in as NaN
+        codes = np.nan_to_num(np.asarray(codes, dtype=float), nan=-1).astype(np.int64)
+        date_keys = np.asarray(date_keys, dtype=np.int64)
+        found = np.searchsorted(self._sorted, codes * DATE_KEY_SPAN + date_keys, side="right") - 1
+        safe = np.maximum(found, 0)
+        valid = (
+            (codes >= 0) & (found >= 0)
+            & (self._codes[safe] == codes) & (date_keys < self.valid_to[safe])
+        )
+        return np.where(valid, found, -1)
+
+    def lookup(self, codes, date_keys):
+        """Surrogate keys of the versions in effect; NaN where there is none."""
+        found = self.positions(codes, date_keys)
+        return np.where(found >= 0, self.keys[np.maximum(found, 0)], np.nan)
+
+
+def values_by_period(versions, table_name, value_column, keys):
+    """
+    value_column of the business key behind each of keys, in every period in
+    which none of the versions changes. Returns (period start date keys,
+    periods x keys array); missing values are 0.
+    """
+    business_key, key_column = VERSIONED_TABLES[table_name]
+    index = AsOfIndex(versions, business_key, key_column)
+    starts = np.unique(index.valid_from)
+
+    by_key = versions.set_index(key_column)
+    codes = index.codes.reindex(by_key[business_key].reindex(keys)).to_numpy(dtype=float)
+    found = index.positions(np.tile(codes, len(starts)), np.repeat(starts, len(codes)))
+    values = by_key[value_column].reindex(index.keys).to_numpy(dtype=float)
+    values = np.where(found >= 0, values[np.maximum(found, 0)], 0.0)
+    return starts, np.nan_to_num(values).reshape(len(starts), len(codes))
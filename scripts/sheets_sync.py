@@ -0,0 +1,311 @@
+"""
+Diff-based Google Sheets sync.
+
+For every tab a snapshot of what was last uploaded is kept locally: the
+header and one 64-bit hash per row. A sync hashes the current staging table,
+compares it row by row with the snapshot and only sends the rows that
+changed or were appended, as A1 ranges grouped into chunked batch_update
+calls (rows that disappeared are cleared). The first sync of a tab, or one
+whose columns changed, rewrites the tab in full.
+
+API calls are retried with exponential backoff on rate limits (429) and
+server errors, and tabs are synced concurrently. The engine only uses a
+handful of gspread methods, so FakeSpreadsheet below can stand in for a
+real spreadsheet in tests and dry runs.
+"""
+
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = ".sheets-snapshots"
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+DEFAULT_SYNC_WORKERS = 4
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# --------------------------------------------------
+# ROWS, HASHES AND DIFFS
+# --------------------------------------------------
+
+def column_letter(n):
+    """1 -> A, 27 -> AA."""
+    letters = ""
+    while n:
+        n, remainder = divmod(n - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def sheet_frame(df):
+    """The values as they are sent to Sheets: missing values become empty cells."""
+    # Parquet keeps dates as date objects; send them to Sheets as text
+    df = df.apply(lambda col: col.astype(str).where(col.notna(), "") if col.dtype == object else col)
+    return df.astype(object).where(df.notna(), "")
+
+
+def row_hashes(frame):
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+
+
+def changed_ranges(old_hashes, new_hashes):
+    """Return [start, end) row ranges of new_hashes that differ from old_hashes."""
+    common = min(len(old_hashes), len(new_hashes))
+    changed = np.zeros(len(new_hashes), dtype=bool)
+    changed[:common] = old_hashes[:common] != new_hashes[:common]
+    changed[common:] = True
+    # Turn the boolean mask into runs of consecutive changed rows
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], changed.astype(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def _tolist(rows):
+    return [[value.item() if hasattr(value, "item") else value for value in row] for row in rows]
+
+
+# --------------------------------------------------
+# SNAPSHOTS
+# --------------------------------------------------
+
+class SnapshotStore:
+    """Header and row hashes of the last successful upload of each tab."""
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    def load(self, tab):
+        header_path = self.snapshot_dir / f"{tab}.json"
+        hashes_path = self.snapshot_dir / f"{tab}.npy"
+        if not header_path.exists() or not hashes_path.exists():
+            return None, None
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        return header, np.load(hashes_path)
+
+    def save(self, tab, header, hashes):
+        # Hashes first, header last: a tab without a header snapshot is re-sent in full
+        tmp_path = self.snapshot_dir / f"{tab}.tmp.npy"
+        np.save(tmp_path, hashes)
+        os.replace(tmp_path, self.snapshot_dir / f"{tab}.npy")
+        tmp_path = self.snapshot_dir / f"{tab}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.snapshot_dir / f"{tab}.json")
+
+    def forget(self, tab):
+        for path in (self.snapshot_dir / f"{tab}.json", self.snapshot_dir / f"{tab}.npy"):
+            if path.exists():
+                path.unlink()
+
+
+# --------------------------------------------------
+# SYNC ENGINE
+# --------------------------------------------------
+
+def is_retryable(error):
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in RETRY_STATUS or isinstance(error, (ConnectionError, TimeoutError))
+
+
+class SheetSync:
+    def __init__(
+        self,
+        spreadsheet,
+        snapshot_dir,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+        workers=DEFAULT_SYNC_WORKERS,
+        sleep=time.sleep,
+    ):
+        self.spreadsheet = spreadsheet
+        self.snapshots = SnapshotStore(snapshot_dir)
+        self.chunk_rows = chunk_rows
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.workers = workers
+        self.sleep = sleep
+
+    def _call(self, func, *args, **kwargs):
+        """Call the Sheets API, backing off on quota and server errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.sleep(self.backoff_seconds * 2 ** attempt * (1 + random.random()))
+
+    def _worksheet(self, tab, n_rows, n_cols):
+        existing = {ws.title: ws for ws in self._call(self.spreadsheet.worksheets)}
+        if tab in existing:
+            return existing[tab], False
+        # Make sure rows and cols are integers slightly bigger than df size
+        worksheet = self._call(self.spreadsheet.add_worksheet, title=tab, rows=n_rows + 10, cols=n_cols + 5)
+        return worksheet, True
+
+    def sync_table(self, tab, df):
+        """Bring one tab in line with df; returns what was sent."""
+        frame = sheet_frame(df)
+        header = [str(col) for col in frame.columns]
+        hashes = row_hashes(frame)
+        worksheet, created = self._worksheet(tab, len(frame) + 1, len(header))
+
+        old_header, old_hashes = (None, None) if created else self.snapshots.load(tab)
+        full = old_header != header
+        if full:
+            old_hashes = np.array([], dtype=np.uint64)
+            if not created:
+                self._call(worksheet.clear)
+            ranges = [(0, len(frame))] if len(frame) else []
+        else:
+            ranges = changed_ranges(old_hashes, hashes)
+
+        # Header is row 1, so data row i lives on sheet row i + 2
+        if len(frame) + 1 > worksheet.row_count:
+            self._call(worksheet.add_rows, len(frame) + 1 - worksheet.row_count)
+        if len(header) > worksheet.col_count:
+            self._call(worksheet.add_cols, len(header) - worksheet.col_count)
+
+        last_col = column_letter(len(header))
+        updates = [{"range": f"A1:{last_col}1", "values": [header]}] if full else []
+        for start, end in ranges:
+            for chunk_start in range(start, end, self.chunk_rows):
+                chunk_end = min(chunk_start + self.chunk_rows, end)
+                updates.append({
+                    "range": f"A{chunk_start + 2}:{last_col}{chunk_end + 1}",
+                    "values": _tolist(frame.iloc[chunk_start:chunk_end].to_numpy()),
+                })
+
+        # Group the ranges into batch_update calls of at most chunk_rows rows
+        requests, batch, batch_rows = 0, [], 0
+        for update in updates:
+            if batch and batch_rows + len(update["values"]) > self.chunk_rows:
+                self._call(worksheet.batch_update, batch)
+                requests += 1
+                batch, batch_rows = [], 0
+            batch.append(update)
+            batch_rows += len(update["values"])
+        if batch:
+            self._call(worksheet.batch_update, batch)
+            requests += 1
+
+        removed = len(old_hashes) - len(hashes)
+        if removed > 0:
+            self._call(worksheet.batch_clear, [f"A{len(hashes) + 2}:{last_col}{len(old_hashes) + 1}"])
+            requests += 1
+
+        self.snapshots.save(tab, header, hashes)
+        return {
+            "mode": "full" if full else ("diff" if updates or removed > 0 else "unchanged"),
+            "rows_sent": sum(len(u["values"]) for u in updates) - (1 if full else 0),
+            "rows_cleared": max(removed, 0),
+            "requests": requests,
+        }
+
+    def sync(self, tables):
+        """
+        Sync {tab: DataFrame or zero-argument callable returning one}
+        concurrently; returns {tab: result}. A tab that fails part-way loses
+        its snapshot, so the next run rewrites it in full.
+        """
+        def run(tab, source):
+            try:
+                return self.sync_table(tab, source() if callable(source) else source)
+            except Exception:
+                self.snapshots.forget(tab)
+                raise
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            futures = {tab: pool.submit(run, tab, source) for tab, source in tables.items()}
+            return {tab: future.result() for tab, future in futures.items()}
+
+
+# --------------------------------------------------
+# LOCAL FAKE OF THE GSPREAD CLIENT
+# --------------------------------------------------
+
+A1_RANGE = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)(\d+)$")
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+class FakeWorksheet:
+    """In-memory worksheet implementing the calls SheetSync makes."""
+
+    def __init__(self, title, rows, cols):
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.cells = {}
+        self.calls = []
+
+    def clear(self):
+        self.calls.append(("clear",))
+        self.cells = {}
+
+    def add_rows(self, rows):
+        self.calls.append(("add_rows", rows))
+        self.row_count += rows
+
+    def add_cols(self, cols):
+        self.calls.append(("add_cols", cols))
+        self.col_count += cols
+
+    def _cells_of(self, a1_range):
+        first_col, first_row, last_col, last_row = A1_RANGE.match(a1_range).groups()
+        if int(last_row) > self.row_count:
+            raise ValueError(f"Range {a1_range} exceeds grid limits ({self.row_count} rows)")
+        return (
+            int(first_row), int(last_row), _column_number(first_col), _column_number(last_col)
+        )
+
+    def batch_update(self, data):
+        self.calls.append(("batch_update", [update["range"] for update in data]))
+        for update in data:
+            first_row, _, first_col, _ = self._cells_of(update["range"])
+            for r, row in enumerate(update["values"]):
+                for c, value in enumerate(row):
+                    self.cells[(first_row + r, first_col + c)] = value
+
+    def batch_clear(self, ranges):
+        self.calls.append(("batch_clear", ranges))
+        for a1_range in ranges:
+            first_row, last_row, first_col, last_col = self._cells_of(a1_range)
+            for r in range(first_row, last_row + 1):
+                for c in range(first_col, last_col + 1):
+                    self.cells.pop((r, c), None)
+
+    def get_all_values(self):
+        if not self.cells:
+            return []
+        n_rows = max(r for r, _ in self.cells)
+        n_cols = max(c for _, c in self.cells)
+        return [[self.cells.get((r, c), "") for c in range(1, n_cols + 1)] for r in range(1, n_rows + 1)]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.tabs = {}
+
+    def worksheets(self):
+        return list(self.tabs.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.tabs[title] = FakeWorksheet(title, rows, cols)
+        return self.tabs[title]
@@ -0,0 +1,169 @@
+"""
+On-disk cache for ETL transform stages.
+
+A stage's cache key is a hash of its name, the source code of its function
+and of every module it can reach (the stage's module and the sibling
+modules it imports, transitively, so editing a helper such as
+costing.unit_factor invalidates the stage), the bytes of every source file
+it reads (plus that file's quarantine list, if any) and the keys of the
+stages it depends on. Unchanged stages are loaded from staging-data/.cache/
+instead of being recomputed. The cache is bounded in size: the least
+recently used entries are evicted first.
+"""
+
+import ast
+import hashlib
+import inspect
+import os
+from functools import lru_cache
+from pathlib import Path
+
+CACHE_DIR = ".cache"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+class Stage:
+    """A named transform with declared inputs.
+
+    func is called with one keyword argument per source (a DataFrame of
+    source-data/<source>.csv) and per upstream stage (its output).
+    """
+
+    def __init__(self, name, func, sources=(), depends_on=()):
+        self.name = name
+        self.func = func
+        self.sources = list(sources)
+        self.depends_on = list(depends_on)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES, rebuild=False):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, stage_name, key):
+        return self.cache_dir / f"{stage_name}-{key[:16]}.pkl"
+
+    def get(self, stage_name, key):
+        path = self._path(stage_name, key)
+        if self.rebuild or not path.exists():
+            return None
+        # Touch on hit so eviction removes the least recently used entries
+        os.utime(path)
+        import pandas as pd
+        return pd.read_pickle(path)
+
+    def put(self, stage_name, key, df):
+        # Entries from older keys of this stage can never be hit again
+        for stale in self.cache_dir.glob(f"{stage_name}-*.pkl"):
+            stale.unlink()
+        df.to_pickle(self._path(stage_name, key))
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.cache_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        while entries and total > self.max_bytes:
+            oldest = entries.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink()
+
+
+@lru_cache(maxsize=None)
+def _local_imports(path):
+    """Sibling modules (paths) imported anywhere in the module at path, including inside functions."""
+    tree = ast.parse(Path(path).read_bytes())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    folder = Path(path).parent
+    return sorted(str(folder / f"{name}.py") for name in names if (folder / f"{name}.py").exists())
+
+
+@lru_cache(maxsize=None)
+def code_digest(module_path):
+    """Hash of the module at module_path and every sibling module it reaches through imports."""
+    seen, pending = set(), [str(Path(module_path).resolve())]
+    while pending:
+        path = pending.pop()
+        if path not in seen:
+            seen.add(path)
+            pending.extend(_local_imports(path))
+    digest = hashlib.sha256()
+    for path in sorted(seen):
+        digest.update(Path(path).name.encode())
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()
+
+
+def frame_digest(df):
+    import pandas as pd
+
+    digest = hashlib.sha256(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def run_stages(stages, source_dir, load_source, cache=None, quarantine_dir=None, source_paths=None, inputs=None):
+    """
+    Run stages in declaration order and return {stage name: output}.
+
+    load_source(name) reads a source table; it is only called for stages
+    that miss the cache, so fully cached runs never parse the source files.
+    source_paths ({name: path}) points sources that load_source reads from
+    elsewhere than source_dir at the file to key the cache on. inputs
+    ({name: DataFrame}) are tables built outside the stages, such as the
+    versioned dimensions; stages can depend on them and are keyed on their
+    content.
+    """
+    source_dir = Path(source_dir)
+    source_paths = source_paths or {}
+    outputs, keys, sources = dict(inputs or {}), {}, {}
+    for name, df in outputs.items():
+        keys[name] = frame_digest(df)
+
+    for stage in stages:
+        digest = hashlib.sha256(stage.name.encode())
+        digest.update(inspect.getsource(stage.func).encode())
+        digest.update(code_digest(inspect.getsourcefile(stage.func)).encode())
+        for source in stage.sources:
+            digest.update(file_digest(source_paths.get(source, source_dir / f"{source}.csv")).encode())
+            quarantine_file = Path(quarantine_dir) / f"{source}.csv" if quarantine_dir else None
+            if quarantine_file is not None and quarantine_file.exists():
+                digest.update(file_digest(quarantine_file).encode())
+        for upstream in stage.depends_on:
+            digest.update(keys[upstream].encode())
+        keys[stage.name] = key = digest.hexdigest()
+
+        cached = cache.get(stage.name, key) if cache is not None else None
+        if cached is not None:
+            print(f"{stage.name}: loaded from cache")
+            outputs[stage.name] = cached
+            continue
+
+        for source in stage.sources:
+            if source not in sources:
+                sources[source] = load_source(source)
+        kwargs = {source: sources[source] for source in stage.sources}
+        kwargs.update({upstream: outputs[upstream] for upstream in stage.depends_on})
+        outputs[stage.name] = stage.func(**kwargs)
+        print(f"{stage.name}: computed")
+
+        if cache is not None:
+            cache.put(stage.name, key, outputs[stage.name])
+
+    return outputs
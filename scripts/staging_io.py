@@ -0,0 +1,221 @@
+"""
+Read and write staging tables as CSV or Parquet.
+
+CSV tables live at staging-data/<table>.csv. Parquet tables are typed,
+zstd-compressed datasets under staging-data/parquet/<table>/, written one
+part file per chunk; fact_orders is partitioned into year=/month=
+directories. Readers pick whichever copy of a table was written last and
+read Parquet with column projection and memory-mapping, so downstream
+scripts never re-parse or re-infer CSV dtypes.
+
+Parquet support needs pyarrow (pip install pyarrow).
+"""
+
+import shutil
+import time
+from pathlib import Path
+
+STAGING_FORMATS = ("csv", "parquet")
+PARQUET_DIR = "parquet"
+PARQUET_COMPRESSION = "zstd"
+
+# Hive-style partition columns, derived from date_key when writing
+PARTITION_COLUMNS = {
+    "fact_orders": ["year", "month"],
+}
+
+# pandas' default float parser can be off by an ulp (0.0020833333333333333
+# comes back as 0.0020833333333333). Staged dimensions are read back as the
+# version history, so floats must survive the round trip for a rerun to
+# reproduce the same facts.
+CSV_READ_OPTIONS = {"float_precision": "round_trip"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "The parquet staging format needs pyarrow: pip install pyarrow"
+        ) from e
+    return pa, pq
+
+
+def csv_path(staging_dir, table_name):
+    return Path(staging_dir) / f"{table_name}.csv"
+
+
+def parquet_path(staging_dir, table_name):
+    return Path(staging_dir) / PARQUET_DIR / table_name
+
+
+# --------------------------------------------------
+# WRITE
+# --------------------------------------------------
+
+def write_staging(df, staging_dir, table_name, fmt="csv", append=False, part=None):
+    """
+    Write df as a staging table. With append=True the rows are added to the
+    existing table (a new part file for Parquet) instead of replacing it.
+    """
+    if fmt == "csv":
+        path = csv_path(staging_dir, table_name)
+        if append:
+            df.to_csv(path, mode="a", header=not path.exists(), index=False)
+        else:
+            df.to_csv(path, index=False)
+        return path
+
+    if fmt != "parquet":
+        raise ValueError(f"Unknown staging format '{fmt}'. Choose from: {', '.join(STAGING_FORMATS)}")
+
+    pa, pq = _pyarrow()
+    path = parquet_path(staging_dir, table_name)
+    if not append and path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    partition_cols = PARTITION_COLUMNS.get(table_name)
+    if partition_cols:
+        df = df.assign(year=df["date_key"] // 10000, month=df["date_key"] // 100 % 100)
+
+    # Part names must be unique across appends and runs
+    part = part if part is not None else 0
+    basename = f"part-{time.time_ns()}-{part:05d}-{{i}}.parquet"
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root_path=str(path),
+        partition_cols=partition_cols,
+        basename_template=basename,
+        compression=PARQUET_COMPRESSION,
+    )
+    return path
+
+
+# --------------------------------------------------
+# READ
+# --------------------------------------------------
+
+def detect_format(staging_dir, table_name):
+    """Return the format of the most recently written copy of a table, or None."""
+    candidates = []
+    path = csv_path(staging_dir, table_name)
+    if path.exists():
+        candidates.append((path.stat().st_mtime, "csv"))
+    path = parquet_path(staging_dir, table_name)
+    if path.exists() and any(path.rglob("*.parquet")):
+        newest = max(p.stat().st_mtime for p in path.rglob("*.parquet"))
+        candidates.append((newest, "parquet"))
+    return max(candidates)[1] if candidates else None
+
+
+def list_staging_tables(staging_dir):
+    """Return {table_name: format} for every staging table on disk."""
+    staging_dir = Path(staging_dir)
+    names = {p.stem for p in staging_dir.glob("*.csv")}
+    parquet_root = staging_dir / PARQUET_DIR
+    if parquet_root.exists():
+        names.update(p.name for p in parquet_root.iterdir() if p.is_dir())
+    return {name: detect_format(staging_dir, name) for name in sorted(names)}
+
+
+def read_staging(staging_dir, table_name, columns=None, fmt=None, filters=None):
+    """
+    Read a staging table, projecting to columns when given. filters (pyarrow
+    syntax, e.g. [("year", "=", 2024)]) prune Parquet partitions.
+    """
+    fmt = fmt or detect_format(staging_dir, table_name)
+    if fmt is None:
+        raise FileNotFoundError(f"No staging data found for {table_name} in {staging_dir}")
+
+    if fmt == "csv":
+        import pandas as pd
+        return pd.read_csv(csv_path(staging_dir, table_name), usecols=columns, **CSV_READ_OPTIONS)
+
+    _, pq = _pyarrow()
+    partition_cols = PARTITION_COLUMNS.get(table_name, [])
+    arrow_table = pq.read_table(
+        parquet_path(staging_dir, table_name),
+        columns=columns,
+        filters=filters,
+        memory_map=True,
+    )
+    df = arrow_table.to_pandas()
+    # Partition columns are a storage detail unless explicitly asked for
+    hidden = [col for col in partition_cols if col in df.columns and not (columns and col in columns)]
+    return df.drop(columns=hidden)
+
+
+# --------------------------------------------------
+# SAMPLED READS
+# --------------------------------------------------
+
+SAMPLE_BLOCKS = 8
+# CSVs up to this size are read whole instead of sampled
+SAMPLE_FULL_READ_BYTES = 4 * 1024 * 1024
+
+
+def sample_staging(staging_dir, table_name, max_rows, fmt=None):
+    """
+    Read at most max_rows rows of a staging table, spread over the whole
+    table: CSVs are sampled in blocks at evenly spaced byte offsets, Parquet
+    datasets from evenly spaced part files.
+    """
+    fmt = fmt or detect_format(staging_dir, table_name)
+    if fmt is None:
+        raise FileNotFoundError(f"No staging data found for {table_name} in {staging_dir}")
+
+    import pandas as pd
+
+    if fmt == "parquet":
+        _, pq = _pyarrow()
+        files = sorted(parquet_path(staging_dir, table_name).rglob("*.parquet"))
+        step = max(1, len(files) // SAMPLE_BLOCKS)
+        frames, rows = [], 0
+        for path in files[::step]:
+            frame = pq.read_table(path, memory_map=True).to_pandas()
+            frames.append(frame.head(max_rows // SAMPLE_BLOCKS or 1))
+            rows += len(frames[-1])
+            if rows >= max_rows:
+                break
+        return pd.concat(frames, ignore_index=True)
+
+    path = csv_path(staging_dir, table_name)
+    size = path.stat().st_size
+    if size <= SAMPLE_FULL_READ_BYTES:
+        return pd.read_csv(path, **CSV_READ_OPTIONS)
+
+    header = pd.read_csv(path, nrows=0).columns
+    block_rows = max(1, max_rows // SAMPLE_BLOCKS)
+    frames = []
+    with open(path, "rb") as f:
+        for block in range(SAMPLE_BLOCKS):
+            f.seek(size * block // SAMPLE_BLOCKS)
+            # Skip the header, or the partial line the offset landed in
+            f.readline()
+            frames.append(pd.read_csv(f, header=None, names=header, nrows=block_rows, **CSV_READ_OPTIONS))
+            if f.tell() >= size:
+                break
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def parquet_column_ranges(staging_dir, table_name):
+    """
+    Return {column: (min, max)} over a whole Parquet table from the row group
+    statistics in the file footers, without reading any data pages.
+    """
+    _, pq = _pyarrow()
+    ranges = {}
+    for path in parquet_path(staging_dir, table_name).rglob("*.parquet"):
+        metadata = pq.read_metadata(path)
+        for group in range(metadata.num_row_groups):
+            row_group = metadata.row_group(group)
+            for i in range(row_group.num_columns):
+                chunk = row_group.column(i)
+                stats = chunk.statistics
+                if stats is None or not stats.has_min_max:
+                    continue
+                low, high = ranges.get(chunk.path_in_schema, (stats.min, stats.max))
+                ranges[chunk.path_in_schema] = (min(low, stats.min), max(high, stats.max))
+    return ranges
@@ -0,0 +1,96 @@
+"""
+Dimension transforms of the ETL, declared as named stages.
+
+Each stage lists the source files it reads and the upstream stages it
+depends on, so stage_cache can key its output on the content of exactly
+those inputs. Only the orders file grows between runs; these stages
+depend on the small product, ingredient and recipe files.
+
+The dimension stages build today's snapshot of dim_product and
+dim_ingredient. The pipeline merges the snapshots into their version
+history (see scd.py) before the recipe stages run on the versions; each
+product version's recipe links to the ingredient versions in effect on the
+day that product version starts.
+"""
+
+import pandas as pd
+
+from costing import build_recipe_grams
+from scd import VALID_FROM_MIN, AsOfIndex, date_keys_of
+from stage_cache import Stage
+
+
+# -----------------------------
+# TRANSFORM: DIM_PRODUCT
+# -----------------------------
+def build_dim_product(shopify_products):
+    dim_product = (
+        shopify_products
+        .loc[:, ["cookie_sku", "product_name", "category", "price"]]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    dim_product["product_key"] = dim_product.index + 1
+    return dim_product.rename(columns={"cookie_sku": "product_sku"})
+
+
+# -----------------------------
+# TRANSFORM: DIM_INGREDIENT
+# -----------------------------
+def build_dim_ingredient(ingredients):
+    dim_ingredient = (
+        ingredients
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    dim_ingredient["ingredient_key"] = dim_ingredient.index + 1
+    dim_ingredient["cost_per_gram"] = (
+        dim_ingredient["cost_per_unit"] / dim_ingredient["grams_per_unit"]
+    )
+    return dim_ingredient
+
+
+# -----------------------------
+# TRANSFORM: BRIDGE_PRODUCT_INGREDIENT
+# -----------------------------
+def build_bridge_product_ingredient(recipes, dim_product, dim_ingredient):
+    # Every version of a product gets the recipe, made with the ingredient
+    # versions in effect on the day the product version starts; costing
+    # prices each ingredient at the version in effect on the order date
+    bridge = recipes.merge(dim_product, left_on="sku", right_on="product_sku", how="left")
+    if "valid_from" in bridge:
+        valid_from = bridge["valid_from"].fillna(VALID_FROM_MIN)
+    else:
+        valid_from = [VALID_FROM_MIN] * len(bridge)
+    index = AsOfIndex(dim_ingredient, "ingredient", "ingredient_key")
+    codes = index.codes.reindex(bridge["ingredient"]).to_numpy(dtype=float)
+    bridge["ingredient_key"] = pd.array(index.lookup(codes, date_keys_of(valid_from)), dtype="Int64")
+    return bridge.loc[:, [
+        "product_key",
+        "ingredient_key",
+        "quantity",
+        "quantity_unit"
+    ]]
+
+
+DIMENSION_STAGES = [
+    Stage("dim_product", build_dim_product, sources=["shopify_products"]),
+    Stage("dim_ingredient", build_dim_ingredient, sources=["ingredients"]),
+]
+
+RECIPE_STAGES = [
+    Stage(
+        "bridge_product_ingredient",
+        build_bridge_product_ingredient,
+        sources=["recipes"],
+        depends_on=["dim_product", "dim_ingredient"],
+    ),
+    # Grams of each ingredient per dozen; costing.RecipeCostMatrix prices it
+    Stage(
+        "recipe_grams",
+        build_recipe_grams,
+        depends_on=["bridge_product_ingredient", "dim_ingredient"],
+    ),
+]
+
+TRANSFORM_STAGES = DIMENSION_STAGES + RECIPE_STAGES
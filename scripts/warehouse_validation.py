@@ -0,0 +1,258 @@
+"""
+Post-load warehouse validation.
+
+Every rule of SQL/warehouse_validation.sql is evaluated by one aggregate
+query, so fact_orders is scanned once instead of once per check: each rule
+is a SUM(CASE ...) over the fact rows, and the dimension lookups are
+EXISTS subqueries on their primary keys, so a duplicated dimension row can
+never fan out the fact rows the metrics are computed over. The margin,
+price-per-dozen and KPI figures come out of the same pass. The bridge
+table, the dimension business keys and the KPI rollups are small and are
+checked with one more query each.
+
+With a date_key range, the fact rules and metrics only cover the facts of
+that range and only kpi_daily_product is compared with them (a weekly or
+monthly bucket can reach past the range). Watch mode checks each micro-batch
+this way and the whole warehouse every few hundred batches.
+
+The result is a report dict with the violation count of every rule; any
+violation fails the pipeline run. Only portable SQL is used, so the checks
+run the same against MySQL and a local SQLite stand-in.
+
+    python scripts/warehouse_validation.py --db-url sqlite:///bakery.db
+"""
+
+import argparse
+import json
+import sys
+
+from bulk_loader import business_key
+
+TABLES = ["dim_product", "dim_date", "dim_ingredient", "bridge_product_ingredient", "fact_orders"]
+
+# Allowed gap between gross_margin and total_price - ingredient_cost
+MARGIN_TOLERANCE = 0.01
+
+
+def _missing(table_name, column, value):
+    return f"NOT EXISTS (SELECT 1 FROM {table_name} WHERE {table_name}.{column} = {value})"
+
+
+# Rules over the fact rows: name -> (condition of a violating row, description)
+FACT_RULES = {
+    "orphan_product_keys": (
+        f"f.product_key IS NOT NULL AND {_missing('dim_product', 'product_key', 'f.product_key')}",
+        "product_key not in dim_product",
+    ),
+    "orphan_add_on_keys": (
+        f"f.add_on_key IS NOT NULL AND {_missing('dim_product', 'product_key', 'f.add_on_key')}",
+        "add_on_key not in dim_product",
+    ),
+    "orphan_date_keys": (
+        f"f.date_key IS NOT NULL AND {_missing('dim_date', 'date_key', 'f.date_key')}",
+        "date_key not in dim_date",
+    ),
+    "null_order_id": ("f.order_id IS NULL", "order_id is NULL"),
+    "null_product_key": ("f.product_key IS NULL", "product_key is NULL"),
+    "null_date_key": ("f.date_key IS NULL", "date_key is NULL"),
+    "invalid_rows": (
+        "f.total_price < 0 OR f.ingredient_cost < 0 OR f.quantity <= 0",
+        "negative price or cost, or quantity <= 0",
+    ),
+    "margin_mismatch_rows": (
+        f"ABS(f.gross_margin - (f.total_price - f.ingredient_cost)) > {MARGIN_TOLERANCE}",
+        "gross_margin != total_price - ingredient_cost",
+    ),
+    "cost_exceeds_revenue": ("f.ingredient_cost > f.total_price", "ingredient_cost > total_price"),
+}
+
+# Figures reported alongside the rules: name -> aggregate expression
+FACT_METRICS = {
+    "total_orders": "COUNT(*)",
+    "total_revenue": "SUM(f.total_price)",
+    "total_ingredient_cost": "SUM(f.ingredient_cost)",
+    "total_gross_margin": "SUM(f.gross_margin)",
+    "min_gross_margin": "MIN(f.gross_margin)",
+    "max_gross_margin": "MAX(f.gross_margin)",
+    "avg_gross_margin": "AVG(f.gross_margin)",
+    # A percentage, like margin_pct of the rollups and the KPI service
+    "avg_margin_pct": "AVG(100.0 * f.gross_margin / NULLIF(f.total_price, 0))",
+    "min_price_per_unit": "MIN(f.total_price / NULLIF(f.quantity, 0))",
+    "max_price_per_unit": "MAX(f.total_price / NULLIF(f.quantity, 0))",
+}
+
+BRIDGE_RULES = {
+    "orphan_bridge_product_keys": (
+        _missing("dim_product", "product_key", "b.product_key"),
+        "bridge product_key not in dim_product",
+    ),
+    "orphan_bridge_ingredient_keys": (
+        _missing("dim_ingredient", "ingredient_key", "b.ingredient_key"),
+        "bridge ingredient_key not in dim_ingredient",
+    ),
+}
+
+# Dimensions checked for repeated business keys (the upsert loader's keys:
+# one row per version, per location when tagged; valid_from is left out of
+# an unversioned table). A repeated key is reported as its surplus rows
+KEYED_DIMENSIONS = ["dim_product", "dim_ingredient", "dim_date"]
+
+# The rollups must add up to the fact table they summarize
+ROLLUP_TABLES = ["kpi_daily_product", "kpi_weekly_product", "kpi_monthly_product"]
+ROLLUP_TOTALS = {"orders": "total_orders", "revenue": "total_revenue", "gross_margin": "total_gross_margin"}
+
+
+# --------------------------------------------------
+# QUERIES
+# --------------------------------------------------
+
+def _violations(rules):
+    return ",\n    ".join(f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END) AS {name}" for name, (condition, _) in rules.items())
+
+
+# Bind parameters of a date_key range
+DATE_RANGE = "BETWEEN :first_date_key AND :last_date_key"
+
+
+def fact_validation_sql(date_range=False):
+    """The single pass over fact_orders: every rule and metric in one SELECT."""
+    metrics = ",\n    ".join(f"{expression} AS {name}" for name, expression in FACT_METRICS.items())
+    where = f"\nWHERE f.date_key {DATE_RANGE}" if date_range else ""
+    return f"""
+SELECT
+    {_violations(FACT_RULES)},
+    {metrics}
+FROM fact_orders f{where}
+""".strip()
+
+
+def bridge_validation_sql():
+    return f"""
+SELECT
+    {_violations(BRIDGE_RULES)}
+FROM bridge_product_ingredient b
+""".strip()
+
+
+def duplicate_keys_sql(keys):
+    """Surplus rows per repeated business key, one column per dimension."""
+    counts = [
+        f"(SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM {table_name} "
+        f"GROUP BY {', '.join(columns)} HAVING COUNT(*) > 1) dup) AS duplicate_{table_name}_keys"
+        for table_name, columns in keys.items()
+    ]
+    return "SELECT\n    " + ",\n    ".join(counts)
+
+
+def row_counts_sql(tables):
+    return "SELECT\n    " + ",\n    ".join(f"(SELECT COUNT(*) FROM {t}) AS {t}" for t in tables)
+
+
+def rollup_totals_sql(table_name, date_range=False):
+    where = f" WHERE period_start_key {DATE_RANGE}" if date_range else ""
+    return "SELECT " + ", ".join(f"SUM({col}) AS {col}" for col in ROLLUP_TOTALS) + f" FROM {table_name}{where}"
+
+
+# --------------------------------------------------
+# REPORT
+# --------------------------------------------------
+
+def _check(name, violations, description):
+    violations = int(violations or 0)
+    return {"check": name, "violations": violations, "passed": violations == 0, "description": description}
+
+
+def validate_warehouse(engine, date_range=None):
+    """
+    Run every check against the warehouse behind engine; returns
+    {"passed", "row_counts", "checks": [...], "metrics": {...}}.
+    date_range=(first, last) date_key limits the fact checks to that range.
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    missing = [t for t in TABLES if t not in existing]
+    checks = [_check("missing_tables", len(missing), f"missing: {', '.join(missing)}" if missing else "all tables exist")]
+    if missing:
+        return {"passed": False, "date_range": None, "row_counts": {}, "checks": checks, "metrics": {}}
+
+    dimension_keys = {}
+    for table_name in KEYED_DIMENSIONS:
+        present = [column["name"] for column in inspector.get_columns(table_name)]
+        dimension_keys[table_name] = [column for column in business_key(table_name, present) if column in present]
+
+    params = {}
+    counted, rollup_tables = TABLES, ROLLUP_TABLES
+    if date_range is not None:
+        params = {"first_date_key": int(date_range[0]), "last_date_key": int(date_range[1])}
+        # Counting all of fact_orders would scan it after all
+        counted, rollup_tables = [t for t in TABLES if t != "fact_orders"], ROLLUP_TABLES[:1]
+
+    with engine.connect() as conn:
+        row_counts = dict(conn.execute(text(row_counts_sql(counted))).mappings().one())
+        fact = conn.execute(text(fact_validation_sql(bool(params))), params).mappings().one()
+        bridge = conn.execute(text(bridge_validation_sql())).mappings().one()
+        duplicates = conn.execute(text(duplicate_keys_sql(dimension_keys))).mappings().one()
+        rollups = {
+            t: conn.execute(text(rollup_totals_sql(t, bool(params))), params).mappings().one()
+            for t in rollup_tables if t in existing
+        }
+
+    checks += [_check(name, fact[name], description) for name, (_, description) in FACT_RULES.items()]
+    checks += [_check(name, bridge[name], description) for name, (_, description) in BRIDGE_RULES.items()]
+    checks += [
+        _check(f"duplicate_{table_name}_keys", duplicates[f"duplicate_{table_name}_keys"],
+               f"rows repeating a business key of {table_name} ({', '.join(columns)})")
+        for table_name, columns in dimension_keys.items()
+    ]
+    metrics = {name: (float(fact[name]) if fact[name] is not None else None) for name in FACT_METRICS}
+
+    for table_name, totals in rollups.items():
+        off = [
+            col for col, metric in ROLLUP_TOTALS.items()
+            if abs(float(totals[col] or 0) - float(metrics[metric] or 0)) > MARGIN_TOLERANCE * max(1, metrics["total_orders"])
+        ]
+        checks.append(_check(
+            f"{table_name}_totals", len(off),
+            f"totals differ from fact_orders: {', '.join(off)}" if off else "totals match fact_orders",
+        ))
+
+    return {
+        "passed": all(check["passed"] for check in checks),
+        "date_range": list(date_range) if date_range is not None else None,
+        "row_counts": row_counts,
+        "checks": checks,
+        "metrics": metrics,
+    }
+
+
+def format_report(report):
+    lines = [f"Warehouse validation: {'PASSED' if report['passed'] else 'FAILED'}"]
+    if report.get("date_range"):
+        first, last = report["date_range"]
+        lines[0] += f" (fact_orders dates {first} to {last})"
+    for table_name, count in report["row_counts"].items():
+        lines.append(f"  {table_name}: {count:,} rows")
+    for check in report["checks"]:
+        status = "ok  " if check["passed"] else "FAIL"
+        lines.append(f"  [{status}] {check['check']}: {check['violations']:,} ({check['description']})")
+    for name, value in report["metrics"].items():
+        if value is None:
+            lines.append(f"  {name}: -")
+        else:
+            lines.append(f"  {name}: {int(value):,}" if value == int(value) else f"  {name}: {value:,.4f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the loaded warehouse")
+    parser.add_argument("--db-url", required=True, help="SQLAlchemy URL of the warehouse")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    report = validate_warehouse(create_engine(args.db_url))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    sys.exit(0 if report["passed"] else 1)
@@ -0,0 +1,306 @@
+"""
+Watch mode: load new orders into the warehouse as they are exported.
+
+A producer thread polls source-data/ and waits until a burst of changes
+has settled (debounce). Rows appended to shopify_orders.csv are read from
+the byte offset reached so far, complete lines only, and cut into
+micro-batches of at most batch_rows orders. The batches go onto a bounded
+queue. When the loader falls behind, the queue fills up and the producer
+blocks, so unread rows wait in the export file instead of piling up in
+memory.
+
+The main thread takes one batch at a time, checks it against the order
+validation rules, then streams it through the fact transform and load of
+an incremental run. The dimension tables are staged once per pipeline, not
+per batch, and each batch's warehouse validation only covers the facts of
+its date range. The watermark advances per batch. A change to any
+other source file, or an export that was rewritten rather than appended,
+triggers one full run instead, after the batches ahead of it are done.
+
+pandas is only imported once watching starts, so etl.py can import the
+defaults below without it.
+"""
+
+import os
+import queue
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+ORDERS_FILE = "shopify_orders.csv"
+DEFAULT_DEBOUNCE_SECONDS = 1.0
+DEFAULT_POLL_SECONDS = 0.25
+DEFAULT_BATCH_ROWS = 50_000
+DEFAULT_MAX_PENDING = 4
+
+# A file that never stops changing is still picked up after this many debounce periods
+MAX_DEBOUNCE_PERIODS = 5
+READ_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Micro-batches between fresh run log files
+RUN_LOG_BATCHES = 500
+
+# Micro-batches between validations of the whole warehouse; the batches in
+# between only validate the facts of their own date range
+FULL_VALIDATION_BATCHES = 100
+
+# Queued in place of a batch when the pipeline has to be re-run in full
+FULL_RELOAD = "full-reload"
+
+
+# --------------------------------------------------
+# CHANGE DETECTION
+# --------------------------------------------------
+
+def snapshot(source_dir):
+    """{file name: (size, mtime)} of the source CSVs."""
+    files = {}
+    for path in Path(source_dir).glob("*.csv"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files[path.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class DebouncedWatcher:
+    """Polls a folder and reports the files changed once they stop changing."""
+
+    def __init__(self, source_dir, debounce_seconds=DEFAULT_DEBOUNCE_SECONDS,
+                 poll_seconds=DEFAULT_POLL_SECONDS, clock=time.monotonic):
+        self.source_dir = source_dir
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self._files = snapshot(source_dir)
+
+    def wait_for_changes(self, stop):
+        """Block until changes have settled; returns the changed names, or None once stop is set."""
+        pending, first_change, last_change = set(), None, None
+        while not stop.is_set():
+            files = snapshot(self.source_dir)
+            changed = {name for name in files.keys() | self._files.keys() if files.get(name) != self._files.get(name)}
+            now = self.clock()
+            if changed:
+                pending |= changed
+                self._files = files
+                first_change = first_change or now
+                last_change = now
+            elif pending and (
+                now - last_change >= self.debounce_seconds
+                or now - first_change >= self.debounce_seconds * MAX_DEBOUNCE_PERIODS
+            ):
+                return pending
+            stop.wait(self.poll_seconds)
+        return None
+
+
+# --------------------------------------------------
+# READING APPENDED ORDERS
+# --------------------------------------------------
+
+def read_appended_orders(orders_path, offset, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Yield (orders, end_offset) batches of the complete lines written after
+    byte offset. A trailing line still being written is left for later.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from incremental import ORDER_DTYPES
+
+    with open(orders_path, "rb") as f:
+        header = f.readline().decode("utf-8").strip().split(",")
+        offset = max(offset, f.tell())
+        while True:
+            f.seek(offset)
+            block = f.read(READ_BLOCK_BYTES)
+            block = block[:block.rfind(b"\n") + 1]
+            if not block:
+                return
+
+            # Batches are cut at line ends, so each one knows its exact end offset
+            line_ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n")) + 1
+            start = 0
+            for end in line_ends[batch_rows - 1::batch_rows].tolist() + [len(block)]:
+                if end > start and block[start:end].strip():
+                    orders = pd.read_csv(BytesIO(block[start:end]), header=None, names=header, dtype=ORDER_DTYPES)
+                    yield orders, offset + end
+                start = max(start, end)
+            offset += len(block)
+
+
+# --------------------------------------------------
+# PRODUCER / CONSUMER
+# --------------------------------------------------
+
+def inspect_batch(orders, products, quarantine_dir=None):
+    """
+    Check a batch against the order rules. Bad rows are appended to the
+    quarantine file and dropped, or fail the batch without quarantine.
+    """
+    from initial_inspectdata import validate_sources
+
+    violations = validate_sources({"shopify_orders": orders, "shopify_products": products})
+    if not violations:
+        return orders
+    messages = [f"{v['message']} ({v['count']} rows)" for v in violations]
+    if quarantine_dir is None:
+        raise RuntimeError("New orders failed inspection: " + "; ".join(messages))
+
+    failed = {}
+    for violation in violations:
+        for row in violation["rows"]:
+            failed.setdefault(row, []).append(violation["message"])
+    bad = orders.loc[list(failed)].copy()
+    bad["failed_rules"] = ["; ".join(rules) for rules in failed.values()]
+    os.makedirs(quarantine_dir, exist_ok=True)
+    path = Path(quarantine_dir) / ORDERS_FILE
+    bad.to_csv(path, mode="a", header=not path.exists(), index=False)
+    print(f"Quarantined {len(bad)} new orders: " + "; ".join(messages))
+    return orders.drop(index=bad.index)
+
+
+class OrderWatcher:
+    """
+    Runs the pipeline on new orders as they arrive. make_pipeline(incremental)
+    returns a configured Pipeline. Unless skip_validation is set, the
+    warehouse is validated after the catch-up run and every
+    FULL_VALIDATION_BATCHES micro-batches, and the batches in between
+    validate their own date range.
+    """
+
+    def __init__(
+        self,
+        make_pipeline,
+        debounce_seconds=DEFAULT_DEBOUNCE_SECONDS,
+        poll_seconds=DEFAULT_POLL_SECONDS,
+        batch_rows=DEFAULT_BATCH_ROWS,
+        max_pending=DEFAULT_MAX_PENDING,
+        skip_validation=False,
+    ):
+        self.make_pipeline = make_pipeline
+        self.skip_validation = skip_validation
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.batch_rows = batch_rows
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.stop = threading.Event()
+        self.reloaded = threading.Event()
+        self.error = None
+        self.pipeline = None
+        self.products = None
+        self.offset = 0
+        self.digest = None
+        self.batches = 0
+
+    def _start(self, incremental):
+        """Catch up with a regular run and remember where the export was read to."""
+        import pandas as pd
+
+        from incremental import load_watermark
+
+        self.pipeline = self.make_pipeline(incremental)
+        self.pipeline.staging_dir.mkdir(exist_ok=True)
+        self.pipeline.run(validate=not self.skip_validation)
+        self.products = pd.read_csv(self.pipeline.source_dir / "shopify_products.csv")
+        watermark = load_watermark(self.pipeline.staging_dir)
+        self.offset = watermark["source_offset"] if watermark else 0
+        self.digest = watermark.get("source_digest") if watermark else None
+
+    # -----------------------------
+    # PRODUCER THREAD
+    # -----------------------------
+    def _put(self, item):
+        # Blocks while the queue is full; that is the backpressure on reading
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=self.poll_seconds)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, watcher):
+        from incremental import source_digest, source_rewritten
+
+        orders_path = self.pipeline.source_dir / ORDERS_FILE
+        # First pick up whatever was appended while the catch-up run was loading
+        changed = {ORDERS_FILE}
+        try:
+            while changed is not None:
+                detected = time.monotonic()
+                rewritten = source_rewritten(orders_path, {"source_offset": self.offset, "source_digest": self.digest})
+                if changed - {ORDERS_FILE} or rewritten:
+                    print(f"\nSource files changed ({', '.join(sorted(changed))}); queueing a full run")
+                    self.reloaded.clear()
+                    self._put((FULL_RELOAD, None, detected))
+                    # The full run resets the offset; wait for it before reading on
+                    while not self.stop.is_set() and not self.reloaded.wait(self.poll_seconds):
+                        pass
+                else:
+                    for orders, end_offset in read_appended_orders(orders_path, self.offset, self.batch_rows):
+                        if not self._put((orders, end_offset, detected)):
+                            return
+                        self.offset = end_offset
+                        self.digest = source_digest(orders_path, end_offset)
+                changed = watcher.wait_for_changes(self.stop)
+        except Exception as e:
+            self.error = e
+            self.stop.set()
+
+    # -----------------------------
+    # CONSUMER (MAIN THREAD)
+    # -----------------------------
+    def _process(self, orders, end_offset, detected):
+        if orders is FULL_RELOAD:
+            self._start(incremental=False)
+            self.reloaded.set()
+            return
+
+        orders = inspect_batch(orders, self.products, self.pipeline.quarantine_dir)
+        self.batches += 1
+        if self.batches % RUN_LOG_BATCHES == 0:
+            self.pipeline.rotate_run_log()
+        self.pipeline.extract_batch(orders, end_offset)
+        summary = self.pipeline.load()
+        if not self.skip_validation:
+            if self.batches % FULL_VALIDATION_BATCHES == 0:
+                self.pipeline.validate()
+            elif summary["fact_rows"]:
+                self.pipeline.validate(date_range=(summary["min_date_key"], summary["max_date_key"]))
+        print(
+            f"Micro-batch {self.batches}: {summary['fact_rows']} orders loaded "
+            f"{time.monotonic() - detected:.2f}s after the change ({self.queue.qsize()} batches queued)"
+        )
+
+    def run(self, max_batches=None):
+        """Watch until interrupted (or until max_batches micro-batches were loaded)."""
+        self._start(incremental=True)
+        watcher = DebouncedWatcher(self.pipeline.source_dir, self.debounce_seconds, self.poll_seconds)
+        producer = threading.Thread(target=self._produce, args=(watcher,), name="order-watcher", daemon=True)
+        producer.start()
+        print(f"\nWatching {self.pipeline.source_dir} for new orders (Ctrl+C to stop)...")
+
+        try:
+            while not self.stop.is_set():
+                try:
+                    item = self.queue.get(timeout=self.poll_seconds)
+                except queue.Empty:
+                    continue
+                try:
+                    self._process(*item)
+                finally:
+                    self.queue.task_done()
+                if max_batches is not None and self.batches >= max_batches:
+                    break
+        except KeyboardInterrupt:
+            print("\nStopping watch mode.")
+        finally:
+            self.stop.set()
+            producer.join()
+
+        if self.error is not None:
+            raise self.error
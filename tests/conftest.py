@@ -0,0 +1,34 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# The scripts import each other as top-level modules
+sys.path.insert(0, str(REPO_DIR / "scripts"))
+
+SOURCE_FILES = ["shopify_orders.csv", "shopify_products.csv", "ingredients.csv", "recipes.csv"]
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    """A copy of the sample source files that tests may append to or rewrite."""
+    path = tmp_path / "source-data"
+    path.mkdir()
+    for name in SOURCE_FILES:
+        shutil.copy(REPO_DIR / "source-data" / name, path / name)
+    return path
+
+
+@pytest.fixture
+def pipeline_options(tmp_path, source_dir):
+    """Pipeline arguments for a run into a fresh staging dir and SQLite warehouse."""
+    return {
+        "source_dir": source_dir,
+        "staging_dir": tmp_path / "staging-data",
+        "sql_dir": tmp_path / "sql",
+        "db_url": f"sqlite:///{tmp_path / 'warehouse.db'}",
+        "effective_date": "2024-06-01",
+    }
@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from bulk_loader import get_loader
+
+LOADERS = ["multirow", "to_sql", "upsert"]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    yield engine
+    engine.dispose()
+
+
+def orders(order_ids, total_price=28.0):
+    return pd.DataFrame({
+        "order_id": order_ids,
+        "product_key": [1] * len(order_ids),
+        "date_key": [20240102] * len(order_ids),
+        "total_price": [total_price] * len(order_ids),
+    })
+
+
+def read_table(engine, table_name="fact_orders"):
+    return pd.read_sql(f"SELECT * FROM {table_name} ORDER BY order_id", engine)
+
+
+@pytest.mark.parametrize("name", LOADERS)
+def test_load_writes_every_row(engine, name):
+    df = orders(list(range(1, 2501)))
+    loader = get_loader(name, engine, batch_size=1000, verbose=False)
+    loader.load("fact_orders", df)
+
+    pd.testing.assert_frame_equal(read_table(engine), df)
+    assert loader.stats["fact_orders"][0] == len(df)
+
+
+@pytest.mark.parametrize("name", LOADERS)
+def test_failed_transaction_writes_nothing(engine, name):
+    loader = get_loader(name, engine, verbose=False)
+    loader.load("fact_orders", orders([1]))
+
+    with pytest.raises(RuntimeError):
+        with loader.transaction() as write:
+            write("fact_orders", orders([2, 3]))
+            raise RuntimeError("load failed")
+
+    assert read_table(engine)["order_id"].tolist() == [1]
+
+
+def test_upsert_rerun_changes_no_rows(engine, capsys):
+    df = orders([1, 2, 3])
+    get_loader("upsert", engine).load("fact_orders", df)
+    capsys.readouterr()
+
+    get_loader("upsert", engine).load("fact_orders", df)
+
+    assert "fact_orders: 0 new or changed rows merged" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(read_table(engine), df)
+
+
+def test_upsert_merges_new_and_changed_rows(engine, capsys):
+    loader = get_loader("upsert", engine)
+    loader.load("fact_orders", orders([1, 2]))
+    capsys.readouterr()
+
+    changed = pd.concat([orders([1]), orders([2, 3], total_price=32.0)], ignore_index=True)
+    loader.load("fact_orders", changed)
+
+    assert "fact_orders: 2 new or changed rows merged" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(read_table(engine), changed)
+
+
+def test_upsert_keeps_the_last_of_append_mode_duplicates(engine):
+    append = get_loader("multirow", engine, verbose=False)
+    append.load("fact_orders", orders([1, 2]))
+    append.load("fact_orders", orders([2], total_price=32.0))
+
+    get_loader("upsert", engine, verbose=False).load("fact_orders", orders([3]))
+
+    result = read_table(engine)
+    assert result["order_id"].tolist() == [1, 2, 3]
+    assert result["total_price"].tolist() == [28.0, 32.0, 28.0]
+
+
+def test_upsert_needs_a_business_key(engine):
+    with pytest.raises(ValueError, match="No business key"):
+        get_loader("upsert", engine, verbose=False).load("unknown_table", orders([1]))
+
+
+def test_replace_rows_rewrites_only_the_given_keys(engine):
+    loader = get_loader("multirow", engine, verbose=False)
+    loader.load("fact_orders", orders([1, 2, 3]))
+
+    loader.replace_rows("fact_orders", orders([2], total_price=40.0), "order_id")
+
+    assert read_table(engine)["total_price"].tolist() == [28.0, 40.0, 28.0]
+
+
+def test_unknown_loader():
+    with pytest.raises(ValueError, match="Unknown loader"):
+        get_loader("bcp", None)
+
+
+def test_mysql_merge_selects_from_a_derived_table():
+    from bulk_loader import _merge_sql
+
+    sql = _merge_sql("mysql", "fact_orders", "tmp_fact_orders", ["order_id", "total_price"])
+
+    assert sql.startswith("INSERT INTO fact_orders (order_id, total_price) SELECT * FROM (SELECT s.order_id")
+    assert sql.endswith(") AS src ON DUPLICATE KEY UPDATE total_price = VALUES(total_price)")
+    # Only the derived table is visible to the UPDATE clause
+    assert "LEFT JOIN fact_orders t" in sql.split(" AS src ")[0]
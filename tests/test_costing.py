@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from costing import RecipeCostMatrix, build_recipe_grams, unit_factor
+from transforms import build_bridge_product_ingredient, build_dim_ingredient, build_dim_product
+
+
+def sample_dimensions(source_dir):
+    products = build_dim_product(pd.read_csv(source_dir / "shopify_products.csv"))
+    ingredients = build_dim_ingredient(pd.read_csv(source_dir / "ingredients.csv"))
+    recipes = pd.read_csv(source_dir / "recipes.csv")
+    bridge = build_bridge_product_ingredient(recipes, products, ingredients)
+    return products, ingredients, recipes, bridge
+
+
+def baseline_cost_per_dozen(recipes, ingredients, sku):
+    """Cost of one dozen of sku, walking its recipe line by line."""
+    if pd.isna(sku):
+        return 0.0
+    cost = 0.0
+    for line in recipes[recipes["sku"] == sku].itertuples():
+        ingredient = ingredients[ingredients["ingredient"] == line.ingredient].iloc[0]
+        grams = line.quantity * unit_factor(line.quantity_unit, ingredient["unit"]) * ingredient["grams_per_unit"]
+        cost += grams * ingredient["cost_per_gram"]
+    return cost
+
+
+def test_unit_factor():
+    assert unit_factor("cups", "cup") == 1.0
+    assert unit_factor("tsp", "tbsp") == pytest.approx(1 / 3)
+    assert unit_factor("cup", "tsp") == 48.0
+    with pytest.raises(ValueError):
+        unit_factor("cup", "g")
+
+
+def test_order_costs_match_the_recipe_walk(source_dir):
+    products, ingredients, recipes, bridge = sample_dimensions(source_dir)
+    cost_matrix = RecipeCostMatrix(build_recipe_grams(bridge, ingredients), ingredients)
+    orders = pd.read_csv(source_dir / "shopify_orders.csv")
+    key_of = products.set_index("product_sku")["product_key"]
+
+    costs = cost_matrix.order_costs(
+        orders["sku"].map(key_of), orders["add_on_sku"].map(key_of), orders["quantity"]
+    )
+
+    baseline = [
+        order.quantity * (
+            baseline_cost_per_dozen(recipes, ingredients, order.sku)
+            + baseline_cost_per_dozen(recipes, ingredients, order.add_on_sku)
+        )
+        for order in orders.itertuples()
+    ]
+    np.testing.assert_allclose(costs, baseline, rtol=1e-12)
+    assert (costs > 0).all()
+
+
+def test_reprice_swaps_the_prices_only(source_dir):
+    products, ingredients, recipes, bridge = sample_dimensions(source_dir)
+    cost_matrix = RecipeCostMatrix(build_recipe_grams(bridge, ingredients), ingredients)
+    keys = products["product_key"]
+    before = cost_matrix.order_costs(keys, [np.nan] * len(keys), [1] * len(keys))
+
+    cost_matrix.reprice(ingredients.assign(cost_per_gram=ingredients["cost_per_gram"] * 2))
+
+    np.testing.assert_allclose(cost_matrix.order_costs(keys, [np.nan] * len(keys), [1] * len(keys)), before * 2)
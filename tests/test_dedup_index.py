@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dedup_index
+from dedup_index import CONFLICTS_FILE, BloomFilter, OrderIndex, record_conflicts, row_hashes
+
+
+def orders(order_ids, quantity=1):
+    return pd.DataFrame({
+        "order_id": order_ids,
+        "sku": ["CC"] * len(order_ids),
+        "quantity": [quantity] * len(order_ids),
+    })
+
+
+def split_sizes(index, batch):
+    return [len(part) for part in index.split(batch)]
+
+
+def test_redelivered_and_conflicting_orders_are_dropped(tmp_path):
+    index = OrderIndex(tmp_path)
+    assert split_sizes(index, orders([1, 2, 3])) == [3, 0, 0]
+    index.commit()
+
+    index = OrderIndex(tmp_path)
+    batch = pd.concat([orders([1, 4]), orders([2], quantity=5)], ignore_index=True)
+    new, redelivered, conflicts = index.split(batch)
+
+    assert new["order_id"].tolist() == [4]
+    assert redelivered["order_id"].tolist() == [1]
+    assert conflicts["order_id"].tolist() == [2]
+
+
+def test_uncommitted_keys_are_not_saved(tmp_path):
+    OrderIndex(tmp_path).split(orders([1, 2]))
+
+    assert split_sizes(OrderIndex(tmp_path), orders([1, 2])) == [2, 0, 0]
+
+
+def test_repeats_within_a_run_fail(tmp_path):
+    index = OrderIndex(tmp_path)
+    with pytest.raises(ValueError, match="repeat an order_id of this run"):
+        index.split(orders([1, 2, 2]))
+
+    index = OrderIndex(tmp_path)
+    index.split(orders([1, 2]))
+    # A later chunk of the same run
+    with pytest.raises(ValueError, match="first: 2"):
+        index.split(orders([2, 3]))
+
+
+def test_numbers_hash_alike_as_int_or_float():
+    as_int = orders([1, 2])
+    as_float = as_int.astype({"order_id": float, "quantity": float})
+
+    assert (row_hashes(as_int) == row_hashes(as_float)).all()
+
+
+def test_segments_compact_into_the_base(tmp_path):
+    index = OrderIndex(tmp_path)
+    index.split(orders([1, 2]))
+    index.commit()
+    for batch in ([3, 4], [5]):
+        index = OrderIndex(tmp_path)
+        index.split(orders(batch))
+        index.commit()
+
+    index = OrderIndex(tmp_path)
+    assert (len(index.base[0]), len(index.segments), len(index)) == (2, 2, 5)
+
+    index.compact()
+    assert not list(tmp_path.glob("segment-*"))
+
+    index = OrderIndex(tmp_path)
+    assert (len(index.base[0]), len(index.segments)) == (5, 0)
+    assert split_sizes(index, orders([1, 3, 5, 6])) == [1, 3, 0]
+
+
+def test_many_segments_are_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup_index, "MAX_SEGMENTS", 2)
+    index = OrderIndex(tmp_path)
+    index.split(orders([0]))
+    index.commit()
+    for order_id in range(1, 5):
+        index = OrderIndex(tmp_path)
+        index.split(orders([order_id]))
+        index.commit()
+
+    index = OrderIndex(tmp_path)
+    assert len(index.segments) <= 2
+    assert len(index) == 5
+    assert split_sizes(index, orders(list(range(5)))) == [0, 5, 0]
+
+
+def test_reset_replaces_the_saved_index(tmp_path):
+    index = OrderIndex(tmp_path)
+    index.split(orders([1, 2]))
+    index.commit()
+
+    index = OrderIndex(tmp_path, reset=True)
+    assert not index.exists
+    index.split(orders([3]))
+    index.commit()
+
+    assert split_sizes(OrderIndex(tmp_path), orders([1, 3])) == [1, 1, 0]
+
+
+def test_seeded_orders_match_any_row(tmp_path):
+    index = OrderIndex(tmp_path)
+    index.seed([1, 2])
+    index.commit()
+
+    assert split_sizes(OrderIndex(tmp_path), orders([1, 2, 3], quantity=9)) == [1, 2, 0]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.for_capacity(10_000)
+    keys = np.arange(0, 20_000, 2, dtype=np.int64)
+    bloom.add(keys)
+
+    assert bloom.might_contain(keys).all()
+    false_positives = bloom.might_contain(keys + 1).mean()
+    assert false_positives < 0.03
+
+
+def test_conflicts_are_appended(tmp_path):
+    record_conflicts(tmp_path, orders([1]))
+    record_conflicts(tmp_path, orders([2]))
+
+    assert pd.read_csv(tmp_path / CONFLICTS_FILE)["order_id"].tolist() == [1, 2]
+
+
+def test_redelivered_batch_still_advances_the_offset(pipeline_options, source_dir):
+    from pipeline import Pipeline
+
+    full = Pipeline(**pipeline_options)
+    full.staging_dir.mkdir(parents=True)
+    full.run()
+
+    # A watch-mode batch that only re-delivers loaded orders
+    path = source_dir / "shopify_orders.csv"
+    redelivered = pd.read_csv(path).head(5)
+    redelivered.to_csv(path, mode="a", header=False, index=False)
+    pipeline = Pipeline(incremental=True, **pipeline_options)
+    pipeline.extract_batch(redelivered, path.stat().st_size)
+    summary = pipeline.load()
+
+    assert summary["fact_rows"] == 0
+    assert pipeline.watermark["source_offset"] == path.stat().st_size
+    assert pipeline.watermark["order_id"] == full.watermark["order_id"]
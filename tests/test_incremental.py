@@ -0,0 +1,109 @@
+import pandas as pd
+from sqlalchemy import create_engine
+
+from incremental import (
+    load_watermark,
+    read_new_orders,
+    save_watermark,
+    source_digest,
+    source_rewritten,
+)
+from pipeline import Pipeline
+
+
+def run(pipeline_options, incremental, validate=True):
+    pipeline = Pipeline(incremental=incremental, **pipeline_options)
+    pipeline.staging_dir.mkdir(parents=True, exist_ok=True)
+    return pipeline, pipeline.run(validate=validate)
+
+
+def append_orders(source_dir, order_ids):
+    path = source_dir / "shopify_orders.csv"
+    orders = pd.read_csv(path)
+    new = orders.head(len(order_ids)).assign(order_id=order_ids, date="2024-05-01")
+    new.to_csv(path, mode="a", header=False, index=False)
+
+
+def warehouse_order_ids(pipeline_options):
+    engine = create_engine(pipeline_options["db_url"])
+    try:
+        return pd.read_sql("SELECT order_id FROM fact_orders ORDER BY order_id", engine)["order_id"].tolist()
+    finally:
+        engine.dispose()
+
+
+def watermark_at_end(path):
+    size = path.stat().st_size
+    return {"order_id": 0, "source_offset": size, "source_digest": source_digest(path, size)}
+
+
+def test_read_new_orders_resumes_at_the_offset(source_dir):
+    path = source_dir / "shopify_orders.csv"
+    watermark = watermark_at_end(path)
+    append_orders(source_dir, [5001, 5002])
+
+    chunks, end_offset = read_new_orders(path, watermark, by_order_id=False)
+
+    assert [chunk["order_id"].tolist() for chunk in chunks] == [[5001, 5002]]
+    assert end_offset == path.stat().st_size
+
+
+def test_appended_export_is_not_a_rewrite(source_dir):
+    path = source_dir / "shopify_orders.csv"
+    watermark = watermark_at_end(path)
+    append_orders(source_dir, [5001])
+
+    assert not source_rewritten(path, watermark)
+
+
+def test_rewritten_export_is_detected(source_dir):
+    path = source_dir / "shopify_orders.csv"
+    watermark = watermark_at_end(path)
+
+    # Same size, different rows
+    orders = pd.read_csv(path)
+    orders.assign(order_id=orders["order_id"] + 1).to_csv(path, index=False)
+    assert path.stat().st_size == watermark["source_offset"]
+    assert source_rewritten(path, watermark)
+
+    # One byte longer, so the old offset falls in the middle of the last line
+    orders.assign(order_id=orders["order_id"].where(orders.index > 0, 10_001)).to_csv(path, index=False)
+    assert source_rewritten(path, {**watermark, "source_digest": None})
+
+    # Shrunk
+    orders.head(10).to_csv(path, index=False)
+    assert source_rewritten(path, watermark)
+
+
+def test_watermark_round_trip(tmp_path):
+    save_watermark(tmp_path, 1100, "2024-03-31", 4096, "abc")
+
+    assert load_watermark(tmp_path) == {
+        "order_id": 1100, "date": "2024-03-31", "source_offset": 4096, "source_digest": "abc",
+    }
+
+
+def test_incremental_run_loads_only_appended_orders(pipeline_options, source_dir):
+    _, full = run(pipeline_options, incremental=False)
+    append_orders(source_dir, [5001, 5002, 5003])
+
+    pipeline, summary = run(pipeline_options, incremental=True)
+
+    assert summary["fact_rows"] == 3
+    assert len(warehouse_order_ids(pipeline_options)) == full["fact_rows"] + 3
+    assert pipeline.watermark["order_id"] == 5003
+    assert pipeline.watermark["source_offset"] == (source_dir / "shopify_orders.csv").stat().st_size
+
+
+def test_rewritten_export_falls_back_to_a_full_run(pipeline_options, source_dir):
+    run(pipeline_options, incremental=False)
+    path = source_dir / "shopify_orders.csv"
+    orders = pd.read_csv(path)
+    orders.assign(order_id=orders["order_id"] + 10_000).to_csv(path, index=False)
+
+    # The warehouse still holds the replaced orders, so its rollup totals are not checked here
+    pipeline, summary = run({**pipeline_options, "loader": "upsert"}, incremental=True, validate=False)
+
+    # Every row of the rewritten export is read, not just what follows the old offset
+    assert summary["fact_rows"] == len(orders)
+    assert pipeline.watermark["order_id"] == orders["order_id"].max() + 10_000
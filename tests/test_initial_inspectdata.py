@@ -0,0 +1,126 @@
+import pandas as pd
+
+from initial_inspectdata import (
+    TableValidator,
+    build_key_indexes,
+    drop_quarantined,
+    inspect_sources,
+    load_quarantine,
+    quarantine_rows,
+    run_data_inspection,
+    validate_sources,
+)
+
+
+def append_orders(source_dir, count, bad_every):
+    """Append count valid orders, every bad_every-th one with an unknown SKU."""
+    path = source_dir / "shopify_orders.csv"
+    orders = pd.read_csv(path)
+    start = int(orders["order_id"].max()) + 1
+    extra = pd.DataFrame({
+        "order_id": range(start, start + count),
+        "date": "2024-05-01",
+        "sku": ["CK-NOPE-999" if i % bad_every == 0 else "CK-CHOC-001" for i in range(count)],
+        "quantity": 1,
+        "add_on_sku": None,
+        "total_price": 28.0,
+    })
+    extra.to_csv(path, mode="a", header=False, index=False)
+    return len(orders), extra
+
+
+def test_sampled_inspection_still_validates_every_row(source_dir):
+    before, extra = append_orders(source_dir, 3000, bad_every=500)
+    bad_ids = set(extra.loc[extra["sku"] == "CK-NOPE-999", "order_id"])
+
+    profiles, violations, failed_rows = inspect_sources(
+        source_dir, workers=1, sample_fraction=0.01, sample_min_bytes=0
+    )
+
+    orders = profiles["shopify_orders"]
+    assert orders["row_count"] == before + 3000
+    assert orders["sampled_rows"] < orders["row_count"] // 10
+    (violation,) = [v for v in violations if v["table"] == "shopify_orders"]
+    assert violation["message"] == "Orders.sku contains values not found in Products.cookie_sku"
+    assert violation["count"] == len(bad_ids)
+    assert set(failed_rows["shopify_orders"]["order_id"]) == bad_ids
+
+
+def test_sampled_inspection_quarantines_every_bad_row(source_dir, tmp_path):
+    _, extra = append_orders(source_dir, 3000, bad_every=500)
+    quarantine_dir = tmp_path / "quarantine"
+
+    issues = run_data_inspection(
+        source_dir,
+        output_file=tmp_path / "report.txt",
+        workers=1,
+        sample_fraction=0.01,
+        sample_min_bytes=0,
+        quarantine_dir=quarantine_dir,
+    )
+
+    assert issues == ["Orders.sku contains values not found in Products.cookie_sku"]
+    quarantined = load_quarantine(quarantine_dir)["shopify_orders"]
+    assert set(quarantined["order_id"]) == set(extra.loc[extra["sku"] == "CK-NOPE-999", "order_id"])
+
+
+def sample_tables(source_dir):
+    names = {"shopify_orders", "shopify_products", "ingredients", "recipes"}
+    return {name: pd.read_csv(source_dir / f"{name}.csv") for name in names}
+
+
+def test_sample_sources_pass_every_rule(source_dir):
+    assert validate_sources(sample_tables(source_dir)) == []
+
+
+def test_violations_list_the_offending_rows_in_rule_order(source_dir):
+    data = sample_tables(source_dir)
+    orders = data["shopify_orders"]
+    orders.loc[[3, 7], "sku"] = "CK-NOPE-999"
+    orders.loc[5, "quantity"] = 0
+    orders.loc[9, "order_id"] = orders.loc[2, "order_id"]
+    data["ingredients"].loc[1, "cost_per_gram"] *= 2
+
+    violations = validate_sources(data)
+
+    assert [(v["table"], v["message"], v["count"], v["rows"].tolist()) for v in violations] == [
+        ("shopify_orders", "Orders.sku contains values not found in Products.cookie_sku", 2, [3, 7]),
+        ("shopify_orders", "Orders.quantity must be > 0", 1, [5]),
+        ("shopify_orders", "Duplicate Orders.order_id detected", 2, [2, 9]),
+        ("ingredients", "Ingredients.cost_per_gram calculation mismatch", 1, [1]),
+    ]
+
+
+def test_duplicates_across_chunks_re_read_the_rows_not_kept(source_dir):
+    data = sample_tables(source_dir)
+    orders = data["shopify_orders"]
+    orders.loc[90, "order_id"] = orders.loc[10, "order_id"]
+    validator = TableValidator("shopify_orders", build_key_indexes(data))
+    for start in range(0, len(orders), 25):
+        validator.add(orders.iloc[start:start + 25])
+
+    violations, failed_rows = validator.finish(lambda rows: orders.loc[rows])
+
+    duplicate = next(v for v in violations if v["message"] == "Duplicate Orders.order_id detected")
+    assert duplicate["rows"].tolist() == [10, 90]
+    # No chunk rule kept them, so both rows are read back
+    assert failed_rows.index.tolist() == [10, 90]
+
+
+def test_quarantined_rows_are_dropped_from_the_load(source_dir, tmp_path):
+    data = sample_tables(source_dir)
+    data["shopify_orders"].loc[[3, 7], "sku"] = "CK-NOPE-999"
+    data["shopify_orders"].loc[7, "quantity"] = -1
+    violations = validate_sources(data)
+    quarantine_dir = tmp_path / "quarantine"
+
+    assert quarantine_rows(data, violations, quarantine_dir) == {"shopify_orders": 2}
+
+    written = pd.read_csv(quarantine_dir / "shopify_orders.csv")
+    assert written["failed_rules"].tolist() == [
+        "Orders.sku contains values not found in Products.cookie_sku",
+        "Orders.sku contains values not found in Products.cookie_sku; Orders.quantity must be > 0",
+    ]
+    kept = drop_quarantined(data["shopify_orders"], "shopify_orders", load_quarantine(quarantine_dir))
+    assert len(kept) == len(data["shopify_orders"]) - 2
+    assert "CK-NOPE-999" not in set(kept["sku"])
@@ -0,0 +1,66 @@
+import json
+
+import pandas as pd
+import pytest
+
+from kpi_service import KpiService, record_changes
+from staging_io import write_staging
+
+
+@pytest.fixture
+def staging_dir(tmp_path):
+    write_staging(
+        pd.DataFrame({"product_key": [1], "product_sku": ["CC"], "product_name": ["Chocolate Chip"]}),
+        tmp_path,
+        "dim_product",
+    )
+    write_daily(tmp_path, revenue=28.0)
+    return tmp_path
+
+
+def write_daily(staging_dir, revenue):
+    write_staging(
+        pd.DataFrame({
+            "period_start_key": [20240102],
+            "product_key": [1],
+            "orders": [1],
+            "dozens": [1],
+            "revenue": [revenue],
+            "ingredient_cost": [7.0],
+            "gross_margin": [revenue - 7.0],
+            "margin_pct": [0.0],
+        }),
+        staging_dir,
+        "kpi_daily_product",
+    )
+
+
+def get(service, **params):
+    status, body = service.handle("/kpi", {name: [value] for name, value in params.items()})
+    assert status == 200, body
+    return json.loads(body)
+
+
+def test_equivalent_requests_share_a_normalized_body(staging_dir):
+    service = KpiService(staging_dir)
+
+    first = get(service, start="20240101", end="2024-01-31")
+    second = get(service, start="2024-01-01", end="20240131")
+
+    assert first == second
+    assert (first["start"], first["end"]) == ("2024-01-01", "2024-01-31")
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+
+
+def test_reload_swaps_in_a_new_store(staging_dir):
+    service = KpiService(staging_dir)
+    before = service.store
+    assert get(service)["rows"][0]["revenue"] == 28.0
+
+    write_daily(staging_dir, revenue=56.0)
+    record_changes(staging_dir, [20240102])
+
+    assert get(service)["rows"][0]["revenue"] == 56.0
+    # Requests that took the old store still answer from it, whole
+    assert service.store is not before
+    assert before.answer("daily", None, None, (), ("product",))["revenue"].tolist() == [28.0]
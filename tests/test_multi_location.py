@@ -0,0 +1,68 @@
+import shutil
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from multi_location import LOCATION_KEY_BLOCK, location_keys, run_locations, tag_location, untag_location
+
+
+def test_product_keys_move_into_the_location_block_and_back():
+    fact = pd.DataFrame({"order_id": [1, 2], "product_key": [3, 5], "add_on_key": [7.0, None]})
+
+    tagged = tag_location("fact_orders", fact, 2)
+
+    assert tagged["product_key"].tolist() == [2003, 2005]
+    assert tagged["add_on_key"].tolist()[0] == 2007 and pd.isna(tagged["add_on_key"].tolist()[1])
+    assert tagged["location_key"].tolist() == [2, 2]
+    assert tagged["order_id"].tolist() == [1, 2]
+    pd.testing.assert_frame_equal(untag_location("fact_orders", tagged, 2), fact)
+
+
+def test_shared_tables_are_not_tagged():
+    dim_date = pd.DataFrame({"date_key": [20240102]})
+
+    assert tag_location("dim_date", dim_date, 2) is dim_date
+    assert untag_location("dim_date", dim_date, 2) is dim_date
+
+
+def test_a_location_cannot_outgrow_its_key_block():
+    dim_product = pd.DataFrame({"product_key": [1, LOCATION_KEY_BLOCK]})
+
+    with pytest.raises(ValueError, match="limited to 999 products"):
+        tag_location("dim_product", dim_product, 1)
+
+
+def test_locations_keep_their_keys_and_new_ones_get_the_next_free_keys():
+    existing = pd.DataFrame({"location_key": [1, 3], "location": ["north", "south"]})
+
+    assert location_keys(["south", "east", "north", "west"], existing) == {"south": 3, "east": 4, "north": 1, "west": 5}
+    assert location_keys(["north", "south"]) == {"north": 1, "south": 2}
+
+
+def test_locations_load_into_one_warehouse(pipeline_options, source_dir, tmp_path):
+    north, south = tmp_path / "north", tmp_path / "south"
+    shutil.copytree(source_dir, north)
+    shutil.copytree(source_dir, south)
+
+    run_locations([north, south], pipeline_options)
+    summaries, runner = run_locations([south], pipeline_options)
+
+    assert runner.validate()["passed"]
+    engine = create_engine(pipeline_options["db_url"])
+    try:
+        dim_location = pd.read_sql("SELECT location_key, location FROM dim_location ORDER BY location_key", engine)
+        fact = pd.read_sql("SELECT location_key, product_key, date_key FROM fact_orders", engine)
+        dim_date = pd.read_sql("SELECT date_key FROM dim_date", engine)
+    finally:
+        engine.dispose()
+
+    # south kept its key on the second run
+    assert summaries[0]["location_key"] == 2
+    assert dim_location.values.tolist() == [[1, "north"], [2, "south"]]
+    orders = len(pd.read_csv(source_dir / "shopify_orders.csv"))
+    assert fact["location_key"].value_counts().to_dict() == {1: orders, 2: orders}
+    assert ((fact["product_key"] // LOCATION_KEY_BLOCK) == fact["location_key"]).all()
+    # Dates both shops have orders on are loaded once
+    assert dim_date["date_key"].is_unique
+    assert set(fact["date_key"]) == set(dim_date["date_key"])
@@ -0,0 +1,152 @@
+import threading
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import parallel_load
+from bulk_loader import get_loader
+from parallel_load import partitioned_transaction, run_dag
+
+# date_keys of four months, so every partition of a chunk gets rows
+DATE_KEYS = [20240115, 20240215, 20240315, 20240415]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # Partitions write over concurrent connections; SQLite serializes them
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}", connect_args={"timeout": 30})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def concurrent_writers(monkeypatch):
+    """Let SQLite take several partition connections, like MySQL."""
+    monkeypatch.setattr(parallel_load, "max_writers", lambda engine, workers: workers)
+
+
+def chunk(first_order_id, n_rows=100):
+    order_ids = range(first_order_id, first_order_id + n_rows)
+    return pd.DataFrame({
+        "order_id": list(order_ids),
+        "date_key": [DATE_KEYS[i % len(DATE_KEYS)] for i in order_ids],
+        "total_price": 28.0,
+    })
+
+
+def dim_date():
+    return pd.DataFrame({"date_key": DATE_KEYS})
+
+
+def table_names(engine):
+    return set(inspect(engine).get_table_names())
+
+
+def count(engine, table_name):
+    return pd.read_sql(f"SELECT COUNT(*) AS n FROM {table_name}", engine)["n"].iloc[0]
+
+
+# --------------------------------------------------
+# DAG SCHEDULING
+# --------------------------------------------------
+
+def test_run_dag_loads_each_table_after_its_dependencies():
+    finished = []
+    lock = threading.Lock()
+
+    def task(name):
+        def load():
+            with lock:
+                finished.append(name)
+        return load
+
+    tables = ["fact_orders", "bridge_product_ingredient", "dim_date", "dim_ingredient", "dim_product"]
+    run_dag({name: task(name) for name in tables}, workers=4)
+
+    assert sorted(finished) == sorted(tables)
+    for name, deps in parallel_load.TABLE_DEPENDENCIES.items():
+        assert all(finished.index(dep) < finished.index(name) for dep in deps)
+
+
+def test_run_dag_stops_at_a_failed_table():
+    started = []
+
+    def fail():
+        raise RuntimeError("dim_product failed")
+
+    tasks = {
+        "dim_product": fail,
+        "dim_ingredient": lambda: started.append("dim_ingredient"),
+        "bridge_product_ingredient": lambda: started.append("bridge_product_ingredient"),
+    }
+    with pytest.raises(RuntimeError, match="dim_product failed"):
+        run_dag(tasks, workers=1)
+
+    assert "bridge_product_ingredient" not in started
+
+
+def test_run_dag_rejects_circular_dependencies():
+    with pytest.raises(ValueError, match="Circular"):
+        run_dag({"a": lambda: None, "b": lambda: None}, dependencies={"a": ["b"], "b": ["a"]})
+
+
+# --------------------------------------------------
+# PARTITIONED STREAMING LOAD
+# --------------------------------------------------
+
+def test_partitions_land_every_row(engine, concurrent_writers):
+    loader = get_loader("multirow", engine, batch_size=30, verbose=False)
+
+    with partitioned_transaction(loader, 3) as write:
+        write("dim_date", dim_date())
+        for first in (0, 100, 200):
+            write("fact_orders", chunk(first))
+
+    assert count(engine, "dim_date") == len(DATE_KEYS)
+    assert count(engine, "fact_orders") == 300
+    assert loader.stats["fact_orders"][0] == 300
+    # Scratch tables are gone
+    assert table_names(engine) == {"dim_date", "fact_orders"}
+
+
+def test_a_failed_partition_rolls_back_the_whole_stream(engine, concurrent_writers, monkeypatch):
+    loader = get_loader("multirow", engine, batch_size=30, verbose=False)
+    write_scratch = loader._write_scratch
+    calls = []
+
+    def fail_on_the_fifth_partition(conn, scratch_name, df):
+        calls.append(scratch_name)
+        if len(calls) == 5:
+            raise RuntimeError("partition failed")
+        write_scratch(conn, scratch_name, df)
+
+    monkeypatch.setattr(loader, "_write_scratch", fail_on_the_fifth_partition)
+
+    with pytest.raises(RuntimeError, match="partition failed"):
+        with partitioned_transaction(loader, 3) as write:
+            write("dim_date", dim_date())
+            for first in (0, 100, 200):
+                write("fact_orders", chunk(first))
+
+    # The failing chunk's other partitions committed into the scratch tables,
+    # the last chunk was never written, and the scratch tables are dropped
+    assert len(calls) == 6
+    assert count(engine, "dim_date") == 0
+    assert count(engine, "fact_orders") == 0
+    assert table_names(engine) == {"dim_date", "fact_orders"}
+
+
+def test_one_partition_skips_the_scratch_tables(engine, monkeypatch):
+    loader = get_loader("multirow", engine, batch_size=30, verbose=False)
+
+    def no_scratch(*args):
+        raise AssertionError("scratch table written")
+
+    monkeypatch.setattr(loader, "_write_scratch", no_scratch)
+
+    with partitioned_transaction(loader, 4) as write:
+        write("fact_orders", chunk(0))
+
+    assert count(engine, "fact_orders") == 100
+    assert table_names(engine) == {"fact_orders"}
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from planning import purchase_plan, read_forecast, supplier_totals
+from scd import date_keys_of
+
+
+def test_date_keys_of_strings_and_datetimes():
+    assert date_keys_of(["2024-03-01", "9999-12-31"]).tolist() == [20240301, 99991231]
+    assert date_keys_of(pd.to_datetime(pd.Series(["2024-03-01"]))).tolist() == [20240301]
+
+
+def test_unknown_add_ons_are_dropped_with_a_warning(tmp_path, capsys):
+    dim_product = pd.DataFrame({"product_sku": ["CC", "NUT"], "product_key": [1, 2]})
+    path = tmp_path / "forecast.csv"
+    pd.DataFrame({
+        "date": ["2024-07-01", "2024-07-02"],
+        "sku": ["CC", "CC"],
+        "quantity": [2, 3],
+        "add_on_sku": ["NUT", "NOPE"],
+    }).to_csv(path, index=False)
+
+    forecast = read_forecast(path, dim_product)
+
+    assert forecast["add_on_key"].tolist()[0] == 2
+    assert np.isnan(forecast["add_on_key"].tolist()[1])
+    assert "Dropped the add-ons of 1 forecast rows with unknown SKUs: NOPE" in capsys.readouterr().out
+
+
+def test_supplier_totals_are_rounded_to_cents():
+    dim_ingredient = pd.DataFrame({
+        "ingredient_key": [1, 2],
+        "ingredient": ["Flour", "Sugar"],
+        "supplier": ["Mill"] * 2,
+        "container_description": ["bag"] * 2,
+        "container_grams": [1.0] * 2,
+        "cost_per_gram": [0.1, 0.2],
+    })
+    demand = pd.DataFrame({
+        "scenario": "history",
+        "period_start_key": 20240701,
+        "ingredient_key": [1, 2],
+        "grams": [1.0, 1.0],
+    })
+
+    totals = supplier_totals(purchase_plan(demand, dim_ingredient))
+
+    # 0.1 + 0.2 is 0.30000000000000004 in floats
+    assert totals["cost"].tolist() == [0.3]
+    assert totals["containers"].tolist() == [2]
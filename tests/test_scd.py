@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from costing import RecipeCostMatrix, build_recipe_grams
+from scd import VALID_FROM_MIN, VALID_TO_MAX, AsOfIndex, apply_versions, current_versions
+from staging_io import read_staging, write_staging
+from transforms import build_bridge_product_ingredient
+
+
+def snapshot(prices):
+    return pd.DataFrame({
+        "product_sku": list(prices),
+        "price": list(prices.values()),
+        "product_key": range(1, len(prices) + 1),
+    })
+
+
+def test_first_run_opens_one_version_per_row():
+    versions, changed = apply_versions("dim_product", snapshot({"CC": 28.0, "SUG": 28.0}))
+
+    assert versions["valid_from"].tolist() == [VALID_FROM_MIN] * 2
+    assert versions["valid_to"].tolist() == [VALID_TO_MAX] * 2
+    assert len(changed) == 2
+
+
+def test_unchanged_snapshot_keeps_the_history():
+    history, _ = apply_versions("dim_product", snapshot({"CC": 28.0}))
+
+    # Float noise from a staging round trip is not a change
+    versions, changed = apply_versions(
+        "dim_product", snapshot({"CC": 28.0 + 1e-13}), history, "2024-03-01"
+    )
+
+    pd.testing.assert_frame_equal(versions, history)
+    assert changed.empty
+
+
+def test_changed_row_closes_its_version_and_opens_a_new_one():
+    history, _ = apply_versions("dim_product", snapshot({"CC": 28.0, "SUG": 28.0}))
+
+    versions, changed = apply_versions(
+        "dim_product", snapshot({"CC": 30.0, "SUG": 28.0}), history, "2024-03-01"
+    )
+
+    assert versions[["product_sku", "price", "product_key", "valid_from", "valid_to"]].values.tolist() == [
+        ["CC", 28.0, 1, VALID_FROM_MIN, "2024-03-01"],
+        ["SUG", 28.0, 2, VALID_FROM_MIN, VALID_TO_MAX],
+        ["CC", 30.0, 3, "2024-03-01", VALID_TO_MAX],
+    ]
+    assert sorted(changed["product_key"]) == [1, 3]
+    assert current_versions(versions)["product_key"].tolist() == [2, 3]
+
+
+def test_second_change_on_the_same_day_corrects_the_new_version():
+    history, _ = apply_versions("dim_product", snapshot({"CC": 28.0}))
+    history, _ = apply_versions("dim_product", snapshot({"CC": 30.0}), history, "2024-03-01")
+
+    versions, _ = apply_versions("dim_product", snapshot({"CC": 31.0}), history, "2024-03-01")
+
+    assert versions[["price", "product_key", "valid_from", "valid_to"]].values.tolist() == [
+        [28.0, 1, VALID_FROM_MIN, "2024-03-01"],
+        [31.0, 2, "2024-03-01", VALID_TO_MAX],
+    ]
+
+
+def test_new_and_removed_rows():
+    history, _ = apply_versions("dim_product", snapshot({"CC": 28.0, "SUG": 28.0}))
+
+    versions, _ = apply_versions("dim_product", snapshot({"CC": 28.0, "NUT": 28.0}), history, "2024-03-01")
+
+    new = versions[versions["product_sku"] == "NUT"].iloc[0]
+    assert (new["product_key"], new["valid_from"]) == (3, VALID_FROM_MIN)
+    # Rows that left the source keep their open version
+    assert versions.loc[versions["product_sku"] == "SUG", "valid_to"].tolist() == [VALID_TO_MAX]
+
+
+def test_as_of_lookup_picks_the_version_in_effect():
+    history, _ = apply_versions("dim_product", snapshot({"CC": 28.0, "SUG": 28.0}))
+    versions, _ = apply_versions("dim_product", snapshot({"CC": 30.0, "SUG": 28.0}), history, "2024-03-01")
+    index = AsOfIndex(versions, "product_sku", "product_key")
+
+    skus = pd.Series(["CC", "CC", "CC", "SUG", "UNKNOWN"])
+    date_keys = [20240229, 20240301, 20250101, 20240301, 20240301]
+    codes = index.codes.reindex(skus).to_numpy(dtype=float)
+
+    keys = index.lookup(codes, date_keys)
+
+    assert keys[:4].tolist() == [1, 3, 3, 2]
+    assert np.isnan(keys[4])
+
+
+def butter(cost_per_unit):
+    return pd.DataFrame({
+        "ingredient": ["Butter"],
+        "unit": ["cup"],
+        "grams_per_unit": [227.0],
+        "cost_per_unit": [cost_per_unit],
+        "cost_per_gram": [cost_per_unit / 227.0],
+        "ingredient_key": [1],
+    })
+
+
+def test_bridge_links_each_product_version_to_the_ingredients_of_its_start_date():
+    products, _ = apply_versions("dim_product", snapshot({"CC": 28.0}))
+    ingredients, _ = apply_versions("dim_ingredient", butter(1.0))
+    ingredients, _ = apply_versions("dim_ingredient", butter(1.5), ingredients, "2024-03-01")
+    products, _ = apply_versions("dim_product", snapshot({"CC": 30.0}), products, "2024-06-01")
+    # The ingredient changes again after the second product version was created
+    ingredients, _ = apply_versions("dim_ingredient", butter(2.0), ingredients, "2024-09-01")
+    recipes = pd.DataFrame({"sku": ["CC"], "ingredient": ["Butter"], "quantity_unit": ["cups"], "quantity": [1.0]})
+
+    bridge = build_bridge_product_ingredient(recipes, products, ingredients)
+
+    assert bridge[["product_key", "ingredient_key"]].values.tolist() == [[1, 1], [2, 2]]
+    # Orders are still costed at the butter price of their own date
+    cost_matrix = RecipeCostMatrix(build_recipe_grams(bridge, ingredients), ingredients)
+    costs = cost_matrix.order_costs([1, 2, 2], [np.nan] * 3, [1, 1, 1], [20240201, 20240701, 20241001])
+    np.testing.assert_allclose(costs, [1.0, 1.5, 2.0])
+
+
+def test_staging_csv_round_trip_keeps_every_float_digit(tmp_path):
+    df = pd.DataFrame({"ingredient": ["flour"], "cost_per_gram": [0.25 / 120]})
+
+    write_staging(df, tmp_path, "dim_ingredient")
+
+    assert read_staging(tmp_path, "dim_ingredient")["cost_per_gram"].tolist() == [0.25 / 120]
@@ -0,0 +1,156 @@
+import pandas as pd
+import pytest
+
+from sheets_sync import FakeSpreadsheet, SheetSync, changed_ranges, column_letter
+
+
+def make_sync(tmp_path, spreadsheet, **options):
+    return SheetSync(spreadsheet, tmp_path / "snapshots", sleep=lambda seconds: None, **options)
+
+
+def products(n):
+    return pd.DataFrame({
+        "product_sku": [f"SKU-{i}" for i in range(n)],
+        "price": [28.0] * n,
+        "note": [None] * n,
+    })
+
+
+def sheet_values(spreadsheet, tab):
+    return spreadsheet.tabs[tab].get_all_values()
+
+
+def expected_values(df):
+    return [list(df.columns)] + df.fillna("").to_numpy().tolist()
+
+
+def test_first_sync_writes_the_whole_tab(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    df = products(5)
+
+    result = make_sync(tmp_path, spreadsheet).sync_table("dim_product", df)
+
+    assert result == {"mode": "full", "rows_sent": 5, "rows_cleared": 0, "requests": 1}
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+def test_unchanged_table_sends_nothing(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    df = products(5)
+    make_sync(tmp_path, spreadsheet).sync_table("dim_product", df)
+
+    result = make_sync(tmp_path, spreadsheet).sync_table("dim_product", df)
+
+    assert result == {"mode": "unchanged", "rows_sent": 0, "rows_cleared": 0, "requests": 0}
+
+
+def test_diff_sends_only_changed_rows(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    sync = make_sync(tmp_path, spreadsheet)
+    df = products(10)
+    sync.sync_table("dim_product", df)
+    spreadsheet.tabs["dim_product"].calls.clear()
+
+    df.loc[[2, 3, 7], "price"] = 32.0
+    result = sync.sync_table("dim_product", df)
+
+    assert result["mode"] == "diff"
+    assert result["rows_sent"] == 3
+    assert spreadsheet.tabs["dim_product"].calls == [("batch_update", ["A4:C5", "A9:C9"])]
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+def test_appended_rows_grow_the_sheet(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    sync = make_sync(tmp_path, spreadsheet)
+    sync.sync_table("dim_product", products(5))
+
+    df = products(30)
+    result = sync.sync_table("dim_product", df)
+
+    assert result["mode"] == "diff"
+    assert result["rows_sent"] == 25
+    assert spreadsheet.tabs["dim_product"].row_count >= 31
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+def test_shrunk_table_clears_the_removed_rows(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    sync = make_sync(tmp_path, spreadsheet)
+    sync.sync_table("dim_product", products(10))
+
+    df = products(6)
+    result = sync.sync_table("dim_product", df)
+
+    assert result == {"mode": "diff", "rows_sent": 0, "rows_cleared": 4, "requests": 1}
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+def test_header_change_rewrites_the_tab(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    sync = make_sync(tmp_path, spreadsheet)
+    sync.sync_table("dim_product", products(5))
+
+    df = products(5).drop(columns=["note"]).assign(category="cookie")
+    result = sync.sync_table("dim_product", df)
+
+    assert result["mode"] == "full"
+    assert result["rows_sent"] == 5
+    assert ("clear",) in spreadsheet.tabs["dim_product"].calls
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+def test_updates_are_chunked(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    df = products(25)
+
+    result = make_sync(tmp_path, spreadsheet, chunk_rows=10).sync_table("dim_product", df)
+
+    # Header, then 10 + 10 + 5 rows: no batch_update carries more than chunk_rows rows
+    assert result["requests"] == 4
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(df)
+
+
+class RateLimited(Exception):
+    class response:
+        status_code = 429
+
+
+def test_rate_limits_are_retried(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    failures = [RateLimited(), RateLimited()]
+    add_worksheet = spreadsheet.add_worksheet
+
+    def flaky_add_worksheet(**kwargs):
+        if failures:
+            raise failures.pop()
+        return add_worksheet(**kwargs)
+
+    spreadsheet.add_worksheet = flaky_add_worksheet
+    make_sync(tmp_path, spreadsheet).sync_table("dim_product", products(3))
+
+    assert not failures
+    assert sheet_values(spreadsheet, "dim_product") == expected_values(products(3))
+
+
+def test_failed_tab_is_rewritten_in_full_next_time(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    sync = make_sync(tmp_path, spreadsheet)
+    sync.sync({"dim_product": products(5)})
+
+    def broken():
+        raise ValueError("staging table unreadable")
+
+    with pytest.raises(ValueError):
+        sync.sync({"dim_product": broken})
+
+    assert sync.sync({"dim_product": products(5)})["dim_product"]["mode"] == "full"
+
+
+def test_changed_ranges():
+    old = [1, 2, 3, 4]
+    assert changed_ranges(pd.Series(old).to_numpy(), pd.Series([1, 9, 9, 4, 5]).to_numpy()) == [(1, 3), (4, 5)]
+
+
+def test_column_letter():
+    assert [column_letter(n) for n in (1, 26, 27, 52)] == ["A", "Z", "AA", "AZ"]
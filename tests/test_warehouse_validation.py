@@ -0,0 +1,157 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from warehouse_validation import format_report, validate_warehouse
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A small, consistent SQLite warehouse."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    tables = {
+        "dim_product": pd.DataFrame({"product_key": [1, 2], "product_sku": ["CC", "NUT"], "price": [28.0, 4.0]}),
+        "dim_ingredient": pd.DataFrame({"ingredient_key": [1], "ingredient": ["Butter"]}),
+        "dim_date": pd.DataFrame({"date_key": [20240102, 20240103]}),
+        "bridge_product_ingredient": pd.DataFrame({"product_key": [1], "ingredient_key": [1], "quantity": [1.0]}),
+        "fact_orders": pd.DataFrame({
+            "order_id": [1001, 1002],
+            "product_key": [1, 1],
+            "add_on_key": [2, None],
+            "date_key": [20240102, 20240103],
+            "quantity": [1, 2],
+            "total_price": [32.0, 56.0],
+            "ingredient_cost": [7.5, 14.0],
+            "gross_margin": [24.5, 42.0],
+        }),
+        "kpi_daily_product": pd.DataFrame({
+            "period_start_key": [20240102, 20240103],
+            "product_key": [1, 1],
+            "orders": [1, 1],
+            "revenue": [32.0, 56.0],
+            "gross_margin": [24.5, 42.0],
+        }),
+    }
+    for table_name, df in tables.items():
+        df.to_sql(table_name, engine, index=False)
+    yield engine
+    engine.dispose()
+
+
+def failed_checks(report):
+    return {check["check"]: check["violations"] for check in report["checks"] if not check["passed"]}
+
+
+def test_consistent_warehouse_passes(engine):
+    report = validate_warehouse(engine)
+
+    assert report["passed"], failed_checks(report)
+    assert report["row_counts"]["fact_orders"] == 2
+    assert report["metrics"]["total_revenue"] == 88.0
+    assert report["metrics"]["total_gross_margin"] == 66.5
+    # Percent, like the rollups' margin_pct: (24.5 / 32 + 42 / 56) / 2
+    assert report["metrics"]["avg_margin_pct"] == pytest.approx(75.78125)
+    assert "Warehouse validation: PASSED" in format_report(report)
+
+
+def test_fact_rules_count_violating_rows(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO fact_orders VALUES (1003, 9, 8, 20991231, 0, -1.0, 2.0, 5.0), "
+            "(1004, 1, NULL, 20240102, 1, 28.0, 30.0, -2.0)"
+        ))
+
+    report = validate_warehouse(engine)
+
+    assert not report["passed"]
+    assert failed_checks(report) == {
+        "orphan_product_keys": 1,
+        "orphan_add_on_keys": 1,
+        "orphan_date_keys": 1,
+        "invalid_rows": 1,
+        "margin_mismatch_rows": 1,
+        "cost_exceeds_revenue": 2,
+        # The rollups no longer add up to the facts either
+        "kpi_daily_product_totals": 3,
+    }
+
+
+def test_orphan_bridge_rows(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO bridge_product_ingredient VALUES (7, 1, 1.0), (1, 7, 1.0)"))
+
+    assert failed_checks(validate_warehouse(engine)) == {
+        "orphan_bridge_product_keys": 1,
+        "orphan_bridge_ingredient_keys": 1,
+    }
+
+
+def test_rollup_totals_must_match_the_facts(engine):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE kpi_daily_product SET revenue = revenue + 10 WHERE period_start_key = 20240102"))
+
+    report = validate_warehouse(engine)
+
+    assert failed_checks(report) == {"kpi_daily_product_totals": 1}
+    check = next(c for c in report["checks"] if c["check"] == "kpi_daily_product_totals")
+    assert check["description"] == "totals differ from fact_orders: revenue"
+
+
+def test_missing_tables_fail_without_querying(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE bridge_product_ingredient"))
+
+    report = validate_warehouse(engine)
+
+    assert not report["passed"]
+    assert report["checks"] == [{
+        "check": "missing_tables",
+        "violations": 1,
+        "passed": False,
+        "description": "missing: bridge_product_ingredient",
+    }]
+
+
+def test_duplicated_dimension_rows_are_reported_without_fanning_out_the_facts(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO dim_product VALUES (1, 'CC', 28.0), (2, 'NUT', 4.0)"))
+        conn.execute(text("INSERT INTO dim_date VALUES (20240102)"))
+
+    report = validate_warehouse(engine)
+
+    assert failed_checks(report) == {"duplicate_dim_product_keys": 2, "duplicate_dim_date_keys": 1}
+    # Every fact row is still counted once
+    assert report["metrics"]["total_orders"] == 2
+    assert report["metrics"]["total_revenue"] == 88.0
+
+
+def test_versioned_dimensions_are_keyed_by_version(engine):
+    # Two versions of CC are fine; a second row for the same version is not
+    pd.DataFrame({
+        "product_key": [1, 2, 3, 4],
+        "product_sku": ["CC", "NUT", "CC", "CC"],
+        "price": [28.0, 4.0, 30.0, 30.0],
+        "valid_from": ["1900-01-01", "1900-01-01", "2024-06-01", "2024-06-01"],
+    }).to_sql("dim_product", engine, index=False, if_exists="replace")
+
+    report = validate_warehouse(engine)
+
+    assert failed_checks(report) == {"duplicate_dim_product_keys": 1}
+    check = next(c for c in report["checks"] if c["check"] == "duplicate_dim_product_keys")
+    assert check["description"] == "rows repeating a business key of dim_product (product_sku, valid_from)"
+
+
+def test_locations_may_share_a_business_key(engine):
+    pd.DataFrame({
+        "product_key": [1001, 2001, 2002],
+        "location_key": [1, 2, 2],
+        "product_sku": ["CC", "CC", "CC"],
+        "price": [28.0, 28.0, 28.0],
+    }).to_sql("dim_product", engine, index=False, if_exists="replace")
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE fact_orders SET product_key = 1001, add_on_key = NULL"))
+        conn.execute(text("UPDATE bridge_product_ingredient SET product_key = 1001"))
+        conn.execute(text("UPDATE kpi_daily_product SET product_key = 1001"))
+
+    # Only location 2's second CC row repeats a key
+    assert failed_checks(validate_warehouse(engine)) == {"duplicate_dim_product_keys": 1}
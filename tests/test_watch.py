@@ -0,0 +1,121 @@
+import itertools
+import json
+import threading
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import watch
+from pipeline import Pipeline
+from watch import DebouncedWatcher, OrderWatcher, read_appended_orders
+
+
+def append_orders(source_dir, dates):
+    """Append one valid order per date, with ids past the sample orders."""
+    path = source_dir / "shopify_orders.csv"
+    orders = pd.read_csv(path)
+    new = orders.head(len(dates)).assign(order_id=range(9001, 9001 + len(dates)), date=dates)
+    new.to_csv(path, mode="a", header=False, index=False)
+    return new
+
+
+def watcher_appending(pipeline_options, dates, **kwargs):
+    """An OrderWatcher whose export grows by one order per date right after the catch-up run."""
+    watcher = OrderWatcher(
+        lambda incremental: Pipeline(incremental=incremental, **pipeline_options),
+        poll_seconds=0.01,
+        debounce_seconds=0.01,
+        **kwargs,
+    )
+    start = watcher._start
+
+    def start_then_append(incremental):
+        start(incremental)
+        append_orders(pipeline_options["source_dir"], dates)
+
+    watcher._start = start_then_append
+    return watcher
+
+
+def test_appended_orders_are_cut_into_batches_at_line_ends(tmp_path, monkeypatch):
+    path = tmp_path / "shopify_orders.csv"
+    lines = [f"{order_id},CC,,2024-05-0{order_id % 9 + 1},1,28.0\n".encode() for order_id in range(1, 8)]
+    path.write_bytes(b"order_id,sku,add_on_sku,date,quantity,total_price\n" + b"".join(lines) + b"8,CC,,2024")
+    header_end = path.read_bytes().index(b"\n") + 1
+    line_ends = list(itertools.accumulate((len(line) for line in lines), initial=header_end))[1:]
+
+    batches = list(read_appended_orders(path, 0, batch_rows=3))
+
+    assert [orders["order_id"].tolist() for orders, _ in batches] == [[1, 2, 3], [4, 5, 6], [7]]
+    # The half-written order is left for later
+    assert [end for _, end in batches] == [line_ends[2], line_ends[5], line_ends[6]]
+
+    # A batch never spans two read blocks, but still ends on a line end
+    monkeypatch.setattr(watch, "READ_BLOCK_BYTES", 64)
+    small_blocks = list(read_appended_orders(path, 0, batch_rows=3))
+    assert pd.concat([orders for orders, _ in small_blocks])["order_id"].tolist() == list(range(1, 8))
+    assert {end for _, end in small_blocks} <= set(line_ends)
+    end_offset = small_blocks[-1][1]
+    assert end_offset == line_ends[-1]
+
+    with open(path, "ab") as f:
+        f.write(b"-05-09,2,56.0\n")
+    ((orders, _),) = read_appended_orders(path, end_offset, batch_rows=3)
+    assert orders[["order_id", "date", "quantity", "total_price"]].values.tolist() == [[8, "2024-05-09", 2, 56.0]]
+
+
+def test_changes_are_reported_once_they_settle(source_dir):
+    now = itertools.count()
+    watcher = DebouncedWatcher(source_dir, debounce_seconds=3, poll_seconds=0, clock=lambda: next(now))
+    append_orders(source_dir, ["2024-05-01"])
+
+    assert watcher.wait_for_changes(threading.Event()) == {"shopify_orders.csv"}
+    # The change was seen at t=0 and nothing changed again until t=3
+    assert next(now) == 4
+
+
+def test_files_that_keep_changing_are_reported_after_a_few_debounce_periods(source_dir, monkeypatch):
+    now = itertools.count()
+    polls = itertools.count()
+    # Written on every second poll: never quiet for a whole debounce period
+    monkeypatch.setattr(watch, "snapshot", lambda _: {"shopify_orders.csv": (next(polls) // 2, 0)})
+    watcher = DebouncedWatcher(source_dir, debounce_seconds=3, poll_seconds=0, clock=lambda: next(now))
+
+    assert watcher.wait_for_changes(threading.Event()) == {"shopify_orders.csv"}
+    reported_at = next(now) - 1
+    assert 3 * watch.MAX_DEBOUNCE_PERIODS <= reported_at < 3 * watch.MAX_DEBOUNCE_PERIODS + 2
+
+
+def test_batches_restage_only_their_facts_and_validate_their_dates(pipeline_options, monkeypatch):
+    monkeypatch.setattr(watch, "FULL_VALIDATION_BATCHES", 2)
+    validated = []
+    validate = Pipeline.validate
+
+    def record(pipeline, date_range=None):
+        validated.append(date_range)
+        return validate(pipeline, date_range)
+
+    monkeypatch.setattr(Pipeline, "validate", record)
+    dates = ["2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04", "2024-05-05"]
+    watcher = watcher_appending(pipeline_options, dates, batch_rows=2)
+    staging_dir = pipeline_options["staging_dir"]
+
+    watcher.run(max_batches=3)
+
+    # The catch-up run and every second batch check everything
+    assert validated == [None, (20240501, 20240502), None, (20240505, 20240505)]
+    # The dimensions were staged by the catch-up run only
+    (log_path,) = (staging_dir / "run-logs").glob("run-*[0-9].json")
+    spans = json.loads(log_path.read_text())["spans"]
+    restaged = [span["rows_out"] for span in spans if span["stage"] == "staging_dimensions"]
+    assert restaged[0] > 0 and restaged[1:] == [0, 0, 0]
+    dim_date = pd.read_csv(staging_dir / "dim_date.csv")
+    assert dim_date["date_key"].is_unique
+    assert {20240501, 20240505} <= set(dim_date["date_key"])
+
+    engine = create_engine(pipeline_options["db_url"])
+    try:
+        loaded = pd.read_sql("SELECT order_id FROM fact_orders WHERE order_id > 9000", engine)
+    finally:
+        engine.dispose()
+    assert sorted(loaded["order_id"]) == list(range(9001, 9006))